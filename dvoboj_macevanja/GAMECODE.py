@@ -1,259 +1,7 @@
-import pygame
-from fighter import Fighter
-import random
-from pygame import mixer
-from main_menu import MainMenu
+"""Starts the game, kept so `python GAMECODE.py` still works; the game is app.py (python -m app)"""
+import sys
 
-mixer.init()
-pygame.init()
-pygame.joystick.init()
+import app
 
-# Initialize joysticks
-joysticks = []
-for i in range(pygame.joystick.get_count()):
-    joystick = pygame.joystick.Joystick(i)
-    joystick.init()
-    joysticks.append(joystick)
-    print(f"Controller {i}: {joystick.get_name()}")
-
-#window
-sc_width= 1000
-sc_height= 540
-
-screen=pygame.display.set_mode((sc_width, sc_height))
-pygame.display.set_caption("Ђоко и Влајко")
-
-#frames
-clock=pygame.time.Clock()
-FPS=60
-
-# Initialize main menu
-main_menu = MainMenu(sc_width, sc_height)
-game_started = False
-
-#color
-YELLOW=(255,255,0)
-RED=(255,0,0)
-GREEN=(0,255,0)
-BLUE=(0,0,255)
-WHITE=(255,255,255)
-BLACK=(0,0,0)
-
-#3 seconds pause before every match
-intro_count=4
-last_count=pygame.time.get_ticks()    
-score=[0,0]
-round_over=False
-Round_Over_CoolDown=4000
-
-introsound=pygame.mixer.Sound("music/tridvajedan.mp3")
-
-
-victory1=pygame.image.load("P1.png").convert_alpha()
-victory2=pygame.image.load("P2.png").convert_alpha()
-
-
-#----------------Paralax Background------------------------------------------------------
-scroll=0
-
-bg_images=[]
-for i in range(4,0,-1):
-    bg_image=pygame.image.load(f"Background/paralaxbg2/img {i}.png").convert_alpha()
-    bg_images.append(bg_image)
-bg_width=bg_images[0].get_width()
-
-
-def drawtimer(timer):
-    cdimg=pygame.image.load(f"intro/{timer}.png").convert_alpha()
-    screen.blit(cdimg,(0,0))
-
-def draw_text(text, font, textcol, x, y):
-    txt=font.render(text, True, textcol)
-    screen.blit(txt,(x,y))
-
-def drawbg():
-    for x in range(len(bg_images)):
-        speed_sc=1
-        for i in bg_images:
-            screen.blit(i,((x*bg_width) - scroll*speed_sc,0))
-            speed_sc+=0.2
-            
-
-
-#----------------player 1 selection------------------------------------------------------
-
-# Pick Djoko
-SIZE=180
-SCALE=3
-OFSET=[220,150]
-PROP1=[SIZE,SCALE,OFSET]
-Player1=pygame.image.load("Good Fighter/djoko_moves.png").convert_alpha()
-p1_anm_steps=[4,8,2,4,4,3,7,2]
-
-
-
-#----------------player 2 selection------------------------------------------------------
-
-# Pick Vlajko 
-SIZE=180
-SCALE=3
-OFSET=[220,150]
-PROP2=[SIZE,SCALE,OFSET]
-Player2=pygame.image.load("Good Fighter/vlajko_moves.png").convert_alpha()
-p2_anm_steps=[10,8,3,7,9,3,11,3]
-
-#----------------attack sounds------------------------------------------------------
-
-
-p1sound=pygame.mixer.Sound("music/swordattack.wav")
-p1soundmiss=pygame.mixer.Sound("music/swordmissattack.flac")    
-
-
-p2sound=pygame.mixer.Sound("music/swordattack.wav")
-p2soundmiss=pygame.mixer.Sound("music/swordmissattack.flac")
-
-
-
-#----------------health bar------------------------------------------------------
-
-health=pygame.image.load("health bar.png").convert_alpha()
-def healthbar(health,x,y):
-    ratio=health/100
-    pygame.draw.rect(screen,WHITE, (x, y, 300, 30))
-    pygame.draw.rect(screen, RED, (x, y, 300 * ratio, 30))
-
-#----------------font--------------------------------------------------------------
-pixelfont=pygame.font.Font("VCR_OSD_MONO_1.001.ttf",30)
-
-
-#----------------PLAYERS--------------------------------------------------------------
-F1=Fighter(1,100,290,False,PROP1,Player1,p1_anm_steps,p1sound,p1soundmiss)
-F2=Fighter(2,800,290,True,PROP2,Player2,p2_anm_steps,p2sound,p2soundmiss)
-
-#----------------game loop--------------------------------------------------------------
-run=True
-while run:
-    clock.tick(FPS)
-    
-    # Show main menu if game hasn't started
-    if not game_started:
-        main_menu.draw(screen)
-        
-        # Handle menu events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                run = False
-            else:
-                result = main_menu.handle_input(event)
-                if result == "start_game":
-                    game_started = True
-                    # Load game music when starting
-                    pygame.mixer.music.load("music/bgmusic.mp3")
-                    pygame.mixer.music.set_volume(5)
-                    mixer.music.play(-1)
-                elif result == "quit":
-                    run = False
-        
-        pygame.display.update()
-        continue
-    
-    # Main game loop (only runs after menu)
-    drawbg()
-    if intro_count<=0:
-        F1.move(sc_width,sc_height,screen,F2,round_over)
-        F2.move(sc_width,sc_height,screen,F1,round_over)
-    else:
-        drawtimer(intro_count)       
-        if(pygame.time.get_ticks()-last_count)>=1500:
-            if(intro_count==4):
-                introsound.play()
-            intro_count-=1
-
-            last_count=pygame.time.get_ticks()
-            
-            print(intro_count)
-    
-    healthbar(F1.health,70,25)
-    healthbar(F2.health,630,25)
-    screen.blit(health,(0,0))
-    draw_text(str(score[0]),pixelfont,WHITE,7,92)
-    draw_text(str(score[1]),pixelfont,WHITE,900,92)
-
-
-    key=pygame.key.get_pressed()
-    
-    # Check for controller input for background scrolling
-    controller_scroll_left = False
-    controller_scroll_right = False
-    
-    if joysticks:
-        for joystick in joysticks:
-            try:
-                # Check left stick for scrolling
-                left_x = joystick.get_axis(0)  # Left stick X axis
-                if left_x < -0.3:  # Left
-                    controller_scroll_left = True
-                elif left_x > 0.3:  # Right
-                    controller_scroll_right = True
-            except pygame.error:
-                pass  # Controller disconnected
-    
-    # Background scrolling with keyboard and controller
-    if (key[pygame.K_a] or controller_scroll_left) and scroll>0:
-        scroll -=5
-    elif (key[pygame.K_LEFT] or controller_scroll_left) and scroll>0:
-        scroll -=5
-    if (key[pygame.K_d] or controller_scroll_right) and scroll<300:
-        scroll +=5
-    elif (key[pygame.K_RIGHT] or controller_scroll_right) and scroll<300:
-        scroll +=5
-
-    
-    
-    F1.update()
-    F2.update()
-
-    # Check attack collisions during attack animations
-    if intro_count <= 0:  # Only check during gameplay, not countdown
-        F1.check_attack_hit(F2)
-        F2.check_attack_hit(F1)
-
-    #draw fighters
-    F1.draw(screen)
-    F2.draw(screen)
-
-    if round_over==False:
-        if F1.alive==False:
-            score[1]+=1
-            print(score)
-            round_over=True
-            roundovertime=pygame.time.get_ticks()
-        elif F2.alive==False:
-            score[0]+=1            
-            print(score)
-            round_over=True
-            roundovertime=pygame.time.get_ticks()
-    else:
-        # BASE IF DOESNT WORK
-        if F1.alive==True and F2.alive==False:
-            screen.blit(victory1,(0,0))
-        elif F2.alive==True and F1.alive==False:
-            screen.blit(victory2,(0,0))
-
-        if pygame.time.get_ticks() - roundovertime > Round_Over_CoolDown:
-            round_over=False
-            intro_count=4
-            F1=Fighter(1,100,290,False,PROP1,Player1,p1_anm_steps,p1sound,p1soundmiss)
-            F2=Fighter(2,800,290,True,PROP2,Player2,p2_anm_steps,p2sound,p2soundmiss)
-
-    
-    #event handler
-    for event in pygame.event.get():
-        if event.type==pygame.QUIT:
-            run=False
-
-    #display
-    pygame.display.update()
-
-#exit
-pygame.quit()
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(app.main(sys.argv[1:]))
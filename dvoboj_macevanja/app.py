@@ -0,0 +1,575 @@
+"""Ђоко и Влајко, the game
+
+App runs the game in three phases: init() opens the mixer, the window and
+the input devices and starts loading the fight on the loader threads, run()
+plays until the window is closed or a replay ends, and shutdown() saves the
+recording and telemetry and closes everything. Importing this module (or
+any of the fight logic) opens nothing and loads nothing.
+
+What is on screen is a scene:
+
+    MenuScene       the main menu, while the fight loads in the background
+    CountdownScene  the countdown before a round
+    FightScene      the round itself
+    RoundOverScene  the victory screen
+
+The menu only loads its own poster and fonts. The other three share the
+fight's sprites, background and sounds, which the menu left loading, and
+follow the match: the simulation decides when a round starts and ends
+(simulation.py), the App puts the scene for it on screen after every tick.
+
+    python -m app [--cpu LEVEL] [--replay FILE] [--record FILE] [--netplay HOST:PORT] ...
+"""
+import argparse
+import os
+import sys
+
+import pygame
+from pygame import mixer
+
+import assets
+import audio
+import characters
+import cpu
+import netplay
+import perf
+import replay
+import simulation
+import sprite_cache
+import telemetry
+import text_cache
+from dirty_rects import DirtyRectRenderer
+from fighter import Fighter
+from input_manager import InputManager
+from main_menu import MainMenu
+from parallax import ParallaxBackground
+from perf_overlay import PerfOverlay
+
+TITLE = "Ђоко и Влајко"
+
+# window
+SC_WIDTH = 1000
+SC_HEIGHT = 540
+
+# frames: the simulation ticks at a locked rate, rendering runs as fast as MAX_FPS allows
+TICK_RATE = simulation.TICK_RATE
+TICK_MS = 1000 / TICK_RATE
+MAX_FPS = 144          # 0 renders as fast as possible
+MENU_FPS = 30          # the menu only redraws when something changes, poll it slower
+MAX_FRAME_MS = 250     # a longer frame is not caught up, the game slows down instead
+VSYNC = False          # GPU renderer only
+
+# only redraw and update the parts of the screen that changed
+DIRTY_RECTS = True
+
+# colors
+YELLOW = (255, 255, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+FONT = "VCR_OSD_MONO_1.001.ttf"
+LOADING_FONT = "fonts/Tiny5-Regular.ttf"
+MUSIC = "music/bgmusic.mp3"
+INTRO_SOUND = "music/tridvajedan.mp3"
+BG_LAYERS = assets.BACKGROUND_LAYERS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app", description=TITLE)
+    parser.add_argument("--gpu", action="store_true", help="draw with SDL2 textures instead of surfaces")
+    parser.add_argument("--record", metavar="FILE", help="record the inputs of the match to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="play back a match recorded with --record")
+    parser.add_argument("--p1", default="djoko", choices=characters.roster(), help="character of player 1")
+    parser.add_argument("--p2", default="vlajko", choices=characters.roster(), help="character of player 2")
+    parser.add_argument("--cpu", type=int, choices=sorted(cpu.LEVELS), help="player 2 is the computer at this level, skipping the menu")
+    parser.add_argument("--telemetry", metavar="FILE", help="write every event of the session to FILE, see telemetry.py")
+    parser.add_argument("--netplay", metavar="HOST:PORT", help="play online against the game running at HOST:PORT, skipping the menu")
+    parser.add_argument("--port", type=int, default=netplay.DEFAULT_PORT, help="local UDP port for --netplay")
+    parser.add_argument("--player", type=int, choices=(1, 2), default=1, help="side played on this machine with --netplay")
+    return parser.parse_args(argv)
+
+
+def load_character(character):
+    """Map the character's baked atlas, or decode its spritesheet and slice it on the loader threads"""
+    if sprite_cache.load_baked(character.sheet, character.frame_size, character.scale, character.steps):
+        return
+    def build_atlas(path, sheet):
+        # slice the spritesheet on a loader thread as soon as it is converted
+        assets.submit(sprite_cache.get_atlas, path, character.frame_size, character.scale, character.steps)
+    assets.load_async([character.sheet], finish=build_atlas)
+
+
+#----------------scenes------------------------------------------------------
+
+class Scene:
+    """What is on screen; the App hands it the events and the time of every frame"""
+    fps = MAX_FPS
+
+    def __init__(self, app):
+        self.app = app
+
+    def enter(self):
+        """Called when the scene comes on screen"""
+
+    def handle_event(self, event):
+        pass
+
+    def frame(self, frame_ms, lockstep):
+        """Update and draw one frame, frame_ms after the last one"""
+
+
+class MenuScene(Scene):
+    """Main menu, the fight keeps loading behind it"""
+    fps = MENU_FPS
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.main_menu = MainMenu(SC_WIDTH, SC_HEIGHT, app.inputs)
+
+    def handle_event(self, event):
+        result = self.main_menu.handle_input(event)
+        if result == "start_game":
+            self.app.start_game()
+        elif result == "start_cpu":
+            self.app.start_game(cpu.CPU(2, level=cpu.DEFAULT_LEVEL))
+        elif result == "quit":
+            self.app.running = False
+
+    def frame(self, frame_ms, lockstep):
+        # hand whatever finished loading to the main thread
+        assets.poll()
+        if self.main_menu.draw(self.app.screen):
+            self.app.renderer.flip()
+
+
+class MatchScene(Scene):
+    """A scene of the match: runs the fixed ticks the time that passed needs, then draws"""
+    def handle_event(self, event):
+        self.app.overlay.handle_input(event)
+
+    def frame(self, frame_ms, lockstep):
+        app = self.app
+        if lockstep:
+            app.accumulator = TICK_MS
+        else:
+            app.accumulator += min(frame_ms, MAX_FRAME_MS)
+        while app.accumulator >= TICK_MS and app.running:
+            # a tick can change the scene, the rest of the frame's ticks still run
+            app.tick()
+            app.accumulator -= TICK_MS
+        app.render(app.accumulator / TICK_MS)
+
+    def draw_behind(self):
+        """Rect drawn under the fighters and the HUD, or None"""
+
+    def draw_in_front(self):
+        """Rect drawn over the fighters, or None"""
+
+
+class CountdownScene(MatchScene):
+    """4, 3, 2, 1 before a round, the fighters can't move yet"""
+    def draw_behind(self):
+        return self.app.draw_overlay(assets.INTRO_IMAGES[self.app.match.intro_count])
+
+
+class FightScene(MatchScene):
+    """The round"""
+
+
+class RoundOverScene(MatchScene):
+    """The winner of the round, until the match starts the next one"""
+    def draw_in_front(self):
+        f1, f2 = self.app.match.fighters
+        if f1.alive and not f2.alive:
+            return self.app.draw_overlay(assets.VICTORY_IMAGES[1])
+        if f2.alive and not f1.alive:
+            return self.app.draw_overlay(assets.VICTORY_IMAGES[2])
+        return None
+
+
+#----------------application------------------------------------------------------
+
+class App:
+    """The game: window, input devices, the match and the scene on screen"""
+    def __init__(self, options):
+        self.options = options
+        self.running = False
+        self.scene = None
+        self.accumulator = 0
+        self.scroll = 0
+        # built by load_fight()
+        self.background = None
+        self.introsound = None
+        self.F1 = None
+        self.F2 = None
+        # plays player 2 when picked in the menu or with --cpu, None when a person does
+        self.opponent = None
+        # with --netplay both players' inputs go through a rollback session instead, see netplay.py
+        self.session = None
+        # final (p1, p2) inputs of the online match, for --record
+        self.netplay_log = []
+        self.loading_font = None
+
+    #----------------init------------------------------------------------------
+
+    def init(self):
+        options = self.options
+        mixer.init()
+        pygame.init()
+        pygame.joystick.init()
+        # Keyboard and joysticks, updated from events once per frame
+        self.inputs = InputManager()
+        self.clock = pygame.time.Clock()
+        self.open_display()
+        # pre-scaled images written by bake.py, when there is a pack for this display
+        assets.open_pack()
+        self.pixelfont = pygame.font.Font(FONT, 30)
+        # performance overlay (F3)
+        self.overlay = PerfOverlay(pygame.font.Font(FONT, 16), self.clock)
+
+        # sprites, frame timings, damage and sounds come from the manifests in characters/,
+        # only the two picked characters are loaded
+        self.playback = replay.load_replay(options.replay) if options.replay else None
+        if self.playback is not None and all(self.playback.characters):
+            # a replay is played with the characters it was recorded with
+            ids = self.playback.characters
+        else:
+            ids = (options.p1, options.p2)
+        self.P1 = characters.load(ids[0])
+        self.P2 = characters.load(ids[1])
+        self.start_loading()
+
+        # countdown, rounds and score live in the match, the fighters are reset in place every round
+        self.match = simulation.MatchState(self.P1.spec, self.P2.spec, SC_WIDTH, SC_HEIGHT)
+        if self.playback is not None and self.playback.steps != self.match.steps:
+            print("warning: the replay was recorded with different characters")
+        # hits are decided by the sprites' pixels, except in replays recorded with the body rectangles
+        self.use_hitboxes = self.playback is None or bool(self.playback.flags & replay.FLAG_HITBOXES)
+        self.recording = None
+        if options.record:
+            self.recording = replay.Replay(self.P1.steps, self.P2.steps,
+                                           flags=replay.FLAG_HITBOXES if self.use_hitboxes else 0,
+                                           characters=(self.P1.id, self.P2.id))
+        # events of the session for balancing, written on a background thread
+        self.events_log = None
+        if options.telemetry:
+            self.events_log = telemetry.TelemetryWriter(
+                options.telemetry, {"characters": [self.P1.id, self.P2.id], "netplay": options.netplay, "cpu": options.cpu})
+
+        self.running = True
+        if self.playback is not None:
+            # replays skip the menu
+            self.start_game()
+        elif options.cpu:
+            self.start_game(cpu.CPU(2, level=options.cpu))
+        elif options.netplay:
+            self.start_netplay(options.netplay)
+        else:
+            self.set_scene(MenuScene(self))
+
+    def open_display(self):
+        """CPU blits on the display surface, or SDL2 textures with --gpu (DJOKO_RENDERER=gpu)"""
+        self.gpu = None
+        if self.options.gpu or os.environ.get("DJOKO_RENDERER") == "gpu":
+            try:
+                from gpu_renderer import TextureRenderer
+                self.gpu = TextureRenderer((SC_WIDTH, SC_HEIGHT), TITLE, vsync=VSYNC)
+            except (ImportError, RuntimeError) as e:
+                print(f"GPU renderer not available, drawing on surfaces: {e}")
+        if self.gpu:
+            self.screen = self.gpu
+            self.gpu.draw_background = self.draw_background
+            self.renderer = self.gpu
+        else:
+            self.screen = pygame.display.set_mode((SC_WIDTH, SC_HEIGHT))
+            pygame.display.set_caption(TITLE)
+            self.renderer = DirtyRectRenderer(self.screen, self.draw_background, DIRTY_RECTS)
+
+    def start_loading(self):
+        """Decode everything the fight needs on the loader threads, images in the pack are mapped at once"""
+        load_character(self.P1)
+        if self.P2.sheet != self.P1.sheet:
+            load_character(self.P2)
+        assets.load_async(BG_LAYERS)
+        assets.load_async(assets.OVERLAY_IMAGES)
+        assets.load_sounds_async([INTRO_SOUND, self.P1.attack_sound, self.P1.miss_sound,
+                                  self.P2.attack_sound, self.P2.miss_sound])
+
+    def load_fight(self):
+        """Wait for the background loading, showing a loading screen, and build the fight
+
+        Returns False if the window was closed while loading.
+        """
+        while assets.poll():
+            self.draw_loading()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    self.running = False
+                    return False
+            self.clock.tick(MENU_FPS)
+
+        # countdown, victory and health bar overlays
+        assets.preload_overlays()
+        self.background = ParallaxBackground([assets.image(path) for path in BG_LAYERS], SC_WIDTH)
+        self.introsound = assets.sound(INTRO_SOUND)
+        # the atlases were built on the loader threads, these are cache hits
+        self.F1 = Fighter.from_character(1, self.P1, self.match.fighters[0], self.inputs)
+        self.F2 = Fighter.from_character(2, self.P2, self.match.fighters[1], self.inputs)
+        if self.use_hitboxes:
+            self.match.hitboxes = (self.F1.hitboxes, self.F2.hitboxes)
+        return True
+
+    def start_game(self, opponent=None):
+        """Leave the menu for the fight, once it is loaded"""
+        self.opponent = opponent
+        # only waits if the loader threads are not done yet
+        if not self.load_fight():
+            return
+        self.accumulator = 0
+        # every image is loaded by now, count anything read from disk during play
+        assets.begin_play()
+        # the menu's music keeps playing, only louder
+        audio.play_music(MUSIC, 1.0)
+        self.sync_scene()
+
+    def start_netplay(self, address):
+        host, port = address.rsplit(":", 1)
+        link = netplay.Link(self.options.port, (host, int(port)))
+        self.session = netplay.RollbackSession(self.match, self.options.player, link, record=self.netplay_log,
+                                               telemetry=self.events_log)
+        self.start_game()
+
+    #----------------scenes------------------------------------------------------
+
+    def set_scene(self, scene):
+        self.scene = scene
+        scene.enter()
+
+    def sync_scene(self):
+        """Put the scene for the state of the match on screen"""
+        if self.match.intro_count > 0:
+            wanted = CountdownScene
+        elif self.match.round_over:
+            wanted = RoundOverScene
+        else:
+            wanted = FightScene
+        if type(self.scene) is not wanted:
+            self.set_scene(wanted(self))
+
+    #----------------ticks------------------------------------------------------
+
+    def tick(self):
+        """One simulation tick"""
+        if self.session is not None:
+            self.handle_match_events(self.netplay_tick())
+            self.scroll_background()
+            return
+        match, F1, F2 = self.match, self.F1, self.F2
+        t = perf.start()
+        if self.playback is not None:
+            if match.tick >= len(self.playback):
+                self.running = False
+                return
+            p1_input, p2_input = self.playback[match.tick]
+        else:
+            p1_input = F1.read_input()
+            p2_input = self.opponent(match) if self.opponent is not None else F2.read_input()
+        if self.recording is not None:
+            self.recording.record(p1_input, p2_input)
+        perf.stop("input", t)
+
+        F1.save_position()
+        F2.save_position()
+        # advance() times its move, update and collision stages
+        simulation.advance(match, p1_input, p2_input)
+        F1.refresh()
+        F2.refresh()
+        self.play_event_sounds(match.events)
+        self.handle_match_events(match.events)
+        self.scroll_background()
+
+    def netplay_tick(self):
+        """One tick of an online match, simulated by the session, possibly again after a rollback
+
+        Returns the events of every tick the session simulated, also while it
+        waits for the peer, as a rollback may run then too.
+        """
+        # the local player may use either side's keys or controller
+        t = perf.start()
+        local_input = self.inputs.player_input(1) | self.inputs.player_input(2)
+        perf.stop("input", t)
+        fighters = (self.F1, self.F2)
+        for fighter in fighters:
+            fighter.save_position()
+        # every tick the session simulates, again or not, is timed by advance()
+        self.session.advance(local_input)
+        for fighter in fighters:
+            fighter.refresh()
+        self.play_event_sounds(self.session.events)
+        return self.session.events
+
+    def play_event_sounds(self, events):
+        """Swing and hit sounds of simulation events"""
+        fighters = (self.F1, self.F2)
+        for event in events:
+            if event.kind == simulation.EVENT_ATTACK:
+                audio.play(fighters[event.player - 1].attack_misssound, audio.SWING)
+            elif event.kind == simulation.EVENT_HIT:
+                audio.play(fighters[event.player - 1].attack_sound, audio.HIT)
+
+    def scroll_background(self):
+        """Background scrolling with keyboard and controller"""
+        scroll_left, scroll_right = self.inputs.scroll_input()
+        if scroll_left and self.scroll > 0:
+            self.scroll -= 5
+        if scroll_right and self.scroll < 300:
+            self.scroll += 5
+
+    def handle_match_events(self, events):
+        """Countdown sound, round changes, telemetry and the scene of the last tick"""
+        # countdown and score are on screen and in the telemetry, a rollback
+        # session logs the ticks itself once they are final
+        if events and self.events_log is not None and self.session is None:
+            self.events_log.log(self.match.tick - 1, events, self.match.score)
+        for event in events:
+            if event.kind == simulation.EVENT_COUNTDOWN:
+                if event.value == simulation.INTRO_COUNT - 1:
+                    audio.play(self.introsound, audio.VOICE)
+            elif event.kind == simulation.EVENT_ROUND_START:
+                # fighters jumped back to the start, don't interpolate from the old spot
+                self.F1.save_position()
+                self.F2.save_position()
+        self.sync_scene()
+
+    #----------------drawing------------------------------------------------------
+
+    @perf.timed("drawbg")
+    def draw_background(self, surface, scroll):
+        # layers are baked once by load_fight(), only the tiles that are on screen are blitted
+        self.background.draw(surface, scroll)
+
+    def draw_overlay(self, path):
+        # full screen overlays only blit their opaque part
+        area = assets.bounds(path)
+        perf.count("blits")
+        return self.screen.blit(assets.image(path), area.topleft, area)
+
+    def draw_text(self, text, font, textcol, x, y):
+        txt = text_cache.render(font, text, textcol)
+        perf.count("blits")
+        return self.screen.blit(txt, (x, y))
+
+    def healthbar(self, health, x, y):
+        ratio = health / 100
+        self.screen.fill(WHITE, (x, y, 300, 30))
+        self.screen.fill(RED, (x, y, 300 * ratio, 30))
+        return pygame.Rect(x, y, 300, 30)
+
+    def draw_loading(self):
+        if self.loading_font is None:
+            self.loading_font = pygame.font.Font(LOADING_FONT, 40)
+        done, total = assets.progress()
+        screen = self.screen
+        screen.fill(BLACK)
+        txt = text_cache.render(self.loading_font, "УЧИТАВАЊЕ", WHITE)
+        screen.blit(txt, txt.get_rect(center=(SC_WIDTH // 2, SC_HEIGHT // 2 - 30)))
+        screen.fill(WHITE, (SC_WIDTH // 2 - 150, SC_HEIGHT // 2 + 10, 300, 20))
+        screen.fill(RED, (SC_WIDTH // 2 - 150, SC_HEIGHT // 2 + 10, 300 * done / max(total, 1), 20))
+        self.renderer.flip()
+
+    def render(self, alpha):
+        """Draw the current state, alpha is how far we are between the last tick and the next"""
+        renderer, match, scene = self.renderer, self.match, self.scene
+        t = perf.start()
+        renderer.begin(self.scroll)
+        renderer.mark(scene.draw_behind())
+
+        renderer.mark(self.healthbar(self.F1.health, 70, 25))
+        renderer.mark(self.healthbar(self.F2.health, 630, 25))
+        renderer.mark(self.draw_overlay(assets.HEALTH_BAR_IMAGE))
+        renderer.mark(self.draw_text(str(match.score[0]), self.pixelfont, WHITE, 7, 92))
+        renderer.mark(self.draw_text(str(match.score[1]), self.pixelfont, WHITE, 900, 92))
+
+        # draw fighters
+        renderer.mark(self.F1.draw(self.screen, alpha))
+        renderer.mark(self.F2.draw(self.screen, alpha))
+
+        renderer.mark(scene.draw_in_front())
+        if self.session is not None and self.session.stalled:
+            renderer.mark(self.draw_text("ЧЕКА СЕ ПРОТИВНИК", self.pixelfont, WHITE, SC_WIDTH // 2 - 150, SC_HEIGHT // 2))
+
+        renderer.mark(self.overlay.draw(self.screen))
+        perf.stop("draw", t)
+
+        # display
+        t = perf.start()
+        renderer.present()
+        perf.stop("flip", t)
+
+    #----------------loop------------------------------------------------------
+
+    def run(self, lockstep=False):
+        """Play until the window is closed or the replay ends, returns the frames drawn
+
+        lockstep runs exactly one tick per rendered frame, as fast as possible,
+        so benchmarks measure the same work every frame.
+        """
+        frames = 0
+        while self.running:
+            scene = self.scene
+            frame_ms = self.clock.tick(0 if lockstep else scene.fps)
+            frame_start = perf.start()
+            audio.end_frame()
+
+            t = perf.start()
+            events = pygame.event.get()
+            self.inputs.update(events)
+            for event in events:
+                if event.type == pygame.QUIT:
+                    self.running = False
+                else:
+                    scene.handle_event(event)
+            perf.stop("events", t)
+            if not self.running or self.scene is not scene:
+                # the menu started the game, time starts with its first frame
+                continue
+
+            scene.frame(frame_ms, lockstep)
+            if isinstance(scene, MatchScene):
+                perf.stop("frame", frame_start)
+                perf.end_frame()
+                frames += 1
+        return frames
+
+    def shutdown(self):
+        assets.stop_loading()
+        if self.session is not None:
+            self.session.link.close()
+            if self.session.desync is not None:
+                print(f"the peers went out of sync at tick {self.session.desync}")
+        if self.events_log is not None:
+            self.events_log.close()
+            print(f"wrote {self.events_log.written} events to {self.options.telemetry}")
+        if self.recording is not None:
+            for p1_input, p2_input in self.netplay_log:
+                self.recording.record(p1_input, p2_input)
+            self.recording.save(self.options.record)
+            print(f"recorded {len(self.recording)} ticks to {self.options.record}")
+        pygame.quit()
+
+
+def main(argv=None):
+    app = App(parse_args(argv))
+    app.init()
+    try:
+        app.run()
+    finally:
+        app.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,124 @@
+"""Packed file of pre-scaled, display-format pixels, written by bake.py
+
+Images are stored exactly as the game uses them after convert_alpha() and
+scaling, so loading is a memory map and pygame.image.frombuffer, with no PNG
+decoding, scaling or conversion:
+
+    header  "DVPK", version, pixel format, index length     (<4sB4sI)
+    index   JSON: name -> offset, size, stamps of the source files, extra data
+    pixels  raw rows of every entry, 4 bytes per pixel, each entry 64 byte aligned
+
+The pixel format is the byte order of the display's alpha format ("BGRA" on
+most systems). A pack baked for another format is not used.
+"""
+import json
+import mmap
+import os
+import struct
+
+import pygame
+
+MAGIC = b"DVPK"
+VERSION = 1
+HEADER = struct.Struct("<4sB4sI")
+ALIGN = 64
+# byte orders pygame.image.frombuffer understands
+FORMATS = ("BGRA", "RGBA", "ARGB")
+
+
+def display_format():
+    """Byte order of surfaces converted with convert_alpha(), None if it has no frombuffer format
+
+    Needs a display surface.
+    """
+    masks = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha().get_masks()
+    channels = {}
+    for name, mask in zip("RGBA", masks):
+        for byte in range(4):
+            if mask == 0xff << (8 * byte):
+                channels[byte] = name
+    order = "".join(channels.get(byte, "?") for byte in range(4))
+    if pygame.get_sdl_byteorder() != pygame.LIL_ENDIAN:
+        order = order[::-1]
+    return order if order in FORMATS else None
+
+
+def source_stamp(path):
+    """Size and modification time of a source file, a changed file makes its entries stale"""
+    info = os.stat(path)
+    return [info.st_size, info.st_mtime_ns]
+
+
+def write_pack(path, pixel_format, entries):
+    """Write entries, a list of (name, surface, sources, extra), to path
+
+    sources are the files the entry was made from, extra is any JSON data
+    the loader needs besides the pixels.
+    """
+    index = {}
+    blobs = []
+    offset = 0
+    for name, surface, sources, extra in entries:
+        data = pygame.image.tobytes(surface, pixel_format)
+        index[name] = {
+            'offset': offset,
+            'size': surface.get_size(),
+            'sources': {source: source_stamp(source) for source in sources},
+            'extra': extra
+        }
+        blobs.append(data)
+        offset += -(-len(data) // ALIGN) * ALIGN
+
+    index_data = json.dumps(index).encode()
+    start = -(-(HEADER.size + len(index_data)) // ALIGN) * ALIGN
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, pixel_format.encode(), len(index_data)))
+        f.write(index_data)
+        for blob, entry in zip(blobs, index.values()):
+            f.seek(start + entry['offset'])
+            f.write(blob)
+    return start + offset
+
+
+class AssetPack:
+    """A baked pack, memory mapped
+
+    Surfaces share the mapped memory. The mapping is copy on write, so a
+    surface drawn on changes only the game's copy of the page, never the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, pixel_format, index_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an asset pack")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported pack version {version}")
+        self.format = pixel_format.decode()
+        self.index = json.loads(self.map[HEADER.size:HEADER.size + index_size])
+        self.start = -(-(HEADER.size + index_size) // ALIGN) * ALIGN
+        self.view = memoryview(self.map)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def fresh(self, name):
+        """Whether the entry exists and none of its source files changed since baking"""
+        entry = self.index.get(name)
+        if entry is None:
+            return False
+        try:
+            return all(source_stamp(source) == stamp for source, stamp in entry['sources'].items())
+        except OSError:
+            return False
+
+    def surface(self, name):
+        """Surface of the entry, backed by the mapped file"""
+        entry = self.index[name]
+        width, height = entry['size']
+        start = self.start + entry['offset']
+        return pygame.image.frombuffer(self.view[start:start + width * height * 4], (width, height), self.format)
+
+    def extra(self, name):
+        return self.index[name]['extra']
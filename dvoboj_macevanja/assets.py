@@ -0,0 +1,259 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import pygame
+import perf
+from asset_pack import AssetPack, display_format
+
+# Registry of every image the game draws.
+# Images are decoded from disk once, on loader threads while the menu is shown
+# or on first use, and the same surface is handed out afterwards, so nothing
+# is read from disk during play.
+# key: (path, alpha, size) -> surface
+_images = {}
+# key: path -> rect of the opaque pixels of the image
+_bounds = {}
+_stats = {
+    'disk_loads': 0,   # images decoded from disk
+    'hits': 0,         # requests served from the registry
+    'play_loads': 0,   # images decoded from disk after begin_play()
+    'pack_loads': 0    # images mapped from the asset pack
+}
+_playing = False
+# key: path -> sound
+_sounds = {}
+
+# Background loading: worker threads decode files while the menu is shown,
+# the main thread converts them for the display and registers them.
+LOADER_THREADS = 4
+_pool = None
+# future -> finish(result), called on the main thread once the work is done
+_jobs = {}
+# key of an image or path of a sound -> future decoding it
+_pending = {}
+_submitted = 0
+
+# Pre-scaled, pre-converted images written by bake.py, None when there is none
+PACK_FILE = "assets.pack"
+pack = None
+
+# Images shown on top of the fight
+INTRO_IMAGES = {count: f"intro/{count}.png" for count in range(1, 5)}
+VICTORY_IMAGES = {1: "p1.png", 2: "p2.png"}
+HEALTH_BAR_IMAGE = "health bar.png"
+OVERLAY_IMAGES = [*INTRO_IMAGES.values(), *VICTORY_IMAGES.values(), HEALTH_BAR_IMAGE]
+MENU_BACKGROUND = "menu/DjokoiVlajkoPoster.png"
+# parallax layers, back to front
+BACKGROUND_LAYERS = [f"Background/paralaxbg2/img {i}.png" for i in range(4, 0, -1)]
+
+
+def image(path, alpha=True, size=None):
+    """Return the image at path, converted for the display and optionally scaled to size"""
+    key = (path, alpha, size)
+    img = _images.get(key)
+    if img is not None:
+        _stats['hits'] += 1
+        return img
+
+    future = _pending.get(key)
+    if future is not None:
+        # already loading in the background, wait for it
+        _finish(future)
+        return _images[key]
+    img = _from_pack(key)
+    if img is not None:
+        return img
+    return _add(key, pygame.image.load(path))
+
+
+def _add(key, img):
+    """Convert a decoded image for the display and register it, on the main thread"""
+    path, alpha, size = key
+    _pending.pop(key, None)
+    _stats['disk_loads'] += 1
+    if _playing:
+        _stats['play_loads'] += 1
+    perf.count("surfaces")
+    # the GPU renderer has no display surface, it uploads images as they are
+    if pygame.display.get_surface():
+        img = img.convert_alpha() if alpha else img.convert()
+    if size is not None:
+        img = pygame.transform.scale(img, size)
+    _images[key] = img
+    return img
+
+
+def sound(path):
+    """Return the sound at path, decoded once"""
+    snd = _sounds.get(path)
+    if snd is None:
+        future = _pending.get(path)
+        if future is not None:
+            _finish(future)
+            return _sounds[path]
+        snd = _sounds[path] = pygame.mixer.Sound(path)
+    return snd
+
+
+def bounds(path):
+    """Rect of the opaque pixels of the image at path, for overlays that cover part of the screen"""
+    rect = _bounds.get(path)
+    if rect is None:
+        img = image(path)
+        name = pack_name((path, True, None))
+        if pack is not None and pack.fresh(name):
+            rect = pygame.Rect(pack.extra(name)['bounds'])
+        else:
+            rect = img.get_bounding_rect()
+        _bounds[path] = rect
+    return rect
+
+
+def preload(paths, alpha=True):
+    """Decode every image in paths so later requests never touch the disk"""
+    return [image(path, alpha) for path in paths]
+
+
+def preload_overlays():
+    """Decode the countdown, victory and health bar overlays"""
+    for path in OVERLAY_IMAGES:
+        bounds(path)
+
+
+def begin_play():
+    """Mark the start of play; disk loads from now on are counted in play_loads"""
+    global _playing
+    _playing = True
+
+
+def end_play():
+    global _playing
+    _playing = False
+
+
+def stats():
+    """Registry statistics: images held, disk loads, hits and disk loads during play"""
+    info = dict(_stats)
+    info['images'] = len(_images)
+    return info
+
+
+#----------------asset pack------------------------------------------------------
+
+def pack_name(key):
+    """Name of an image in the asset pack"""
+    path, alpha, size = key
+    return f"image:{path}:{int(alpha)}:{'x'.join(map(str, size)) if size else ''}"
+
+
+def open_pack(path=PACK_FILE):
+    """Use the asset pack at path if it exists and matches the display format, returns whether it is used"""
+    global pack
+    if not os.path.exists(path):
+        return False
+    try:
+        candidate = AssetPack(path)
+    except (OSError, ValueError) as e:
+        print(f"asset pack not used: {e}")
+        return False
+    # without a display (GPU renderer) images are used in whatever format they come
+    if pygame.display.get_surface() and candidate.format != display_format():
+        print(f"asset pack not used: baked for {candidate.format}, the display uses {display_format()}")
+        return False
+    pack = candidate
+    return True
+
+
+def packed(name):
+    """Surface of a pack entry, None without a pack or if the entry is missing or stale"""
+    if pack is None or not pack.fresh(name):
+        return None
+    return pack.surface(name)
+
+
+def _from_pack(key):
+    img = packed(pack_name(key))
+    if img is not None:
+        _pending.pop(key, None)
+        _stats['pack_loads'] += 1
+        _images[key] = img
+    return img
+
+
+#----------------background loading------------------------------------------------------
+
+def submit(work, *args, finish=None):
+    """Run work(*args) on a loader thread, finish(result) is called on the main thread by poll() or wait()"""
+    global _pool, _submitted
+    if _pool is None:
+        _pool = ThreadPoolExecutor(LOADER_THREADS, thread_name_prefix="assets")
+    future = _pool.submit(work, *args)
+    _jobs[future] = finish
+    _submitted += 1
+    return future
+
+
+def load_async(paths, alpha=True, finish=None):
+    """Decode images in the background, finish(path, image) is called once each is registered"""
+    for path in paths:
+        key = (path, alpha, None)
+        if key in _images or key in _pending:
+            continue
+        # baked images are mapped straight away, there is nothing to decode
+        img = _from_pack(key)
+        if img is not None:
+            if finish is not None:
+                finish(path, img)
+            continue
+
+        def added(img, key=key):
+            img = _add(key, img)
+            if finish is not None:
+                finish(key[0], img)
+        _pending[key] = submit(pygame.image.load, path, finish=added)
+
+
+def load_sounds_async(paths):
+    """Decode sounds in the background"""
+    for path in paths:
+        if path in _sounds or path in _pending:
+            continue
+
+        def added(snd, path=path):
+            _pending.pop(path, None)
+            _sounds[path] = snd
+        _pending[path] = submit(pygame.mixer.Sound, path, finish=added)
+
+
+def _finish(future):
+    """Wait for a job and hand its result over on the main thread"""
+    finish = _jobs.pop(future)
+    result = future.result()
+    if finish is not None:
+        finish(result)
+
+
+def poll():
+    """Hand over the jobs that are done without waiting, returns how many are still running"""
+    for future in [future for future in _jobs if future.done()]:
+        if future in _jobs:
+            _finish(future)
+    return len(_jobs)
+
+
+def wait():
+    """Block until every job, including ones started by finish callbacks, is handed over"""
+    while _jobs:
+        _finish(next(iter(_jobs)))
+
+
+def progress():
+    """(jobs handed over, jobs submitted)"""
+    return _submitted - len(_jobs), _submitted
+
+
+def stop_loading():
+    """Drop the jobs that have not started and let the loader threads exit"""
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _jobs.clear()
+    _pending.clear()
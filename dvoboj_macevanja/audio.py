@@ -0,0 +1,101 @@
+"""Sound effects on pooled mixer channels, and the background music
+
+Every sound is decoded once by assets.sound(), into the format the mixer
+was opened with, and the same Sound is shared by everyone who plays it.
+Effects are played on channels reserved for their category, so a burst of
+swings can never take the channel of the countdown. When all of a
+category's channels are busy the one that started longest ago is cut off.
+A sound started again in the same frame is dropped, so attack spam mixes at
+most a handful of voices however many ticks a frame runs.
+"""
+import pygame
+import assets
+import perf
+
+# category -> channels reserved for it
+SWING = "swing"
+HIT = "hit"
+VOICE = "voice"
+CHANNELS = {SWING: 2, HIT: 2, VOICE: 1}
+
+
+class AudioBank:
+    """Channels of each sound category, oldest first, and the sounds started this frame"""
+    def __init__(self, channels=CHANNELS):
+        total = sum(channels.values())
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+        # Sound.play() without a channel never picks the reserved ones
+        pygame.mixer.set_reserved(total)
+        self.channels = {}
+        first = 0
+        for category, count in channels.items():
+            self.channels[category] = [pygame.mixer.Channel(index) for index in range(first, first + count)]
+            first += count
+        self.started = set()
+        self.music = None
+        self.played = 0
+        self.dropped = 0
+
+    def play(self, sound, category):
+        """Play a Sound or the sound at a path, returns the channel or None when it was dropped"""
+        if isinstance(sound, str):
+            sound = assets.sound(sound)
+        if sound in self.started:
+            self.dropped += 1
+            perf.count("sounds dropped")
+            return None
+        self.started.add(sound)
+        channels = self.channels[category]
+        channel = next((channel for channel in channels if not channel.get_busy()), channels[0])
+        # the channel just started is the last to be cut off
+        channels.remove(channel)
+        channels.append(channel)
+        channel.play(sound)
+        self.played += 1
+        perf.count("sounds")
+        return channel
+
+    def end_frame(self):
+        self.started.clear()
+
+    def play_music(self, path, volume=1.0):
+        """Loop the music at path, streamed from disk; already playing it only sets the volume"""
+        if self.music != path or not pygame.mixer.music.get_busy():
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.play(-1)
+            self.music = path
+        pygame.mixer.music.set_volume(volume)
+
+    def info(self):
+        return {
+            'played': self.played,
+            'dropped': self.dropped,
+            'music': self.music
+        }
+
+
+# shared by the menu and the fight, opened on first use after mixer.init()
+_bank = None
+
+
+def bank():
+    global _bank
+    if _bank is None:
+        _bank = AudioBank()
+    return _bank
+
+
+def play(sound, category):
+    """AudioBank.play() on the shared bank"""
+    return bank().play(sound, category)
+
+
+def end_frame():
+    """Allow every sound to start again, once per rendered frame"""
+    if _bank is not None:
+        _bank.end_frame()
+
+
+def play_music(path, volume=1.0):
+    bank().play_music(path, volume)
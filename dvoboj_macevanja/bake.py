@@ -0,0 +1,76 @@
+"""Bake the asset pack: every image the game draws, scaled and converted ahead of time
+
+Writes the frame atlases of every character in characters/ (both facings,
+with their trimmed areas), the background layers, the HUD and victory
+overlays and the menu poster at window size into assets.pack, in the pixel
+format of this display.
+The game maps the pack at startup and only decodes PNGs that are missing from
+it or changed since it was baked.
+
+Run from the game folder after changing any image:
+
+    python bake.py
+"""
+import argparse
+import sys
+import time
+
+import pygame
+
+import assets
+import asset_pack
+import characters
+import sprite_cache
+
+# window size of the game (app.py), the menu poster is baked at this size
+SCREEN_SIZE = (1000, 540)
+
+
+def image_entry(path, size=None, extra=None):
+    key = (path, True, size)
+    return assets.pack_name(key), assets.image(path, size=size), [path], extra
+
+
+def atlas_entry(path, size, scale, steps):
+    atlas = sprite_cache.FrameAtlas(assets.image(path), size, scale, steps)
+    extra = {
+        'areas': [[[list(area) for area in pair] for pair in frames] for frames in atlas.areas],
+        'offsets': [[[list(offset) for offset in pair] for pair in frames] for frames in atlas.offsets]
+    }
+    return sprite_cache.pack_name(path, size, scale, steps), atlas.surface, [path], extra
+
+
+def bake(path):
+    pixel_format = asset_pack.display_format()
+    if pixel_format is None:
+        raise SystemExit("the display uses a pixel format the pack can't hold")
+
+    # the pack is mapped, so a big roster only costs memory for the characters in the match
+    entries = []
+    for id in characters.roster():
+        character = characters.load(id)
+        entries.append(atlas_entry(character.sheet, character.frame_size, character.scale, character.steps))
+    entries += [image_entry(layer) for layer in assets.BACKGROUND_LAYERS]
+    entries += [image_entry(overlay, extra={'bounds': list(assets.bounds(overlay))}) for overlay in assets.OVERLAY_IMAGES]
+    entries.append(image_entry(assets.MENU_BACKGROUND, SCREEN_SIZE))
+    size = asset_pack.write_pack(path, pixel_format, entries)
+    return len(entries), size, pixel_format
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Bake the asset pack")
+    parser.add_argument("--output", default=assets.PACK_FILE, help=f"pack to write (default {assets.PACK_FILE})")
+    options = parser.parse_args(argv)
+
+    pygame.init()
+    # convert_alpha() needs a display, its format is the one baked
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    start = time.perf_counter()
+    count, size, pixel_format = bake(options.output)
+    print(f"baked {count} images into {options.output}: {size / 2**20:.1f} MiB, {pixel_format}, {time.perf_counter() - start:.1f} s")
+    pygame.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
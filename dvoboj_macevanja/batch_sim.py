@@ -0,0 +1,433 @@
+"""Vectorized batch simulator: thousands of matches advanced at once with NumPy
+
+Every field of simulation.FighterState and MatchState becomes an array with
+one row per match (and one column per fighter), and BatchMatch.advance() runs
+one tick of simulation.advance() on all of them with array operations. The
+rules are the same, including the order the two fighters are moved and hit
+in. Hits use the body rectangles; the sprite hitboxes are not vectorized.
+
+Damage, cooldown, speed, gravity and jump velocity can differ per match, so
+a balance sweep is one batch:
+
+    python -m batch_sim --matches 20000 --damage 8,10,12 --cooldown 20,25,30
+    python -m batch_sim --check [REPLAY ...]     # must match simulation.advance
+
+--check runs recorded replays (and random inputs) through both simulators
+tick by tick and fails on the first field that differs.
+"""
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+import simulation as sim
+
+# fields compared against simulation.advance by the conformance check
+FIGHTER_FIELDS = sim.FIGHTER_FIELDS
+MATCH_FIELDS = sim.MATCH_FIELDS
+
+
+class BatchMatch:
+    """n matches between the same two characters, as structure of arrays
+
+    specs are the simulation.FighterSpec of player 1 and 2. damage and cooldown
+    are per fighter: a number, an array of n, or an array of (n, 2). speed,
+    gravity and jump_velocity are per match: a number or an array of n.
+    """
+    def __init__(self, n, specs, width=sim.ARENA_WIDTH, height=sim.ARENA_HEIGHT, damage=None, cooldown=None,
+                 speed=sim.SPEED, gravity=sim.GRAVITY, jump_velocity=sim.JUMP_VELOCITY):
+        specs = [spec if isinstance(spec, sim.FighterSpec) else sim.FighterSpec(spec) for spec in specs]
+        self.n = n
+        self.width = width
+        self.height = height
+
+        # animation tables: steps[player, action], frame_ticks[player, action, frame]
+        actions = max(len(spec.steps) for spec in specs)
+        frames = max(max(spec.steps) for spec in specs)
+        self.steps = np.zeros((2, actions), np.int32)
+        # frames past the end of an animation are never shown, they never advance
+        self.frame_ticks = np.full((2, actions, frames), np.iinfo(np.int32).max, np.int32)
+        for player, spec in enumerate(specs):
+            self.steps[player, :len(spec.steps)] = spec.steps
+            for action, ticks in enumerate(spec.frame_ticks):
+                self.frame_ticks[player, action, :len(ticks)] = ticks
+
+        def per_fighter(value, default):
+            if value is None:
+                return np.broadcast_to(np.array(default, np.int32), (n, 2))
+            value = np.asarray(value, np.int32)
+            # one value per match is used by both fighters
+            return np.broadcast_to(value[:, None] if value.ndim == 1 else value, (n, 2))
+        self.damage = per_fighter(damage, [spec.damage for spec in specs])
+        self.cooldown = per_fighter(cooldown, [spec.cooldown for spec in specs])
+        self.speed = np.broadcast_to(np.asarray(speed, np.int32), (n,))
+        self.gravity = np.broadcast_to(np.asarray(gravity, np.int32), (n,))
+        self.jump_velocity = np.broadcast_to(np.asarray(jump_velocity, np.int32), (n,))
+
+        # fighters, [match, player]
+        shape = (n, 2)
+        self.x = np.zeros(shape, np.int32)
+        self.y = np.zeros(shape, np.int32)
+        self.flip = np.zeros(shape, bool)
+        self.vely = np.zeros(shape, np.int32)
+        self.running = np.zeros(shape, bool)
+        self.jump = np.zeros(shape, bool)
+        self.attacking = np.zeros(shape, bool)
+        self.attack_type = np.zeros(shape, np.int32)
+        self.attack_cooldown = np.zeros(shape, np.int32)
+        self.attack_hit_this_attack = np.zeros(shape, bool)
+        self.hit = np.zeros(shape, bool)
+        self.health = np.zeros(shape, np.int32)
+        self.alive = np.zeros(shape, bool)
+        self.action = np.zeros(shape, np.int32)
+        self.frame = np.zeros(shape, np.int32)
+        self.frame_ticks_done = np.zeros(shape, np.int32)
+        self.reset_fighters(np.ones(n, bool))
+
+        # matches
+        self.tick = np.zeros(n, np.int32)
+        self.intro_count = np.full(n, sim.INTRO_COUNT, np.int32)
+        self.intro_ticks = np.zeros(n, np.int32)
+        self.round_over = np.zeros(n, bool)
+        self.round_over_ticks = np.zeros(n, np.int32)
+        self.round_start_tick = np.zeros(n, np.int32)
+        self.score = np.zeros(shape, np.int32)
+        # damage dealt by each fighter with attack 1 and 2, [match, player, attack_type - 1]
+        self.damage_dealt = np.zeros((n, 2, 2), np.int64)
+        self.rounds = np.zeros(n, np.int32)
+        self.round_ticks = np.zeros(n, np.int64)
+
+    def reset_fighters(self, mask):
+        """FighterState.__init__ at the start positions, for the matches in mask"""
+        for player, (x, y, flip) in enumerate(sim.START_POSITIONS):
+            self.x[mask, player] = x
+            self.y[mask, player] = y
+            self.flip[mask, player] = flip
+        for field in (self.vely, self.attack_type, self.attack_cooldown, self.action, self.frame, self.frame_ticks_done):
+            field[mask] = 0
+        for field in (self.running, self.jump, self.attacking, self.attack_hit_this_attack, self.hit):
+            field[mask] = False
+        self.health[mask] = 100
+        self.alive[mask] = True
+
+    #----------------fighter------------------------------------------------------
+
+    def move(self, p, inputs, active):
+        """simulation.move_fighter for fighter p of the active matches"""
+        t = 1 - p
+        x = self.x[:, p]
+        y = self.y[:, p]
+        dx = np.zeros(self.n, np.int32)
+        self.running[active, p] = False
+        self.attack_type[active, p] = 0
+
+        can = active & ~self.attacking[:, p] & self.alive[:, p] & ~self.round_over
+        right = can & (inputs & sim.INPUT_RIGHT != 0)
+        left = can & (inputs & sim.INPUT_LEFT != 0)
+        dx[right] = self.speed[right]
+        dx[left] = -self.speed[left]
+        self.running[right | left, p] = True
+        jump = can & (inputs & sim.INPUT_JUMP != 0) & ~self.jump[:, p]
+        self.vely[jump, p] = self.jump_velocity[jump]
+        self.jump[jump, p] = True
+        attack = can & (inputs & (sim.INPUT_ATTACK1 | sim.INPUT_ATTACK2) != 0)
+        self.attack_type[attack, p] = np.where(inputs[attack] & sim.INPUT_ATTACK2, 2, 1)
+        started = attack & (self.attack_cooldown[:, p] == 0)
+        self.attacking[started, p] = True
+        self.attack_hit_this_attack[started, p] = False
+
+        self.vely[active, p] += self.gravity[active]
+        dy = self.vely[:, p].copy()
+
+        dx = np.where(x + dx < 0, -x, dx)
+        dx = np.where(x + sim.BODY_WIDTH + dx > self.width, self.width - (x + sim.BODY_WIDTH), dx)
+        floor = self.height - sim.FLOOR_MARGIN
+        landed = active & (y + sim.BODY_HEIGHT + dy > floor)
+        self.vely[landed, p] = 0
+        self.jump[landed, p] = False
+        dy = np.where(landed, floor - (y + sim.BODY_HEIGHT), dy)
+
+        center = x + sim.BODY_WIDTH // 2
+        target_center = self.x[:, t] + sim.BODY_WIDTH // 2
+        self.flip[active, p] = ~(target_center > center)[active]
+        cooling = active & (self.attack_cooldown[:, p] > 0)
+        self.attack_cooldown[cooling, p] -= 1
+
+        self.x[active, p] += dx[active]
+        self.y[active, p] += dy[active]
+
+    def update(self, p):
+        """simulation.update_fighter for fighter p of every match"""
+        dead = self.health[:, p] <= 0
+        self.health[dead, p] = 0
+        self.alive[dead, p] = False
+
+        # the action picked this tick, -1 keeps the current one
+        attacking = self.attacking[:, p]
+        attack_type = self.attack_type[:, p]
+        new = np.where(self.running[:, p], sim.ACTION_RUN, sim.ACTION_IDLE)
+        new = np.where(self.jump[:, p], sim.ACTION_JUMP, new)
+        attack_action = np.where(attack_type == 1, sim.ACTION_ATTACK1, np.where(attack_type == 2, sim.ACTION_ATTACK2, -1))
+        new = np.where(attacking, attack_action, new)
+        new = np.where(self.hit[:, p], sim.ACTION_HIT, new)
+        new = np.where(dead, sim.ACTION_DEATH, new)
+        changed = (new >= 0) & (new != self.action[:, p])
+        self.action[changed, p] = new[changed]
+        self.frame[changed, p] = 0
+        self.frame_ticks_done[changed, p] = 0
+
+        action = self.action[:, p]
+        self.frame_ticks_done[:, p] += 1
+        advance = self.frame_ticks_done[:, p] >= self.frame_ticks[p, action, self.frame[:, p]]
+        self.frame[advance, p] += 1
+        self.frame_ticks_done[advance, p] = 0
+
+        steps = self.steps[p, action]
+        ended = self.frame[:, p] >= steps
+        alive = self.alive[:, p]
+        self.frame[ended & ~alive, p] = steps[ended & ~alive] - 1
+        restart = ended & alive
+        self.frame[restart, p] = 0
+        attack_ended = restart & ((action == sim.ACTION_ATTACK1) | (action == sim.ACTION_ATTACK2))
+        self.attacking[attack_ended, p] = False
+        self.attack_hit_this_attack[attack_ended, p] = False
+        hit_ended = restart & (action == sim.ACTION_HIT)
+        self.hit[hit_ended, p] = False
+        self.attacking[hit_ended, p] = False
+        cool = attack_ended | hit_ended
+        self.attack_cooldown[cool, p] = self.cooldown[cool, p]
+
+    def check_hit(self, p, active):
+        """simulation.check_attack_hit for fighter p of the active matches"""
+        t = 1 - p
+        action = self.action[:, p]
+        can = active & self.attacking[:, p] & ~self.attack_hit_this_attack[:, p]
+        attack_frame = (action == sim.ACTION_ATTACK1) | (action == sim.ACTION_ATTACK2)
+        can &= ~(attack_frame & (self.frame[:, p] >= sim.HIT_FRAMES))
+
+        width = sim.BODY_WIDTH * 3 // 2
+        height = sim.BODY_HEIGHT * 6 // 5
+        center = self.x[:, p] + sim.BODY_WIDTH // 2
+        x = np.where(self.flip[:, p], center - width, center)
+        y = self.y[:, p]
+        tx = self.x[:, t]
+        ty = self.y[:, t]
+        hit = can & (x < tx + sim.BODY_WIDTH) & (tx < x + width) & (y < ty + sim.BODY_HEIGHT) & (ty < y + height)
+
+        damage = self.damage[hit, p]
+        self.health[hit, t] -= damage
+        self.hit[hit, t] = True
+        self.attack_hit_this_attack[hit, p] = True
+        # attack_type only lasts the tick an attack starts, the animation tells the attacks apart
+        attack2 = (action[hit] == sim.ACTION_ATTACK2).astype(np.int32)
+        np.add.at(self.damage_dealt, (np.nonzero(hit)[0], p, attack2), damage)
+
+    #----------------match------------------------------------------------------
+
+    def advance(self, inputs):
+        """One tick of every match, inputs is an (n, 2) array of simulation.INPUT_* bitfields"""
+        inputs = np.asarray(inputs)
+        fighting = self.intro_count <= 0
+        self.move(0, inputs[:, 0], fighting)
+        self.move(1, inputs[:, 1], fighting)
+
+        # countdown
+        counting = ~fighting
+        self.intro_ticks[counting] += 1
+        stepped = counting & (self.intro_ticks >= sim.COUNTDOWN_TICKS)
+        self.intro_count[stepped] -= 1
+        self.intro_ticks[stepped] = 0
+
+        self.update(0)
+        self.update(1)
+
+        fighting = self.intro_count <= 0
+        self.check_hit(0, fighting)
+        self.check_hit(1, fighting)
+
+        # rounds
+        playing = ~self.round_over
+        p2_wins = playing & ~self.alive[:, 0]
+        p1_wins = playing & ~p2_wins & ~self.alive[:, 1]
+        self.score[p1_wins, 0] += 1
+        self.score[p2_wins, 1] += 1
+        ended = p1_wins | p2_wins
+        self.rounds[ended] += 1
+        self.round_ticks[ended] += (self.tick - self.round_start_tick)[ended]
+        self.round_over_ticks[~playing] += 1
+        restart = ~playing & (self.round_over_ticks > sim.ROUND_OVER_TICKS)
+        self.round_over[ended] = True
+        self.round_over_ticks[ended] = 0
+
+        self.round_over[restart] = False
+        self.intro_count[restart] = sim.INTRO_COUNT
+        self.intro_ticks[restart] = 0
+        self.round_start_tick[restart] = self.tick[restart]
+        self.reset_fighters(restart)
+
+        self.tick += 1
+
+    def fighter(self, match, player):
+        """Fighter fields of one match as a dict, named like simulation.FighterState"""
+        values = {field: getattr(self, field)[match, player].item() for field in FIGHTER_FIELDS if field != "frame_ticks"}
+        values["frame_ticks"] = self.frame_ticks_done[match, player].item()
+        return values
+
+
+#----------------inputs------------------------------------------------------
+
+def bot_inputs(batch, rng):
+    """Inputs of a simple bot for every fighter of a batch
+
+    Mostly walks at the opponent and swings when close, with enough noise
+    that no two matches play out alike.
+    """
+    n = batch.n
+    bits = np.zeros((n, 2), np.uint8)
+    distance = batch.x[:, ::-1] - batch.x
+    roll = rng.random((n, 2))
+    chase = roll < 0.6
+    bits[chase & (distance > 0)] |= sim.INPUT_RIGHT
+    bits[chase & (distance < 0)] |= sim.INPUT_LEFT
+    bits[(roll >= 0.6) & (roll < 0.75)] |= sim.INPUT_LEFT
+    bits[(roll >= 0.75) & (roll < 0.9)] |= sim.INPUT_RIGHT
+    bits[rng.random((n, 2)) < 0.02] |= sim.INPUT_JUMP
+    attack = rng.random((n, 2)) * np.where(np.abs(distance) < 2 * sim.BODY_WIDTH, 1, 4)
+    bits[attack < 0.1] |= sim.INPUT_ATTACK1
+    bits[(attack >= 0.1) & (attack < 0.15)] |= sim.INPUT_ATTACK2
+    return bits
+
+
+#----------------conformance------------------------------------------------------
+
+def check_conformance(streams, specs):
+    """Run input streams through simulation.advance and BatchMatch side by side
+
+    streams is a list of per-tick (p1, p2) input lists, one per match. Returns
+    None if every field of every match matched on every tick, otherwise a
+    message naming the first difference.
+    """
+    ticks = max(len(stream) for stream in streams)
+    batch = BatchMatch(len(streams), specs)
+    matches = [sim.MatchState(*specs) for _ in streams]
+    inputs = np.zeros((len(streams), ticks, 2), np.uint8)
+    for i, stream in enumerate(streams):
+        inputs[i, :len(stream)] = stream
+
+    for tick in range(ticks):
+        batch.advance(inputs[:, tick])
+        for i, match in enumerate(matches):
+            sim.advance(match, *inputs[i, tick].tolist())
+            for field in MATCH_FIELDS:
+                if getattr(match, field) != getattr(batch, field)[i].item():
+                    return f"match {i} tick {tick}: {field} {getattr(match, field)} != {getattr(batch, field)[i].item()}"
+            if list(match.score) != batch.score[i].tolist():
+                return f"match {i} tick {tick}: score {match.score} != {batch.score[i].tolist()}"
+            for player, fighter in enumerate(match.fighters):
+                values = batch.fighter(i, player)
+                for field in FIGHTER_FIELDS:
+                    if getattr(fighter, field) != values[field]:
+                        return f"match {i} tick {tick} player {player + 1}: {field} {getattr(fighter, field)} != {values[field]}"
+    return None
+
+
+def record_bots(specs, n, ticks, seed):
+    """Per-tick inputs of n bot matches, as streams for check_conformance"""
+    batch = BatchMatch(n, specs)
+    rng = np.random.default_rng(seed)
+    inputs = np.zeros((n, ticks, 2), np.uint8)
+    for tick in range(ticks):
+        inputs[:, tick] = bot_inputs(batch, rng)
+        batch.advance(inputs[:, tick])
+    return inputs.tolist()
+
+
+def conformance_main(paths, seed):
+    import characters
+    import replay
+
+    runs = []
+    for path in paths:
+        recorded = replay.load_replay(path)
+        if recorded.flags & replay.FLAG_HITBOXES:
+            print(f"note: {path} was recorded with sprite hitboxes, both sides are run with body rectangles")
+        runs.append((path, recorded.specs(), [recorded[tick] for tick in range(len(recorded))]))
+    # bot matches play whole rounds: deaths, the victory screen and the restart
+    specs = [characters.load("djoko").spec, characters.load("vlajko").spec]
+    runs.append((f"32 bot matches, seed {seed}", specs, record_bots(specs, 32, 3000, seed)))
+
+    for name, specs, streams in runs:
+        if name in paths:
+            streams = [streams]
+        failure = check_conformance(streams, specs)
+        if failure:
+            print(f"{name}: MISMATCH {failure}")
+            return 1
+        print(f"{name}: {max(len(stream) for stream in streams)} ticks identical to simulation.advance")
+    return 0
+
+
+#----------------sweeps------------------------------------------------------
+
+def parse_values(text, kind=int):
+    return [kind(value) for value in text.split(",")]
+
+
+def sweep_main(options):
+    import characters
+
+    specs = [characters.load(options.p1).spec, characters.load(options.p2).spec]
+    # without --damage or --cooldown every fighter keeps the numbers of its manifest
+    grid = list(itertools.product(options.damage or [-1], options.cooldown or [-1],
+                                  options.speed, options.gravity, options.jump))
+    per_point = max(1, options.matches // len(grid))
+    n = per_point * len(grid)
+    columns = np.repeat(np.array(grid, np.int32), per_point, axis=0)
+    batch = BatchMatch(n, specs, damage=columns[:, 0] if options.damage else None,
+                       cooldown=columns[:, 1] if options.cooldown else None,
+                       speed=columns[:, 2], gravity=columns[:, 3], jump_velocity=columns[:, 4])
+
+    rng = np.random.default_rng(options.seed)
+    start = time.perf_counter()
+    for _ in range(options.ticks):
+        batch.advance(bot_inputs(batch, rng))
+    elapsed = time.perf_counter() - start
+    print(f"{n} matches x {options.ticks} ticks in {elapsed:.1f} s ({n * options.ticks / elapsed:,.0f} match ticks/s)")
+
+    print(f"{'damage':>6} {'cooldown':>8} {'speed':>5} {'gravity':>7} {'jump':>5} {'rounds':>7} {'p1 win':>7} "
+          f"{'ticks/round':>11} {'attack2 dmg':>11}")
+    for index, point in enumerate(grid):
+        rows = slice(index * per_point, (index + 1) * per_point)
+        damage, cooldown, speed, gravity, jump = ["spec" if value == -1 else value for value in point]
+        rounds = batch.rounds[rows].sum()
+        wins = batch.score[rows, 0].sum()
+        length = batch.round_ticks[rows].sum() / max(rounds, 1)
+        dealt = batch.damage_dealt[rows].sum(axis=(0, 1))
+        print(f"{damage:>6} {cooldown:>8} {speed:>5} {gravity:>7} {jump:>5} {rounds:>7} {wins / max(rounds, 1):>7.1%} "
+              f"{length:>11.0f} {dealt[1] / max(dealt.sum(), 1):>11.1%}")
+    return 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Vectorized batch simulator")
+    parser.add_argument("--check", nargs="*", metavar="REPLAY", help="conformance check against simulation.advance")
+    parser.add_argument("--matches", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=3 * 60 * sim.TICK_RATE, help="ticks to run (default 3 minutes)")
+    parser.add_argument("--p1", default="djoko")
+    parser.add_argument("--p2", default="vlajko")
+    parser.add_argument("--damage", type=parse_values, help="comma separated values to sweep")
+    parser.add_argument("--cooldown", type=parse_values)
+    parser.add_argument("--speed", type=parse_values, default=[sim.SPEED])
+    parser.add_argument("--gravity", type=parse_values, default=[sim.GRAVITY])
+    parser.add_argument("--jump", type=parse_values, default=[sim.JUMP_VELOCITY], help="jump velocities")
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args(argv)
+    if options.check is not None:
+        return conformance_main(options.check, options.seed)
+    return sweep_main(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
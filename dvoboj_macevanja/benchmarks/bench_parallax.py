@@ -0,0 +1,66 @@
+"""Micro-benchmark: old nested-loop drawbg against the baked ParallaxBackground
+
+Run from the game folder:
+    python -m benchmarks.bench_parallax
+"""
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from parallax import ParallaxBackground
+
+SC_WIDTH = 1000
+SC_HEIGHT = 540
+FRAMES = 600
+
+
+def old_drawbg(screen, bg_images, bg_width, scroll):
+    """drawbg as it was before the baked background, returns the number of blits"""
+    blits = 0
+    for x in range(len(bg_images)):
+        speed_sc=1
+        for i in bg_images:
+            screen.blit(i,((x*bg_width) - scroll*speed_sc,0))
+            speed_sc+=0.2
+            blits += 1
+    return blits
+
+
+def run(name, draw):
+    blits = 0
+    start = time.perf_counter()
+    for frame in range(FRAMES):
+        # sweep the whole scroll range back and forth, like holding left/right
+        scroll = abs(frame * 5 % 600 - 300)
+        blits += draw(scroll)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {blits / FRAMES:5.1f} blits/frame  {elapsed / FRAMES * 1000:6.3f} ms/frame")
+    return elapsed
+
+
+def main():
+    pygame.init()
+    screen = pygame.display.set_mode((SC_WIDTH, SC_HEIGHT))
+    bg_images = [pygame.image.load(f"Background/paralaxbg2/img {i}.png").convert_alpha() for i in range(4, 0, -1)]
+    bg_width = bg_images[0].get_width()
+    background = ParallaxBackground(bg_images, SC_WIDTH)
+
+    # both renderers must produce the same picture
+    for scroll in (0, 155, 300):
+        old_drawbg(screen, bg_images, bg_width, scroll)
+        expected = pygame.image.tobytes(screen, "RGB")
+        background.draw(screen, scroll)
+        if pygame.image.tobytes(screen, "RGB") != expected:
+            print(f"warning: output differs at scroll={scroll}")
+
+    old = run("drawbg", lambda scroll: old_drawbg(screen, bg_images, bg_width, scroll))
+    new = run("parallax", lambda scroll: background.draw(screen, scroll))
+    print(f"speedup: {old / new:.2f}x")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
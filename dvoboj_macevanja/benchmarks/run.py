@@ -0,0 +1,191 @@
+"""Frame-time and startup benchmark on the headless SDL drivers
+
+Plays a scripted match through the real game loop of app.py (Fighter, the
+renderer, the HUD) with SDL_VIDEODRIVER=dummy and SDL_AUDIODRIVER=dummy,
+one tick per frame as fast as possible, and reports:
+
+    - p50/p99 of every loop phase (events, input, move, update, collision, drawbg,
+      Fighter.draw, draw, flip, frame)
+    - p50/p99 of drawing the main menu
+    - import time of app.py and everything it imports, which does no work
+    - startup time (App.init(); replays skip the menu, so this waits for every asset)
+      time to the first menu frame is measured by benchmarks/startup.py
+    - peak memory
+
+Run from the game folder:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json      # exit 1 on a regression
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+VERSION = 1
+# phase timings compared against a baseline
+COMPARED = ("p50", "p99")
+
+
+def scripted_inputs(ticks):
+    """Deterministic input for both players: walk in, trade attacks, jump now and then"""
+    import simulation
+    inputs = []
+    for tick in range(ticks):
+        p1 = p2 = 0
+        phase = tick % 240
+        if phase < 60:
+            p1 |= simulation.INPUT_RIGHT
+            p2 |= simulation.INPUT_LEFT
+        elif phase < 180:
+            if tick % 30 == 0:
+                p1 |= simulation.INPUT_ATTACK1
+            if tick % 45 == 10:
+                p2 |= simulation.INPUT_ATTACK2
+        else:
+            p1 |= simulation.INPUT_LEFT
+            p2 |= simulation.INPUT_RIGHT
+        if tick % 200 == 100:
+            p1 |= simulation.INPUT_JUMP
+        if tick % 170 == 50:
+            p2 |= simulation.INPUT_JUMP
+        inputs.append((p1, p2))
+    return inputs
+
+
+def peak_memory_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_benchmark(ticks, menu_frames, game_args):
+    import characters
+    import replay
+
+    # the match is a replay of the scripted inputs, which also skips the menu
+    p1, p2 = characters.load("djoko"), characters.load("vlajko")
+    # flagged like a recorded game, so hits are decided by the sprite hitboxes as in play
+    script = replay.Replay(p1.steps, p2.steps, flags=replay.FLAG_HITBOXES, characters=(p1.id, p2.id))
+    for p1, p2 in scripted_inputs(ticks):
+        script.record(p1, p2)
+    handle, path = tempfile.mkstemp(suffix=".dvr")
+    os.close(handle)
+    script.save(path)
+
+    start = time.perf_counter()
+    import app
+    import_ms = (time.perf_counter() - start) * 1000
+    try:
+        game = app.App(app.parse_args(["--replay", path, *game_args]))
+        start = time.perf_counter()
+        game.init()
+        startup_ms = (time.perf_counter() - start) * 1000
+    finally:
+        os.remove(path)
+
+    import perf
+    import pygame
+
+    # menu: force a full redraw every frame, the idle case costs nothing
+    main_menu = app.MenuScene(game).main_menu
+    menu = []
+    for _ in range(menu_frames):
+        main_menu.invalidate()
+        t = time.perf_counter()
+        main_menu.draw(game.screen)
+        game.renderer.flip()
+        menu.append((time.perf_counter() - t) * 1000)
+
+    perf.reset()
+    perf.enable()
+    frames = game.run(lockstep=True)
+    perf.enable(False)
+
+    result = {
+        "version": VERSION,
+        "ticks": ticks,
+        "frames": frames,
+        "renderer": "gpu" if game.gpu else "surface",
+        "import_ms": import_ms,
+        "startup_ms": startup_ms,
+        "peak_memory_kb": peak_memory_kb(),
+        "phases": perf.summary(),
+        "menu": {"p50": perf.percentile(menu, 0.50), "p99": perf.percentile(menu, 0.99)},
+        "score": list(game.match.score),
+    }
+    game.shutdown()
+    return result
+
+
+def compare(result, baseline, tolerance):
+    """Regressions of result against baseline, as messages"""
+    failures = []
+
+    def check(name, value, reference):
+        # sub-millisecond noise is not a regression
+        if reference is not None and value > reference * (1 + tolerance) and value - reference > 0.05:
+            failures.append(f"{name}: {value:.3f} ms (baseline {reference:.3f} ms)")
+
+    for phase, stats in result["phases"].items():
+        reference = baseline["phases"].get(phase)
+        if reference:
+            for key in COMPARED:
+                check(f"{phase} {key}", stats[key], reference[key])
+    for key in COMPARED:
+        check(f"menu {key}", result["menu"][key], baseline["menu"][key])
+    check("startup", result["startup_ms"], baseline["startup_ms"])
+    return failures
+
+
+def report(result):
+    print(f"renderer: {result['renderer']}  frames: {result['frames']}")
+    print(f"import: {result['import_ms']:.1f} ms  startup: {result['startup_ms']:.1f} ms  "
+          f"peak memory: {result['peak_memory_kb']} kB")
+    print(f"{'phase':>16} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for phase, stats in result["phases"].items():
+        print(f"{phase:>16} {stats['p50']:9.3f} {stats['p99']:9.3f} {stats['mean']:9.3f}")
+    print(f"{'menu':>16} {result['menu']['p50']:9.3f} {result['menu']['p99']:9.3f}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless frame-time benchmark")
+    parser.add_argument("--ticks", type=int, default=1800, help="ticks of scripted play (default 1800, 30 s)")
+    parser.add_argument("--menu-frames", type=int, default=120)
+    parser.add_argument("--gpu", action="store_true", help="benchmark the SDL2 texture renderer")
+    parser.add_argument("--output", metavar="FILE", help="save the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="fail if slower than the results in FILE")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (default 0.25)")
+    options = parser.parse_args(argv)
+
+    result = run_benchmark(options.ticks, options.menu_frames, ["--gpu"] if options.gpu else [])
+    report(result)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        failures = compare(result, baseline, options.tolerance)
+        if failures:
+            print("regressions:")
+            for failure in failures:
+                print("  " + failure)
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
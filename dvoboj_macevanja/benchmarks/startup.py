@@ -0,0 +1,50 @@
+"""Time to first frame: from starting the game (python -m app) until the menu is on screen
+
+Every run is a fresh interpreter on the headless SDL drivers, so nothing is
+cached between runs. The first display update ends the run.
+
+Run from the game folder:
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# runs the game and prints the milliseconds until the first display update
+PROBE = """
+import os, runpy, sys, time
+started = time.perf_counter()
+import pygame
+
+def first_frame(*args):
+    print((time.perf_counter() - started) * 1000, flush=True)
+    os._exit(0)
+
+pygame.display.update = first_frame
+pygame.display.flip = first_frame
+sys.argv = ["app"]
+sys.path.insert(0, ".")
+runpy.run_module("app", run_name="__main__")
+"""
+
+
+def first_frame_ms():
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, timeout=120, check=True)
+    return float(output.stdout.split()[-1])
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Time to first frame of the menu")
+    parser.add_argument("--runs", type=int, default=5)
+    options = parser.parse_args(argv)
+
+    times = sorted(first_frame_ms() for _ in range(options.runs))
+    print(f"first frame: median {times[len(times) // 2]:.1f} ms  min {times[0]:.1f} ms  max {times[-1]:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,131 @@
+"""Character manifests: everything that makes one fighter different from another
+
+Each character is a JSON file in characters/, named after its id:
+
+    name        name shown in the game
+    sprite      sheet, frame_size (pixels of a frame in the sheet), scale and
+                offset (where the body sits inside a scaled frame)
+    animations  frames in each row of the sheet, in order: idle, run, jump,
+                attack1, attack2, hit, death, fall
+    frame_ms    how long a frame is shown: one number, or per animation a
+                number or a list with one number per frame
+    attack      damage of a hit and cooldown_ticks after an attack
+    sounds      attack (a hit) and miss (a swing)
+
+Manifests are read and checked once and shared by every round and Fighter.
+Only the characters picked for a match are ever loaded, sprites and sounds
+of the rest of the roster are never touched. Nothing here needs pygame, so
+headless tools can use the fight numbers without a display.
+"""
+import json
+import os
+
+import simulation
+
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+CHARACTER_DIR = os.path.join(GAME_DIR, "characters")
+# rows of the spritesheet, in order
+ANIMATIONS = ("idle", "run", "jump", "attack1", "attack2", "hit", "death", "fall")
+
+# id -> Character
+_characters = {}
+
+
+class CharacterError(ValueError):
+    """A manifest is missing or invalid"""
+
+
+class Character:
+    """A checked character manifest"""
+    def __init__(self, id, manifest, path):
+        self.id = id
+        self.path = path
+        self.name = _get(manifest, "name", str, path)
+
+        sprite = _get(manifest, "sprite", dict, path)
+        self.sheet = _get(sprite, "sheet", str, path)
+        self.frame_size = _get(sprite, "frame_size", int, path)
+        self.scale = _get(sprite, "scale", int, path)
+        self.offset = tuple(_get(sprite, "offset", list, path))
+        if len(self.offset) != 2 or not all(isinstance(value, int) for value in self.offset):
+            raise CharacterError(f"{path}: sprite.offset must be two integers")
+
+        animations = _get(manifest, "animations", dict, path)
+        if tuple(animations) != ANIMATIONS:
+            raise CharacterError(f"{path}: animations must be {', '.join(ANIMATIONS)}, in that order")
+        self.steps = tuple(animations.values())
+        if not all(isinstance(count, int) and count > 0 for count in self.steps):
+            raise CharacterError(f"{path}: every animation needs at least one frame")
+
+        attack = _get(manifest, "attack", dict, path)
+        self.damage = _get(attack, "damage", int, path)
+        self.cooldown = _get(attack, "cooldown_ticks", int, path)
+
+        sounds = _get(manifest, "sounds", dict, path)
+        self.attack_sound = _get(sounds, "attack", str, path)
+        self.miss_sound = _get(sounds, "miss", str, path)
+        for file in self.files():
+            if not os.path.exists(os.path.join(GAME_DIR, file)):
+                raise CharacterError(f"{path}: {file} does not exist")
+
+        self.frame_ticks = self.timings(manifest.get("frame_ms", simulation.ANIMATION_COOLDOWN))
+        self.spec = simulation.FighterSpec(self.steps, self.frame_ticks, self.damage, self.cooldown)
+
+    def timings(self, frame_ms):
+        """frame_ms of the manifest as ticks per frame of every animation"""
+        if not isinstance(frame_ms, dict):
+            frame_ms = {name: frame_ms for name in ANIMATIONS}
+        unknown = set(frame_ms) - set(ANIMATIONS)
+        if unknown:
+            raise CharacterError(f"{self.path}: frame_ms of unknown animations {sorted(unknown)}")
+        ticks = []
+        for name, count in zip(ANIMATIONS, self.steps):
+            ms = frame_ms.get(name, simulation.ANIMATION_COOLDOWN)
+            if not isinstance(ms, list):
+                ms = [ms] * count
+            if len(ms) != count or not all(isinstance(value, (int, float)) and value > 0 for value in ms):
+                raise CharacterError(f"{self.path}: frame_ms.{name} needs {count} positive numbers")
+            # same rounding as the original 70 ms frame timer
+            ticks.append(tuple(int(value * simulation.TICK_RATE // 1000) + 1 for value in ms))
+        return tuple(ticks)
+
+    @property
+    def draw_offset(self):
+        """How far left of and above the fighter's position a frame is drawn"""
+        return (self.offset[0] - self.scale, self.offset[1] - self.scale)
+
+    def files(self):
+        """Files the character needs, relative to the game folder"""
+        return [self.sheet, self.attack_sound, self.miss_sound]
+
+
+def _get(section, key, kind, path):
+    value = section.get(key)
+    # bool is an int, but never a valid number here
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise CharacterError(f"{path}: '{key}' must be a {kind.__name__}")
+    return value
+
+
+def roster():
+    """Ids of every character, without loading any of them"""
+    return sorted(name[:-5] for name in os.listdir(CHARACTER_DIR) if name.endswith(".json"))
+
+
+def load(id):
+    """Return the character with this id, reading and checking its manifest on first use"""
+    character = _characters.get(id)
+    if character is None:
+        path = os.path.join(CHARACTER_DIR, f"{id}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except OSError as e:
+            raise CharacterError(f"no character '{id}': {e}") from e
+        except json.JSONDecodeError as e:
+            raise CharacterError(f"{path}: {e}") from e
+        if not isinstance(manifest, dict):
+            raise CharacterError(f"{path}: a manifest is a JSON object")
+        character = _characters[id] = Character(id, manifest, path)
+    return character
+
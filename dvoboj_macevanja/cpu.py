@@ -0,0 +1,458 @@
+"""CPU opponent: picks a player's input bits from the match state
+
+A CPU is called once per tick with the MatchState, exactly like the keyboard
+and controllers are read, and returns the simulation.INPUT_* bits of its
+player, so it drives a Fighter through the same input path (and shows up
+in recordings like any player).
+
+Every few ticks it decides on one of CHOICES by looking ahead: each choice
+is played forward on copies of the two FighterStates with the simulation
+functions, then the CPU's next choices from there, down to the lookahead
+depth of its level. The opponent is assumed to keep running the way it
+was, and to swing whenever its attack is ready and one of its attacks
+reaches where the CPU was a moment ago, unless it has just let such
+chances pass.
+Reach is looked up in precomputed windows of where and when each attack
+of each fighter lands (ReachTable), tested like the hits of the match
+itself, and positions along a line are scored on health and on the
+exchange from there: whose attack would land first, and whether that hit
+kills, is answered by a counter from the hit animation (a trade, with the
+body rectangles) or lands free.
+
+A decision never costs a frame: the search is a generator that plays at
+most BUDGET_TICKS simulation ticks per game tick (1-2 ms), the CPU keeps
+its last input until it finishes, and decisions are cached by a coarse key
+of the situation, so a situation seen before is answered without searching.
+The budget is counted in simulated ticks rather than measured on the clock,
+so a CPU plays the same on every machine and tournaments can be repeated.
+"""
+import perf
+import simulation as sim
+
+# difficulty -> lookahead depth, in decisions
+LEVELS = {1: 1, 2: 2, 3: 3}
+DEFAULT_LEVEL = 2
+# simulation ticks the search plays per game tick, 1-2 ms, far below the 16.7 ms of a frame;
+# enough for a level 3 search to finish while the decision before it is held
+BUDGET_TICKS = 160
+# ticks a decision is held, and played forward per step of the lookahead
+DECISION_TICKS = 6
+# situations whose decision is remembered
+CACHE_SIZE = 4096
+# ticks an opponent can let pass with the CPU in its reach before it is no longer expected to swing
+PATIENCE = 2 * DECISION_TICKS
+# share of a hit's worth a position counts when the hit would land right away, less the later it lands
+EXCHANGE = 0.5
+
+# what the CPU can decide to do until the next decision
+IDLE = 0
+TOWARD = 1
+AWAY = 2
+JUMP = 3
+ATTACK1 = 4
+ATTACK2 = 5
+CHOICES = (IDLE, TOWARD, AWAY, JUMP, ATTACK1, ATTACK2)
+# choices searched after the first one, fewer so the deepest level fits the budget
+LATER_CHOICES = (IDLE, TOWARD, AWAY, ATTACK1)
+
+# (spec, attacker table, target table) -> ReachTable
+_reach = {}
+
+
+class ReachTable:
+    """Where each attack of a fighter lands, from pressing the button until it can attack again
+
+    windows[flip][attack_type] lists (tick, x_min, x_max, y_min, y_max, pixels):
+    on that tick after the press the attack can hit a target whose position
+    relative to the attacker's is inside the open ranges, the attacker facing
+    left when flip is set and the target facing it. Worked out once per
+    character by playing the attack through update_fighter. With the body
+    rectangles the ranges are exact and pixels is None; with the sprite
+    hitboxes they are the bounds of the attack box against the target's idle
+    hurt box, and pixels is (attack mask, hurt mask, x, y) for the same pixel
+    test hitboxes.HitboxTable.hits makes, so the reach is the one hits land
+    with in play. ticks maps (action, frame, frame_ticks) of an attack under
+    way to the tick after the press it is at.
+    """
+    def __init__(self, spec, table=None, target_table=None):
+        self.windows = ({}, {})
+        self.ticks = {}
+        self.stun = spec.frame_ticks[sim.ACTION_HIT]
+        self.cooldown = spec.cooldown
+        # with the body rectangles an attack started in the hit animation can land
+        # on every tick of it: the x and y ranges of its box per flip, None with hitboxes
+        self.counter = None
+        if table is None or target_table is None:
+            self.counter = []
+            for flip in (False, True):
+                state = sim.FighterState(1, 0, 0, flip)
+                state.attacking = True
+                x, y, width, height = sim.attack_box(state)
+                self.counter.append((x - sim.BODY_WIDTH, x + width, y - sim.BODY_HEIGHT, y + height))
+        for flip in (False, True):
+            hurt = target_table.hurt[sim.ACTION_IDLE][0][not flip] if target_table is not None else None
+            for attack_type in (1, 2):
+                state = sim.FighterState(1, 0, 0, flip)
+                state.attack_type = attack_type
+                sim.attack(state)
+                windows = []
+                tick = 0
+                while state.attacking or state.attack_cooldown > 0:
+                    sim.update_fighter(state, spec)
+                    if state.attacking:
+                        self.ticks[state.action, state.frame, state.frame_ticks] = tick
+                    if state.attacking and not state.attack_hit_this_attack:
+                        if table is not None and target_table is not None:
+                            box = table.attack[state.action][state.frame][flip]
+                            if box is not None and hurt is not None:
+                                # the attack box against the target's hurt box, as an offset between the two positions
+                                windows.append((tick, box[0] - hurt[0] - hurt[2], box[0] + box[2] - hurt[0],
+                                                box[1] - hurt[1] - hurt[3], box[1] + box[3] - hurt[1],
+                                                (box[4], hurt[4], hurt[0] - box[0], hurt[1] - box[1])))
+                        elif state.frame < sim.HIT_FRAMES:
+                            x, y, width, height = sim.attack_box(state)
+                            windows.append((tick, x - sim.BODY_WIDTH, x + width, y - sim.BODY_HEIGHT, y + height, None))
+                    state.attack_type = 0
+                    if state.attack_cooldown > 0:
+                        state.attack_cooldown -= 1
+                    tick += 1
+                self.windows[flip][attack_type] = windows
+
+    def first_hit(self, attack_type, dx, dy, flip, after=-1):
+        """Tick after the press the attack first lands on a target dx, dy away, None if it never does"""
+        for tick, x_min, x_max, y_min, y_max, pixels in self.windows[flip][attack_type]:
+            if tick <= after:
+                continue
+            if x_min < dx < x_max and y_min < dy < y_max:
+                if pixels is None:
+                    return tick
+                attack, hurt, x, y = pixels
+                if attack.overlap(hurt, (dx + x, dy + y)) is not None:
+                    return tick
+        return None
+
+    def in_reach(self, attack_type, dx, dy, flip, within=None):
+        """Whether the attack lands on a target dx, dy away, in the first `within` ticks after the press"""
+        tick = self.first_hit(attack_type, dx, dy, flip)
+        return tick is not None and (within is None or tick < within)
+
+
+def get_reach(spec, table=None, target_table=None):
+    """Return the cached ReachTable of a fighter"""
+    key = (spec, table, target_table)
+    reach = _reach.get(key)
+    if reach is None:
+        reach = _reach[key] = ReachTable(spec, table, target_table)
+    return reach
+
+
+class CPU:
+    """Computer player
+
+    player is 1 or 2, level a key of LEVELS, how far it looks ahead. seed
+    only sets which ticks it decides on, so games of a tournament
+    (tournament.py) with other seeds play out differently.
+    """
+    def __init__(self, player, seed=None, level=DEFAULT_LEVEL, budget=BUDGET_TICKS):
+        self.player = player
+        self.depth = LEVELS[level]
+        self.budget = budget
+        self.choice = IDLE
+        # tick within DECISION_TICKS the CPU decides on, so CPUs with other seeds meet differently
+        self.phase = (seed or 0) % DECISION_TICKS
+        self.hold = self.phase
+        self.search = None
+        # choice of the last finished search, until it is used
+        self.found = None
+        self.cache = {}
+        self.reach = None
+        # simulation ticks played by the search during this game tick
+        self.work = 0
+        # position of the opponent on the last tick, to guess where it is going
+        self.last_x = None
+        # ticks the opponent could have swung at the CPU and didn't
+        self.passes = 0
+        self.stats = {"decisions": 0, "cache_hits": 0, "searches": 0}
+
+    @perf.timed("CPU.decide")
+    def __call__(self, match):
+        me = match.fighters[self.player - 1]
+        other = match.fighters[2 - self.player]
+        predicted = self.predict(other)
+        if not match.fighting or match.round_over:
+            self.search = None
+            self.found = None
+            self.hold = self.phase
+            return 0
+        if self.reach is None:
+            self.prepare(match)
+        self.watch(me, other)
+
+        self.work = 0
+        self.hold -= 1
+        self.think()
+        if self.hold <= 0:
+            key = self.situation(me, other, predicted)
+            choice = self.cache.get(key)
+            if choice is not None:
+                self.stats["cache_hits"] += 1
+            elif self.found is not None:
+                # searched from where this position was expected to be, a few ticks ago
+                choice = self.found
+            elif self.search is None:
+                self.search = self.plan(me.copy(), other.copy(), predicted, key)
+                self.think()
+                choice = self.found
+            # until a search is done the last choice is kept
+            if choice is not None:
+                self.decide(choice)
+                if self.search is None:
+                    # search the next decision while this one is held, from where it should lead
+                    next_me = me.copy()
+                    next_other = other.copy()
+                    self.play(next_me, next_other, choice, predicted)
+                    key = self.situation(next_me, next_other, predicted)
+                    if key not in self.cache:
+                        self.search = self.plan(next_me, next_other, predicted, key)
+        return self.inputs(self.choice, me, other)
+
+    def think(self):
+        """Run the search until this tick's budget is spent"""
+        if self.search is None:
+            return
+        for _ in self.search:
+            if self.work >= self.budget:
+                return
+        self.search = None
+
+    def prepare(self, match):
+        """Reach tables of both fighters, with the hitboxes when the match has them"""
+        specs = match.specs
+        tables = match.hitboxes or (None, None)
+        mine = self.player - 1
+        theirs = 1 - mine
+        self.reach = get_reach(specs[mine], tables[mine], tables[theirs])
+        self.other_reach = get_reach(specs[theirs], tables[theirs], tables[mine])
+        self.specs = specs
+        self.tables = match.hitboxes
+        self.size = (match.width, match.height)
+
+    def watch(self, me, other):
+        """Count the ticks the opponent had the CPU in reach and did not swing"""
+        if other.attacking:
+            self.passes = 0
+        elif other.attack_cooldown == 0 and other.alive and not other.hit and self.other_attack(me.x, me.y, other):
+            self.passes += 1
+
+    def other_attack(self, x, y, other):
+        """The opponent's attack that lands on the CPU at x, y, 1 or 2, 0 when none does"""
+        dx = x - other.x
+        dy = y - other.y
+        for attack in (1, 2):
+            if self.other_reach.in_reach(attack, dx, dy, dx < 0):
+                return attack
+        return 0
+
+    @property
+    def swings(self):
+        """Whether the opponent is expected to swing when it can reach the CPU"""
+        return self.passes < PATIENCE
+
+    def predict(self, other):
+        """The opponent's movement as seen from its last move: running somewhere or standing"""
+        moved = 0 if self.last_x is None else other.x - self.last_x
+        self.last_x = other.x
+        if moved > 0:
+            return sim.INPUT_RIGHT
+        if moved < 0:
+            return sim.INPUT_LEFT
+        return 0
+
+    def situation(self, me, other, predicted):
+        """Coarse key of everything a decision depends on"""
+        horizon = DECISION_TICKS * self.depth
+        return ((other.x - me.x) // 16, (other.y - me.y) // 30, me.action, me.frame, me.attacking, me.jump,
+                min(me.attack_cooldown, horizon) // 3, other.action, other.frame, other.attacking, other.jump,
+                min(other.attack_cooldown, horizon) // 3, predicted, self.swings)
+
+    def decide(self, choice):
+        self.choice = choice
+        self.found = None
+        self.hold = DECISION_TICKS
+        self.stats["decisions"] += 1
+
+    @staticmethod
+    def inputs(choice, me, other):
+        """Input bits of a choice in the current position"""
+        toward = sim.INPUT_RIGHT if other.centerx > me.centerx else sim.INPUT_LEFT
+        if choice == TOWARD:
+            return toward
+        if choice == AWAY:
+            return toward ^ (sim.INPUT_LEFT | sim.INPUT_RIGHT)
+        if choice == JUMP:
+            return sim.INPUT_JUMP | toward
+        if choice == ATTACK1:
+            return sim.INPUT_ATTACK1
+        if choice == ATTACK2:
+            return sim.INPUT_ATTACK2
+        return 0
+
+    #----------------search------------------------------------------------------
+
+    def plan(self, me, other, predicted, key):
+        """Search every line of choices down to the lookahead depth, yielding after each step
+
+        Ends by caching the first choice of the best line for key, and leaving it in found.
+        """
+        self.stats["searches"] += 1
+        best = None
+        best_score = None
+        for choice in CHOICES:
+            score = None
+            for value in self.lines(me, other, choice, predicted, self.depth, 0):
+                if value is not None:
+                    score = value if score is None else max(score, value)
+                yield
+            if best_score is None or score > best_score:
+                best = choice
+                best_score = score
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+        self.cache[key] = best
+        self.found = best
+
+    def lines(self, me, other, choice, predicted, depth, total):
+        """Play choice for DECISION_TICKS, then every choice after it
+
+        Yields the score of every line, the sum of the positions along it, so
+        the sooner a line gains something the better; None after each step,
+        where the search can be paused.
+        """
+        me = me.copy()
+        other = other.copy()
+        over = self.play(me, other, choice, predicted)
+        value = self.evaluate(me, other)
+        total += value
+        if over or depth <= 1:
+            # a line that ends with a death keeps its last position for the steps it skips,
+            # or the sooner a kill the lower it would score
+            yield total + value * (depth - 1)
+            return
+        for next_choice in LATER_CHOICES:
+            yield from self.lines(me, other, next_choice, predicted, depth - 1, total)
+            yield None
+
+    def play(self, me, other, choice, predicted):
+        """DECISION_TICKS of the simulation on the copies, returns True when a fighter died"""
+        width, height = self.size
+        mine = self.player - 1
+        spec = self.specs[mine]
+        other_spec = self.specs[1 - mine]
+        tables = self.tables
+        attacker_tables = tables and (tables[mine], tables[1 - mine])
+        target_tables = tables and (tables[1 - mine], tables[mine])
+        swings = self.swings
+        # the opponent reacts to where the CPU was when the step began, not on the tick it steps in
+        seen_x = me.x
+        seen_y = me.y
+        for _ in range(DECISION_TICKS):
+            my_input = self.inputs(choice, me, other)
+            other_input = predicted
+            if swings and other.attack_cooldown == 0 and not other.attacking:
+                attack = self.other_attack(seen_x, seen_y, other)
+                if attack:
+                    other_input = sim.INPUT_ATTACK1 if attack == 1 else sim.INPUT_ATTACK2
+            # same order as simulation.advance: player 1 moves and hits first
+            if mine == 0:
+                sim.move_fighter(me, other, my_input, width, height, False)
+                sim.move_fighter(other, me, other_input, width, height, False)
+            else:
+                sim.move_fighter(other, me, other_input, width, height, False)
+                sim.move_fighter(me, other, my_input, width, height, False)
+            sim.update_fighter(me, spec)
+            sim.update_fighter(other, other_spec)
+            if mine == 0:
+                sim.check_attack_hit(me, other, None, attacker_tables, spec.damage)
+                sim.check_attack_hit(other, me, None, target_tables, other_spec.damage)
+            else:
+                sim.check_attack_hit(other, me, None, target_tables, other_spec.damage)
+                sim.check_attack_hit(me, other, None, attacker_tables, spec.damage)
+            if me.health <= 0 or other.health <= 0:
+                break
+        self.work += DECISION_TICKS
+        return me.health <= 0 or other.health <= 0
+
+    def evaluate(self, me, other):
+        """Score of a position for the CPU: health first, then the exchange whose attack lands first"""
+        score = 10 * (me.health - other.health)
+        if me.health <= 0:
+            score -= 1000
+        if other.health <= 0:
+            score += 1000
+        dx = other.x - me.x
+        dy = other.y - me.y
+        # the first to land wins the exchange, the other's attack is cut off by the hit;
+        # the sooner it would land the more it counts
+        mine = self.strike(self.reach, me, dx, dy, dx < 0)
+        theirs = self.strike(self.other_reach, other, -dx, -dy, dx > 0) if self.swings else None
+        my_spec = self.specs[self.player - 1]
+        other_spec = self.specs[2 - self.player]
+        if mine is not None and (theirs is None or mine < theirs):
+            score += self.exchange(me, other, mine, self.other_reach, my_spec.damage, other_spec.damage)
+        elif theirs is not None and (mine is None or theirs < mine):
+            score -= self.exchange(other, me, theirs, self.reach, other_spec.damage, my_spec.damage)
+        # otherwise close in, without standing on top of the opponent
+        score -= abs(abs(dx) - sim.BODY_WIDTH) / 100
+        return score
+
+    @staticmethod
+    def exchange(attacker, target, when, target_reach, damage, target_damage):
+        """Worth of the attacker landing first in `when` ticks, in points of health difference
+
+        A hit that kills is worth a kill, one the target answers from its hit
+        animation is a trade, worth nothing or a loss when the answer kills,
+        any other hit its damage.
+        """
+        weight = max(1 - when / 60, 0) * EXCHANGE
+        if target.health <= damage:
+            return 1000 * weight
+        counter = target_reach.counter
+        if counter is not None:
+            dx = attacker.x - target.x
+            x_min, x_max, y_min, y_max = counter[dx < 0]
+            if target.attacking:
+                ready = not target.attack_hit_this_attack
+            else:
+                ready = max(target.attack_cooldown - when, 0) < sum(target_reach.stun)
+            if ready and x_min < dx < x_max:
+                return -1000 * weight if attacker.health <= target_damage else 0
+        return 10 * damage * weight
+
+    @staticmethod
+    def strike(reach, state, dx, dy, flip):
+        """Ticks until the fighter's attack under way or quickest next one would land from here, None if it can't"""
+        if not state.alive:
+            return None
+        if state.hit:
+            # with the body rectangles it can answer from the hit animation, else once it is over
+            left = sum(reach.stun[state.frame:]) - state.frame_ticks
+            if reach.counter is not None and (state.attacking or state.attack_cooldown < left):
+                if state.attacking and state.attack_hit_this_attack:
+                    return None
+                x_min, x_max, y_min, y_max = reach.counter[flip]
+                if x_min < dx < x_max and y_min < dy < y_max:
+                    return 0 if state.attacking else state.attack_cooldown
+            return CPU.next_strike(reach, left + reach.cooldown, dx, dy, flip)
+        if state.attacking:
+            now = reach.ticks.get((state.action, state.frame, state.frame_ticks))
+            if now is None or state.attack_hit_this_attack:
+                return None
+            tick = reach.first_hit(state.action - sim.ACTION_ATTACK1 + 1, dx, dy, flip, now)
+            return None if tick is None else tick - now
+        return CPU.next_strike(reach, state.attack_cooldown, dx, dy, flip)
+
+    @staticmethod
+    def next_strike(reach, wait, dx, dy, flip):
+        """Ticks until the quicker of ATTACK1 and ATTACK2 pressed after `wait` ticks lands, None if neither does"""
+        ticks = [tick for tick in (reach.first_hit(attack, dx, dy, flip) for attack in (1, 2)) if tick is not None]
+        return wait + min(ticks) if ticks else None
@@ -0,0 +1,69 @@
+import pygame
+
+
+class DirtyRectRenderer:
+    """Redraws and updates only the parts of the screen that changed
+
+    The background is kept in an off-screen copy. Every frame the areas drawn
+    in the previous frame are restored from that copy, the caller draws the
+    fighters, HUD and overlays and marks the rects it touched, and only those
+    rects (old and new) are passed to pygame.display.update.
+    When scroll changes the whole background moves, so the frame falls back to
+    a full redraw and a full display update.
+    """
+    def __init__(self, screen, draw_background, enabled=True):
+        self.screen = screen
+        self.draw_background = draw_background
+        self.enabled = enabled
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.background_scroll = None   # scroll the background copy was drawn at
+        self.last_scroll = None
+        self.full = True
+        self.previous = []
+        self.current = []
+
+    def begin(self, scroll):
+        """Start a frame: restore the background under last frame's rects or redraw it all"""
+        self.current = []
+        if not self.enabled:
+            self.draw_background(self.screen, scroll)
+            self.full = True
+        elif scroll != self.background_scroll:
+            if scroll == self.last_scroll:
+                # scrolling stopped, refresh the background copy
+                self.draw_background(self.background, scroll)
+                self.background_scroll = scroll
+                self.screen.blit(self.background, (0, 0))
+            else:
+                # still scrolling, the copy would be stale next frame anyway
+                self.draw_background(self.screen, scroll)
+            self.full = True
+        else:
+            for rect in self.previous:
+                self.screen.blit(self.background, rect, rect)
+            self.full = False
+        self.last_scroll = scroll
+
+    def mark(self, rect):
+        """Record an area of the screen drawn this frame"""
+        if rect:
+            self.current.append(pygame.Rect(rect))
+        return rect
+
+    def invalidate(self):
+        """Force a full redraw on the next frame"""
+        self.background_scroll = None
+        self.last_scroll = None
+
+    def flip(self):
+        """Push the whole screen, for frames drawn without begin() like the menu"""
+        pygame.display.update()
+        self.invalidate()
+
+    def present(self):
+        """Push the changed areas to the display"""
+        if self.full:
+            pygame.display.update()
+        else:
+            pygame.display.update(self.previous + self.current)
+        self.previous = self.current
@@ -1,5 +1,12 @@
 import pygame
 from pygame import mixer
+import assets
+import audio
+import sprite_cache
+import hitboxes
+import simulation
+import perf
+from input_manager import KEYBOARD_LAYOUT
 
 # Controller button mappings for PlayStation controllers
 # These are standard mappings that work with most PlayStation controllers
@@ -30,40 +37,79 @@ CONTROLLER_AXES = {
     'R2_TRIGGER': 5  # R2 trigger
 }
 
+def _state_field(name):
+    """Attribute kept on the fighter's simulation state"""
+    def get(self):
+        return getattr(self.state, name)
+    def set(self, value):
+        setattr(self.state, name, value)
+    return property(get, set)
+
 class Fighter():
-    def __init__(self,player,x,y,Flip,data,spritesheet,animationstep,sound,misssound):
+    """A fighter on screen: sprites, sounds and input devices around a simulation.FighterState
+
+    The fight logic itself lives in simulation.py, the methods here read the
+    input devices and play sounds around it.
+    """
+    def __init__(self,player,x,y,Flip,data,spritesheet,animationstep,sound,misssound,state=None,inputs=None,spec=None):
         self.player=player
         self.size=data[0]
         self.img_scale=data[1]
         self.ofset=data[2]
-        self.flip=Flip
-        self.anm_list=self.loadimage(spritesheet, animationstep)   
-        # 0:Still 1:Run 2:Jump 3:Attack1 4:Attack2 5:Damage 6:Die 7:fall
-        self.action=0
-        self.frame=0
+        self.state=state if state is not None else simulation.FighterState(player,x,y,Flip)
+        self.atlas=self.loadimage(spritesheet, animationstep)
+        self.anm_list=self.atlas.anm_list
+        self.steps=tuple(animationstep)
+        # damage, cooldown and frame timings, the defaults unless a character manifest gives them
+        self.spec=spec if spec is not None else simulation.FighterSpec(self.steps)
         self.image=self.anm_list[self.action][self.frame]
-        self.update_time=pygame.time.get_ticks()
-        self.rect=pygame.Rect(x,y,120,180)
-        self.vely=0
-        self.running=False
-        self.jump=False
-        self.attacking=False
-        self.attack_type=0
+        self.image_area=self.atlas.areas[self.action][self.frame]
+        self.image_offset=self.atlas.offsets[self.action][self.frame]
+        # hurt and attack pixels of every frame, where draw() puts the frame
+        self.hitboxes=hitboxes.get_table(self.atlas, (self.ofset[0]-self.img_scale, self.ofset[1]-self.img_scale))
+        # position at the start of the current tick, drawing interpolates from it
+        self.prev_x=self.state.x
+        self.prev_y=self.state.y
         self.attack_sound = sound
         self.attack_misssound = misssound
-        self.attack_cooldown=0
-        self.hit=False
-        self.health=100
-        self.alive=True
-        self.attack_hit_this_attack=False  # Track if this attack already hit
         
-        # Controller support
+        # Controller support, read from the InputManager when there is one
+        self.inputs = inputs
         self.controller_id = player - 1  # Player 1 uses controller 0, Player 2 uses controller 1
         self.controller = None
-        if self.controller_id < pygame.joystick.get_count():
+        if inputs is None and self.controller_id < pygame.joystick.get_count():
             self.controller = pygame.joystick.Joystick(self.controller_id)
             self.controller.init()
 
+    # simulation state, see simulation.FighterState
+    flip=_state_field('flip')
+    vely=_state_field('vely')
+    running=_state_field('running')
+    jump=_state_field('jump')
+    attacking=_state_field('attacking')
+    attack_type=_state_field('attack_type')
+    attack_cooldown=_state_field('attack_cooldown')
+    attack_hit_this_attack=_state_field('attack_hit_this_attack')  # Track if this attack already hit
+    hit=_state_field('hit')
+    health=_state_field('health')
+    alive=_state_field('alive')
+    # 0:Still 1:Run 2:Jump 3:Attack1 4:Attack2 5:Damage 6:Die 7:fall
+    action=_state_field('action')
+    frame=_state_field('frame')
+
+    @property
+    def rect(self):
+        """Body rect, a copy of the position kept in the simulation state"""
+        return pygame.Rect(self.state.x,self.state.y,self.state.width,self.state.height)
+
+    @classmethod
+    def from_character(cls,player,character,state=None,inputs=None):
+        """Fighter for a characters.Character, at the player's start position unless state is given"""
+        x,y,flip=simulation.START_POSITIONS[player-1]
+        data=[character.frame_size,character.scale,list(character.offset)]
+        return cls(player,x,y,flip,data,character.sheet,character.steps,
+                   assets.sound(character.attack_sound),assets.sound(character.miss_sound),state,inputs,character.spec)
+
     def get_controller_input(self):
         """Get controller input for the fighter"""
         input_data = {
@@ -78,30 +124,27 @@ class Fighter():
             return input_data
             
         try:
-            # Get button states
-            buttons = [self.controller.get_button(i) for i in range(self.controller.get_numbuttons())]
-            
-            # Get axis states
-            axes = [self.controller.get_axis(i) for i in range(self.controller.get_numaxes())]
+            # Only the stick and the three buttons used in a fight are read
+            numbuttons = self.controller.get_numbuttons()
             
             # Left stick movement (with deadzone)
             deadzone = 0.3
-            if len(axes) > CONTROLLER_AXES['LEFT_X']:
-                left_x = axes[CONTROLLER_AXES['LEFT_X']]
+            if self.controller.get_numaxes() > CONTROLLER_AXES['LEFT_X']:
+                left_x = self.controller.get_axis(CONTROLLER_AXES['LEFT_X'])
                 if left_x > deadzone:
                     input_data['right'] = True
                 elif left_x < -deadzone:
                     input_data['left'] = True
             
             # Jump button (Cross/X button)
-            if len(buttons) > CONTROLLER_BUTTONS['CROSS']:
-                input_data['jump'] = buttons[CONTROLLER_BUTTONS['CROSS']]
+            if numbuttons > CONTROLLER_BUTTONS['CROSS']:
+                input_data['jump'] = self.controller.get_button(CONTROLLER_BUTTONS['CROSS'])
             
             # Attack buttons
-            if len(buttons) > CONTROLLER_BUTTONS['SQUARE']:
-                input_data['attack1'] = buttons[CONTROLLER_BUTTONS['SQUARE']]
-            if len(buttons) > CONTROLLER_BUTTONS['CIRCLE']:
-                input_data['attack2'] = buttons[CONTROLLER_BUTTONS['CIRCLE']]
+            if numbuttons > CONTROLLER_BUTTONS['SQUARE']:
+                input_data['attack1'] = self.controller.get_button(CONTROLLER_BUTTONS['SQUARE'])
+            if numbuttons > CONTROLLER_BUTTONS['CIRCLE']:
+                input_data['attack2'] = self.controller.get_button(CONTROLLER_BUTTONS['CIRCLE'])
                 
         except pygame.error:
             # Controller disconnected
@@ -110,225 +153,92 @@ class Fighter():
         return input_data
 
     def loadimage(self,spritesheet,animationstep):
-        anm_list=[]
-        for y, animate in enumerate(animationstep):
-            temp_img_list=[]
-            for x in range(animate):
-                temp_img=spritesheet.subsurface(x*self.size,y*self.size,self.size,self.size)
-                
-                temp_img_list.append(pygame.transform.scale(temp_img,(self.size*self.img_scale,self.size*self.img_scale)))
-            anm_list.append(temp_img_list)
-        return anm_list
-
-    def move(self,sc_width,sc_height,surface,target,round_over):
-        SPEED=5
-        gravity=2
-        dx=0
-        dy=0
-        self.running=False
-        self.attack_type=0
-
+        # frames are shared between every Fighter using the same spritesheet
+        return sprite_cache.get_atlas(spritesheet, self.size, self.img_scale, animationstep)
+
+    def read_input(self):
+        """Controller and keyboard state of this player as simulation input bits"""
+        if self.inputs is not None:
+            return self.inputs.player_input(self.player)
+
+        inputs=0
+        controller_input = self.get_controller_input()
+        if controller_input['left']:
+            inputs|=simulation.INPUT_LEFT
+        if controller_input['right']:
+            inputs|=simulation.INPUT_RIGHT
+        if controller_input['jump']:
+            inputs|=simulation.INPUT_JUMP
+        if controller_input['attack1']:
+            inputs|=simulation.INPUT_ATTACK1
+        if controller_input['attack2']:
+            inputs|=simulation.INPUT_ATTACK2
+
+        # Keyboard input
         key=pygame.key.get_pressed()
-        if self.attacking==False and self.alive==True and round_over==False:
-            # Check for controller input first, then keyboard
-            controller_input = self.get_controller_input()
-            
-            # movement for p1
-            if self.player==1:
-                # Controller input
-                if controller_input['right']:
-                    dx=SPEED
-                    self.running=True
-                if controller_input['left'] and dx<360:
-                    dx=-SPEED
-                    self.running=True
-                if controller_input['jump'] and self.jump==False:
-                    self.vely=-30
-                    self.jump=True
-                if controller_input['attack1']:
-                    self.attack(target)
-                    self.attack_type=1
-                if controller_input['attack2']:
-                    self.attack(target)
-                    self.attack_type=2
-                
-                # Keyboard input (fallback)
-                if key[pygame.K_d]:
-                    dx=SPEED
-                    self.running=True
-                if key[pygame.K_a] and dx<360:
-                    dx=-SPEED
-                    self.running=True
-                if key[pygame.K_w] and self.jump==False:
-                    self.vely=-30
-                    self.jump=True
-                if key[pygame.K_q] or key[pygame.K_e]:
-                    self.attack(target)
-                    if key[pygame.K_q]:
-                        self.attack_type=1
-                    if key[pygame.K_e]:
-                        self.attack_type=2
-
-            if self.player==2:
-                # Controller input
-                if controller_input['right']:
-                    dx=SPEED
-                    self.running=True
-                if controller_input['left'] and dx<360:
-                    dx=-SPEED
-                    self.running=True
-                if controller_input['jump'] and self.jump==False:
-                    self.vely=-30
-                    self.jump=True
-                if controller_input['attack1']:
-                    self.attack(target)
-                    self.attack_type=1
-                if controller_input['attack2']:
-                    self.attack(target)
-                    self.attack_type=2
-                
-                # Keyboard input (fallback)
-                if key[pygame.K_RIGHT]:
-                    dx=SPEED
-                    self.running=True
-                if key[pygame.K_LEFT] and dx<360:
-                    dx=-SPEED
-                    self.running=True
-                if key[pygame.K_UP] and self.jump==False:
-                    self.vely=-30
-                    self.jump=True
-                if key[pygame.K_KP1] or key[pygame.K_KP2]:
-                    self.attack(target)
-                    if key[pygame.K_KP1]:
-                        self.attack_type=1
-                    if key[pygame.K_KP2]:
-                        self.attack_type=2
-
-        self.vely+=gravity
-        dy+=self.vely
-
-        if self.rect.left + dx < 0:
-            dx=-self.rect.left
-        if self.rect.right + dx > sc_width:
-            dx= sc_width - self.rect.right
-        if self.rect.bottom + dy >sc_height - 70:
-            self.vely=0
-            self.jump=False
-            dy=sc_height - 70 - self.rect.bottom
-
-        # facing
-        if key[pygame.K_a]:
-            self.flip=True
-        if target.rect.centerx > self.rect.centerx:
-            self.flip=False
-        else:
-            self.flip=True
-        
-        if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1        
-
-        self.rect.x += dx
-        self.rect.y +=dy
-
-    def update(self):
-        # check performed action 
-        if self.health<=0:
-            self.health=0
-            self.alive=False
-            self.update_action(6) 
-        elif self.hit==True:
-            self.update_action(5)   
-        elif self.attacking==True:
-            if self.attack_type==1:
-                self.update_action(3)
-            if self.attack_type==2:
-                self.update_action(4)
-        elif self.jump==True:
-            self.update_action(2)
-        elif self.running==True:
-            self.update_action(1)
-        else:
-            self.update_action(0)
-
-            
-        cooldown=70
+        left,right,jump,attack1,attack2=KEYBOARD_LAYOUT[self.player]
+        if key[left]:
+            inputs|=simulation.INPUT_LEFT
+        if key[right]:
+            inputs|=simulation.INPUT_RIGHT
+        if key[jump]:
+            inputs|=simulation.INPUT_JUMP
+        if key[attack1]:
+            inputs|=simulation.INPUT_ATTACK1
+        if key[attack2]:
+            inputs|=simulation.INPUT_ATTACK2
+        return inputs
+
+    def save_position(self):
+        """Remember where the fighter is before a tick, for interpolated drawing"""
+        self.prev_x=self.state.x
+        self.prev_y=self.state.y
+
+    def refresh(self):
+        """Pick the image of the state's current frame, after the state was changed from outside"""
         self.image=self.anm_list[self.action][self.frame]
-        if pygame.time.get_ticks() - self.update_time>cooldown:
-            self.frame+=1
-            self.update_time=pygame.time.get_ticks()
-        if self.frame>=len(self.anm_list[self.action]):
-            if self.alive==False:
-                self.frame=len(self.anm_list[self.action])-1
-            else:
-                self.frame=0
-                if self.action==3 or self.action==4:
-                    self.attacking=False
-                    self.attack_hit_this_attack=False  # Reset hit flag when attack ends
-                    self.attack_cooldown=25
-                if self.action==5:
-                    self.hit=False
-                    self.attacking=False
-                    self.attack_cooldown=25
+        self.image_area=self.atlas.areas[self.action][self.frame]
+        self.image_offset=self.atlas.offsets[self.action][self.frame]
 
     def attack(self,target):
-        if self.attack_cooldown==0:
-            self.attacking=True
-            self.attack_hit_this_attack=False  # Reset hit flag for new attack
-            self.attack_misssound.play()
-            # Attack rectangle will be created and checked in update() method
-            # so it follows the player during the entire attack animation
+        if simulation.attack(self.state):
+            audio.play(self.attack_misssound,audio.SWING)
+            # the attack is checked against the target every tick by simulation.advance()
     
     def get_attack_rect(self):
-        """Create attack rectangle that follows the player's current position"""
+        """Attack rectangle of the current frame, None when it can't hit"""
         if not self.attacking:
             return None
-            
-        # Create larger attack rectangle
-        attack_width = self.rect.width * 1.5  # 50% larger width
-        attack_height = self.rect.height * 1.2  # 20% larger height
-        
-        # Position the attack rectangle based on player's facing direction
-        if self.flip:
-            attack_x = self.rect.centerx - attack_width
-        else:
-            attack_x = self.rect.centerx
-            
-        return pygame.Rect(attack_x, self.rect.y, attack_width, attack_height)
-    
-    def check_attack_hit(self, target):
-        """Check if attack hits target during attack animation"""
-        if not self.attacking or self.attack_hit_this_attack:
-            return False
-        
-        # Only allow damage during first 2 frames of attack animation
-        if self.action == 3 or self.action == 4:  # Attack actions
-            if self.frame > 1:  # Only first 2 frames (0 and 1) can deal damage
-                return False
-            
-        attack_rect = self.get_attack_rect()
-        if attack_rect and attack_rect.colliderect(target.rect):
-            self.attack_sound.play()
-            target.health -= 10
-            target.hit = True
-            self.attack_hit_this_attack = True  # Mark that this attack already hit
-            return True
-        return False
+        box=self.hitboxes.attack_box(self.state)
+        if box is None:
+            return None
+        return pygame.Rect(box)
     
     def update_action(self,new_action):
-        #if new action if sifferent to previous one
-        if new_action!=self.action:
-            self.action=new_action
-            #updated animantion
-            self.frame=0
-            self.update_time=pygame.time.get_ticks()
+        simulation.update_action(self.state,new_action)
+
+    @perf.timed("Fighter.draw")
+    def draw(self,surface,alpha=1.0):
+        """Draw the current frame, returns the rect of the screen that changed
 
-    def draw(self,surface):
-        img=pygame.transform.flip(self.image,self.flip,False)
+        alpha interpolates the position between the previous tick (0) and the current one (1).
+        """
+        # the atlas already holds both facings, pick the area instead of flipping
         # pygame.draw.rect(surface,(255,0,0),self.rect )
-        surface.blit(img, (self.rect.x - (self.ofset[0]-self.img_scale),self.rect.y - (self.ofset[1]-self.img_scale)))
+        x=round(self.prev_x + (self.state.x-self.prev_x)*alpha) - (self.ofset[0]-self.img_scale)
+        y=round(self.prev_y + (self.state.y-self.prev_y)*alpha) - (self.ofset[1]-self.img_scale)
+        if isinstance(surface, pygame.Surface):
+            offset=self.image_offset[self.flip]
+            rect=surface.blit(self.atlas.surface, (x + offset[0], y + offset[1]), self.image_area[self.flip])
+        else:
+            # GPU renderer mirrors the right facing frame itself
+            rect=surface.draw_frame(self.atlas, self.image_area[0], self.image_offset[0], self.flip, (x, y))
+        perf.count("blits")
         
         # Draw attack rectangle for debugging (uncomment to see attack hitbox)
         # if self.attacking:
         #     attack_rect = self.get_attack_rect()
         #     if attack_rect:
-        #         pygame.draw.rect(surface, (0, 255, 0), attack_rect, 2)
\ No newline at end of file
+        #         pygame.draw.rect(surface, (0, 255, 0), attack_rect, 2)
+
+        return rect
\ No newline at end of file
@@ -0,0 +1,107 @@
+import weakref
+import pygame
+from pygame._sdl2.video import Window, Renderer, Texture
+
+
+class TextureRenderer:
+    """Draws through SDL2 textures instead of CPU blits onto the display surface
+
+    Every surface is uploaded once as a texture the first time it is drawn and
+    the texture is kept for as long as the surface lives. Fighter frames are
+    drawn from the right facing half of their atlas and flipped by the renderer.
+    It has the parts of the Surface api the game draws with (blit, fill,
+    get_size) plus the frame interface of DirtyRectRenderer (begin, mark,
+    present, flip), so it stands in for both in app.py.
+
+    With SDL_VIDEODRIVER=dummy SDL picks its software renderer, so this path
+    runs headless too.
+    """
+    def __init__(self, size, title, draw_background=None, vsync=False):
+        self.size = size
+        self.window = Window(title, size=size)
+        self.renderer = Renderer(self.window, vsync=vsync)
+        self.draw_background = draw_background
+        # surface -> texture
+        self.textures = weakref.WeakKeyDictionary()
+        # atlas -> texture of the right facing frames
+        self.atlas_textures = weakref.WeakKeyDictionary()
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def texture(self, surface):
+        """Texture for surface, uploaded on first use"""
+        tex = self.textures.get(surface)
+        if tex is None:
+            tex = Texture.from_surface(self.renderer, surface)
+            self.textures[surface] = tex
+        return tex
+
+    def blit(self, source, dest, area=None):
+        """Surface.blit on the GPU, returns the rect drawn to"""
+        if area is None:
+            area = source.get_rect()
+        else:
+            area = pygame.Rect(area)
+        if len(dest) == 4:
+            dest = dest[:2]
+        rect = pygame.Rect(dest, area.size)
+        self.texture(source).draw(srcrect=area, dstrect=rect)
+        return rect
+
+    def draw_frame(self, atlas, area, offset, flip, dest):
+        """Draw a right facing atlas frame at dest, mirrored by the renderer when flip is set"""
+        tex = self.atlas_textures.get(atlas)
+        if tex is None:
+            tex = Texture.from_surface(self.renderer, atlas.surface.subsurface(0, 0, atlas.surface.get_width(), atlas.rows * atlas.scale))
+            self.atlas_textures[atlas] = tex
+        if flip:
+            x = dest[0] + atlas.scale - offset[0] - area.width
+        else:
+            x = dest[0] + offset[0]
+        rect = pygame.Rect(x, dest[1] + offset[1], area.width, area.height)
+        tex.draw(srcrect=area, dstrect=rect, flip_x=flip)
+        return rect
+
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = pygame.Color(color)
+        if rect is None:
+            self.renderer.clear()
+            return pygame.Rect((0, 0), self.size)
+        rect = pygame.Rect(rect)
+        self.renderer.fill_rect(rect)
+        return rect
+
+    def draw_rect(self, color, rect, width=0):
+        rect = pygame.Rect(rect)
+        if width == 0:
+            return self.fill(color, rect)
+        self.renderer.draw_color = pygame.Color(color)
+        for i in range(width):
+            self.renderer.draw_rect(rect.inflate(-2 * i, -2 * i))
+        return rect
+
+    # frame interface, the GPU always redraws the whole frame
+
+    def begin(self, scroll):
+        self.fill((0, 0, 0))
+        if self.draw_background:
+            self.draw_background(self, scroll)
+
+    def mark(self, rect):
+        return rect
+
+    def invalidate(self):
+        pass
+
+    def present(self):
+        self.renderer.present()
+
+    def flip(self):
+        self.renderer.present()
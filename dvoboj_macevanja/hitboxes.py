@@ -0,0 +1,115 @@
+"""Per-frame hurt and attack boxes taken from the sprites' alpha masks
+
+For every animation frame in both facings a HitboxTable keeps:
+
+    hurt    the opaque pixels of the frame, where the fighter can be hit
+    attack  the opaque pixels in front of the body centre, on attack frames only
+
+each as (x, y, width, height, mask): a rect relative to FighterState x/y and
+a pygame.mask.Mask of the pixels inside it. The tables are built once per
+character when it is loaded. A hit test is a rect overlap first, and only if
+that passes an overlap of the two cached masks, so nothing is allocated per
+tick. simulation.check_attack_hit uses them when a match has tables and falls
+back to the fixed body rectangles otherwise.
+"""
+import pygame
+
+import simulation
+import sprite_cache
+
+ATTACK_ACTIONS = (simulation.ACTION_ATTACK1, simulation.ACTION_ATTACK2)
+
+# (atlas, draw offset) -> HitboxTable
+_tables = {}
+
+
+class HitboxTable:
+    """Hurt and attack boxes of every frame of one character
+
+    atlas is the sprite_cache.FrameAtlas of the character, draw_offset how far
+    left of and above the FighterState position Fighter.draw puts a frame.
+    """
+    def __init__(self, atlas, draw_offset):
+        self.draw_offset = tuple(draw_offset)
+        # hurt[action][frame][flip], attack[action][frame][flip] -> (x, y, width, height, mask) or None
+        self.hurt = []
+        self.attack = []
+        # column of the body centre inside a frame, the same in both facings
+        center = draw_offset[0] + simulation.BODY_WIDTH // 2
+        for action, (areas, offsets) in enumerate(zip(atlas.areas, atlas.offsets)):
+            hurt = []
+            attack = []
+            for frame_areas, frame_offsets in zip(areas, offsets):
+                boxes = [self.box(atlas.surface, area, offset) for area, offset in zip(frame_areas, frame_offsets)]
+                hurt.append(tuple(boxes))
+                if action in ATTACK_ACTIONS:
+                    attack.append(tuple(self.front(box, center, flip) for flip, box in enumerate(boxes)))
+                else:
+                    attack.append((None, None))
+            self.hurt.append(hurt)
+            self.attack.append(attack)
+
+    def box(self, surface, area, offset):
+        """Box of the opaque pixels of a trimmed frame area"""
+        if area.width == 0 or area.height == 0:
+            return None
+        mask = pygame.mask.from_surface(surface.subsurface(area))
+        return (offset[0] - self.draw_offset[0], offset[1] - self.draw_offset[1], area.width, area.height, mask)
+
+    def front(self, box, center, flip):
+        """Part of box in front of the body centre, facing left when flip is set"""
+        if box is None:
+            return None
+        x, y, width, height, mask = box
+        mask = mask.copy()
+        # body centre inside the box, relative to the state like the box
+        split = min(max(center - self.draw_offset[0] - x, 0), width)
+        if flip:
+            behind = pygame.Rect(split, 0, width - split, height)
+        else:
+            behind = pygame.Rect(0, 0, split, height)
+        if behind.width:
+            mask.erase(pygame.mask.Mask(behind.size, fill=True), behind.topleft)
+        rects = mask.get_bounding_rects()
+        if not rects:
+            return None
+        bounds = rects[0].unionall(rects[1:])
+        cropped = pygame.mask.Mask(bounds.size)
+        cropped.draw(mask, (-bounds.x, -bounds.y))
+        return (x + bounds.x, y + bounds.y, bounds.width, bounds.height, cropped)
+
+    def attack_box(self, state):
+        """(x, y, width, height) of the attack in the arena, None if the frame can't hit"""
+        box = self.attack[state.action][state.frame][state.flip]
+        if box is None:
+            return None
+        return (state.x + box[0], state.y + box[1], box[2], box[3])
+
+    def hits(self, state, target, target_table):
+        """Whether the attack pixels of state's frame touch the pixels of target's frame"""
+        attack = self.attack[state.action][state.frame][state.flip]
+        hurt = target_table.hurt[target.action][target.frame][target.flip]
+        if attack is None or hurt is None:
+            return False
+        ax = state.x + attack[0]
+        ay = state.y + attack[1]
+        hx = target.x + hurt[0]
+        hy = target.y + hurt[1]
+        if ax >= hx + hurt[2] or hx >= ax + attack[2] or ay >= hy + hurt[3] or hy >= ay + attack[3]:
+            return False
+        return attack[4].overlap(hurt[4], (hx - ax, hy - ay)) is not None
+
+
+def get_table(atlas, draw_offset):
+    """Return the cached table of a character, building it on first use"""
+    key = (atlas, tuple(draw_offset))
+    table = _tables.get(key)
+    if table is None:
+        table = _tables[key] = HitboxTable(atlas, draw_offset)
+    return table
+
+
+def for_character(character):
+    """Table of a characters.Character, building its atlas if nothing loaded it yet"""
+    atlas = sprite_cache.get_atlas(character.sheet, character.frame_size, character.scale, character.steps)
+    return get_table(atlas, character.draw_offset)
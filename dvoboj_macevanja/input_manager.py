@@ -0,0 +1,137 @@
+import pygame
+import simulation
+
+# Controller button mappings for PlayStation controllers
+CONTROLLER_BUTTONS = {
+    'CROSS': 0,      # X button (jump)
+    'CIRCLE': 1,     # O button (attack 2)
+    'SQUARE': 2,     # Square button (attack 1)
+}
+
+# Controller axis mappings
+CONTROLLER_AXES = {
+    'LEFT_X': 0,     # Left stick X axis
+}
+
+DEADZONE = 0.3
+
+# Controller buttons that matter in a fight, as simulation input bits
+BUTTON_INPUTS = {
+    CONTROLLER_BUTTONS['CROSS']: simulation.INPUT_JUMP,
+    CONTROLLER_BUTTONS['SQUARE']: simulation.INPUT_ATTACK1,
+    CONTROLLER_BUTTONS['CIRCLE']: simulation.INPUT_ATTACK2
+}
+
+# Keyboard layout per player: (left, right, jump, attack1, attack2)
+KEYBOARD_LAYOUT = {
+    1: (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_q, pygame.K_e),
+    2: (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_KP1, pygame.K_KP2)
+}
+KEYBOARD_INPUTS = (simulation.INPUT_LEFT, simulation.INPUT_RIGHT, simulation.INPUT_JUMP,
+                   simulation.INPUT_ATTACK1, simulation.INPUT_ATTACK2)
+
+
+class InputManager:
+    """Keyboard and controller state for every player, kept up to date from events
+
+    Controllers are tracked through JOYDEVICEADDED/REMOVED, so they can be
+    plugged in and out while the game runs. Each one gets the first free
+    player slot. Button and stick events update a small per-player bitfield
+    (the simulation.INPUT_* bits) instead of polling every button and axis,
+    and the keyboard is read once per frame.
+    """
+    def __init__(self, players=2):
+        self.players = players
+        self.joysticks = {}                 # instance id -> Joystick
+        self.slots = [None] * players       # player - 1 -> instance id
+        self.pad_buttons = {}               # instance id -> input bits from buttons
+        self.pad_stick = {}                 # instance id -> input bits from the left stick
+        self.keyboard = [0] * players       # player - 1 -> input bits from the keyboard
+        self.keys = None
+        # controllers connected before the first event was read
+        for index in range(pygame.joystick.get_count()):
+            self.add_joystick(index)
+
+    def add_joystick(self, index):
+        joystick = pygame.joystick.Joystick(index)
+        joystick.init()
+        instance_id = joystick.get_instance_id()
+        if instance_id in self.joysticks:
+            return
+        self.joysticks[instance_id] = joystick
+        self.pad_buttons[instance_id] = 0
+        self.pad_stick[instance_id] = 0
+        if None in self.slots:
+            self.slots[self.slots.index(None)] = instance_id
+        print(f"Controller {index}: {joystick.get_name()}")
+
+    def remove_joystick(self, instance_id):
+        self.joysticks.pop(instance_id, None)
+        self.pad_buttons.pop(instance_id, None)
+        self.pad_stick.pop(instance_id, None)
+        if instance_id in self.slots:
+            self.slots[self.slots.index(instance_id)] = None
+            # hand the slot to a controller that didn't have one
+            for waiting in self.joysticks:
+                if waiting not in self.slots:
+                    self.slots[self.slots.index(None)] = waiting
+                    break
+
+    def update(self, events):
+        """Consume this frame's events and read the keyboard once"""
+        for event in events:
+            if event.type == pygame.JOYBUTTONDOWN or event.type == pygame.JOYBUTTONUP:
+                bit = BUTTON_INPUTS.get(event.button)
+                if bit and event.instance_id in self.pad_buttons:
+                    if event.type == pygame.JOYBUTTONDOWN:
+                        self.pad_buttons[event.instance_id] |= bit
+                    else:
+                        self.pad_buttons[event.instance_id] &= ~bit
+            elif event.type == pygame.JOYAXISMOTION:
+                if event.axis == CONTROLLER_AXES['LEFT_X'] and event.instance_id in self.pad_stick:
+                    if event.value > DEADZONE:
+                        self.pad_stick[event.instance_id] = simulation.INPUT_RIGHT
+                    elif event.value < -DEADZONE:
+                        self.pad_stick[event.instance_id] = simulation.INPUT_LEFT
+                    else:
+                        self.pad_stick[event.instance_id] = 0
+            elif event.type == pygame.JOYDEVICEADDED:
+                self.add_joystick(event.device_index)
+            elif event.type == pygame.JOYDEVICEREMOVED:
+                self.remove_joystick(event.instance_id)
+
+        self.keys = pygame.key.get_pressed()
+        for player, layout in KEYBOARD_LAYOUT.items():
+            if player > self.players:
+                continue
+            bits = 0
+            for key, bit in zip(layout, KEYBOARD_INPUTS):
+                if self.keys[key]:
+                    bits |= bit
+            self.keyboard[player - 1] = bits
+
+    def controller_input(self, player):
+        """Input bits from the controller of a player"""
+        instance_id = self.slots[player - 1]
+        if instance_id is None:
+            return 0
+        return self.pad_buttons[instance_id] | self.pad_stick[instance_id]
+
+    def player_input(self, player):
+        """Input bits of a player from their controller and keyboard keys"""
+        return self.keyboard[player - 1] | self.controller_input(player)
+
+    def scroll_input(self):
+        """(left, right): whether any controller stick or arrow key asks to scroll the background"""
+        left = False
+        right = False
+        for bits in self.pad_stick.values():
+            left = left or bits == simulation.INPUT_LEFT
+            right = right or bits == simulation.INPUT_RIGHT
+        if self.keys is not None:
+            left = left or self.keys[pygame.K_a] or self.keys[pygame.K_LEFT]
+            right = right or self.keys[pygame.K_d] or self.keys[pygame.K_RIGHT]
+        return left, right
+
+    def controller_count(self):
+        return len(self.joysticks)
@@ -1,5 +1,8 @@
 import pygame
 from pygame import mixer
+import assets
+import audio
+import text_cache
 
 # Controller button mappings for PlayStation controllers
 CONTROLLER_BUTTONS = {
@@ -30,14 +33,12 @@ CONTROLLER_AXES = {
 }
 
 class MainMenu:
-    def __init__(self, screen_width, screen_height):
+    def __init__(self, screen_width, screen_height, inputs=None):
         self.screen_width = screen_width
         self.screen_height = screen_height
         
-        # Load background image
-        self.background = pygame.image.load("menu/DjokoiVlajkoPoster.png").convert_alpha()
-        # Scale background to fit screen
-        self.background = pygame.transform.scale(self.background, (screen_width, screen_height))
+        # Load background image, scaled to fit screen
+        self.background = assets.image(assets.MENU_BACKGROUND, size=(screen_width, screen_height))
         
         # Load font
         self.font = pygame.font.Font("fonts/Tiny5-Regular.ttf", 40)
@@ -51,42 +52,45 @@ class MainMenu:
         self.GREEN = (0, 255, 0)
         
         # Menu options
-        self.menu_options = ["ПОЧНИ ИГРУ", "ИЗАЂИ"]
+        self.menu_options = ["ПОЧНИ ИГРУ", "ПРОТИВ РАЧУНАРА", "ИЗАЂИ"]
         self.selected_option = 0
         
         # Menu state
         self.menu_active = True
+        # (selected option, controller count) the screen was last drawn with
+        self.drawn_state = None
         
-        # Controller support
+        # Controller support, the InputManager tracks controllers when there is one
+        self.inputs = inputs
         self.controller = None
-        if pygame.joystick.get_count() > 0:
+        if inputs is None and pygame.joystick.get_count() > 0:
             self.controller = pygame.joystick.Joystick(0)
             self.controller.init()
         
         # Load menu music (optional)
         try:
-            pygame.mixer.music.load("music/bgmusic.mp3")
-            pygame.mixer.music.set_volume(0.3)
-            pygame.mixer.music.play(-1)
+            audio.play_music("music/bgmusic.mp3", 0.3)
         except:
             pass  # Continue without music if file not found
     
     def handle_input(self, event):
         """Handle keyboard and controller input for menu navigation"""
-        if event.type == pygame.KEYDOWN:
+        if event.type == pygame.WINDOWEXPOSED:
+            self.invalidate()
+        elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_UP or event.key == pygame.K_w:
                 self.selected_option = (self.selected_option - 1) % len(self.menu_options)
             elif event.key == pygame.K_DOWN or event.key == pygame.K_s:
                 self.selected_option = (self.selected_option + 1) % len(self.menu_options)
             elif event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
                 return self.select_option()
-        elif event.type == pygame.JOYBUTTONDOWN and self.controller:
+        elif event.type == pygame.JOYBUTTONDOWN and self.controller_count() > 0:
             # Controller button input
             if event.button == CONTROLLER_BUTTONS['CROSS']:  # X button to select
                 return self.select_option()
             elif event.button == CONTROLLER_BUTTONS['CIRCLE']:  # O button to go back (if needed)
                 pass  # Could add back functionality here
-        elif event.type == pygame.JOYAXISMOTION and self.controller:
+        elif event.type == pygame.JOYAXISMOTION and self.controller_count() > 0:
             # Controller stick input for navigation
             if event.axis == CONTROLLER_AXES['LEFT_Y']:
                 deadzone = 0.5
@@ -96,17 +100,37 @@ class MainMenu:
                     self.selected_option = (self.selected_option + 1) % len(self.menu_options)
         return None
     
+    def controller_count(self):
+        """Number of connected controllers"""
+        if self.inputs is not None:
+            return self.inputs.controller_count()
+        return pygame.joystick.get_count()
+
     def select_option(self):
         """Handle option selection"""
         if self.menu_options[self.selected_option] == "ПОЧНИ ИГРУ":
             self.menu_active = False
             return "start_game"
+        elif self.menu_options[self.selected_option] == "ПРОТИВ РАЧУНАРА":
+            self.menu_active = False
+            return "start_cpu"
         elif self.menu_options[self.selected_option] == "ИЗАЂИ":
             return "quit"
         return None
     
+    def invalidate(self):
+        """Redraw the menu on the next draw call"""
+        self.drawn_state = None
+
     def draw(self, screen):
-        """Draw the main menu"""
+        """Draw the main menu, returns False when nothing changed since the last draw"""
+        # An idle menu is only drawn again when the selection or the controllers change
+        controller_count = self.controller_count()
+        state = (self.selected_option, controller_count)
+        if state == self.drawn_state:
+            return False
+        self.drawn_state = state
+
         # Draw background
         screen.blit(self.background, (0, 0))
         
@@ -122,28 +146,32 @@ class MainMenu:
             y_pos = start_y + i * 60
             if i == self.selected_option:
                 # Highlight selected option
-                text = self.font.render(option, True, self.RED)
+                text = text_cache.render(self.font, option, self.RED)
                 # Add a background rectangle for selected option
                 text_rect = text.get_rect(center=(self.screen_width // 2, y_pos))
-                pygame.draw.rect(screen, self.BLACK, (text_rect.x - 10, text_rect.y - 5, text_rect.width + 20, text_rect.height + 10))
-                pygame.draw.rect(screen, self.WHITE, (text_rect.x - 10, text_rect.y - 5, text_rect.width + 20, text_rect.height + 10), 2)
+                box = (text_rect.x - 10, text_rect.y - 5, text_rect.width + 20, text_rect.height + 10)
+                screen.fill(self.BLACK, box)
+                if isinstance(screen, pygame.Surface):
+                    pygame.draw.rect(screen, self.WHITE, box, 2)
+                else:
+                    screen.draw_rect(self.WHITE, box, 2)
             else:
-                text = self.font.render(option, True, self.WHITE)
+                text = text_cache.render(self.font, option, self.WHITE)
                 text_rect = text.get_rect(center=(self.screen_width // 2, y_pos))
             
             screen.blit(text, text_rect)
         
         # Draw controller connection status in the top right corner
-        controller_count = pygame.joystick.get_count()
         padding = 20
         if controller_count > 0:
-            controller_text = self.small_font.render(f"Број џојстика: {controller_count}", True, self.GREEN)
+            controller_text = text_cache.render(self.small_font, f"Број џојстика: {controller_count}", self.GREEN)
             controller_rect = controller_text.get_rect(topright=(self.screen_width - padding, padding))
             screen.blit(controller_text, controller_rect)
         else:
-            no_controller_text = self.small_font.render("Нема џојстика - удара се по тастатури", True, self.YELLOW)
+            no_controller_text = text_cache.render(self.small_font, "Нема џојстика - удара се по тастатури", self.YELLOW)
             no_controller_rect = no_controller_text.get_rect(topright=(self.screen_width - padding, padding))
             screen.blit(no_controller_text, no_controller_rect)
+        return True
 
     
     def is_active(self):
@@ -0,0 +1,399 @@
+"""Peer to peer netplay over UDP with rollback
+
+Each machine simulates the whole match. Its own player's input is applied
+INPUT_DELAY ticks after it was read and sent to the peer at once; the
+remote player's input is predicted (the last one that arrived is held) so
+the local game never waits for the network. When the real remote input for
+a past tick arrives and differs from the prediction, the match is restored
+to the snapshot taken before that tick and simulated forward again with the
+right inputs, at most MAX_ROLLBACK ticks; a peer that gets further ahead
+than that waits for the other one. Every tick whose inputs are confirmed on
+both sides is checksummed, and the checksums are exchanged to catch a
+desync as soon as it happens.
+
+Packets carry every local input the peer has not acknowledged yet, so a
+lost packet costs nothing but the rollback its late input causes:
+
+    header  "DN", ticks confirmed, first tick, input count,
+            ticks checksummed, checksum of the last of them          (<2sIIBII)
+    inputs  one byte per tick, the simulation.INPUT_* bitfield
+
+The game (app.py) plays online with --netplay HOST:PORT. Two instances on this
+machine, with made up latency and loss, check the whole thing:
+
+    python -m netplay --loopback --latency 80 --jitter 20 --loss 0.1
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+import simulation as sim
+
+MAGIC = b"DN"
+PACKET = struct.Struct("<2sIIBII")
+# most inputs sent in one packet
+MAX_INPUTS = 64
+# ticks the local input is held back, hides this much latency without any rollback
+INPUT_DELAY = 2
+# the most ticks that are ever simulated again, and how far a peer may run ahead
+MAX_ROLLBACK = 8
+# checksums kept to compare with the peer's
+CHECKSUM_HISTORY = 120
+DEFAULT_PORT = 7000
+
+
+class Link:
+    """Non-blocking UDP socket to the peer, optionally slower and lossier than the real one
+
+    latency and jitter (seconds) and loss (0..1) are added to every packet
+    sent, for trying netplay out on one machine.
+    """
+    def __init__(self, port, peer, latency=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", port))
+        self.sock.setblocking(False)
+        self.peer = peer
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        # (time to send, sequence, data) of delayed packets
+        self.outbox = []
+        self.sequence = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, data):
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        if not self.latency and not self.jitter:
+            self._send(data)
+            return
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        self.sequence += 1
+        heapq.heappush(self.outbox, (time.perf_counter() + delay, self.sequence, data))
+
+    def _send(self, data):
+        try:
+            self.sock.sendto(data, self.peer)
+            self.sent += 1
+        except OSError:
+            # the peer's port is not open yet, the next packet repeats everything
+            pass
+
+    def receive(self):
+        """Packets that arrived since the last call"""
+        now = time.perf_counter()
+        while self.outbox and self.outbox[0][0] <= now:
+            self._send(heapq.heappop(self.outbox)[2])
+        packets = []
+        while True:
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except (BlockingIOError, ConnectionResetError):
+                break
+            packets.append(data)
+        return packets
+
+    def close(self):
+        self.sock.close()
+
+
+class RollbackSession:
+    """Runs a MatchState in lockstep with a peer, predicting and rolling back the remote input
+
+    local_player is 1 or 2. Call advance() once per tick with the local
+    input; afterwards the match holds the best known state of the current
+    tick, and events the events of every tick simulated by that call: the
+    new tick and the ones simulated again after a rollback. An event a tick
+    already had when it was last simulated is not handed back twice, but one
+    that a rollback undid can't be taken back either. When record is a list,
+    the (p1, p2) input of every tick is appended to it once it is final, and
+    telemetry (a TelemetryWriter) gets the events of every tick once it is final.
+    """
+    def __init__(self, match, local_player, link, input_delay=INPUT_DELAY, max_rollback=MAX_ROLLBACK, record=None,
+                 telemetry=None):
+        self.match = match
+        self.local = local_player - 1
+        self.remote = 1 - self.local
+        self.link = link
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        # next tick to simulate
+        self.tick = match.tick
+        # input of each player per tick: local ones as read, remote ones as confirmed by the peer
+        self.inputs = ({}, {})
+        for tick in range(self.tick, self.tick + input_delay):
+            self.inputs[self.local][tick] = 0
+        # remote input each unconfirmed tick was simulated with
+        self.predicted = {}
+        # tick -> (events, score) of the last time that tick was simulated, until it is final
+        self.outcomes = {}
+        # events of the ticks simulated by the last advance()
+        self.events = []
+        # last tick with every remote input up to it confirmed, and the last the peer has of ours
+        self.confirmed = self.tick - 1
+        self.peer_ack = self.tick - 1
+        # tick -> snapshot of the match before that tick, the last max_rollback + 1 of them
+        self.snapshots = {}
+        # tick -> checksum of the state after that tick, for confirmed ticks
+        self.checksums = {}
+        self.checked = self.tick - 1
+        # (tick, checksum) from the peer that we could not compare yet
+        self.peer_checksums = {}
+        self.desync = None
+        self.stalled = False
+        self.record = record
+        self.telemetry = telemetry
+        self.stats = {"rollbacks": 0, "resimulated": 0, "max_rollback": 0, "stalls": 0, "packets": 0}
+
+    def advance(self, local_input):
+        """Simulate the next tick, returns False when waiting for the peer instead"""
+        self.events = []
+        self.inputs[self.local][self.tick + self.input_delay] = local_input
+        self.poll()
+        # too far ahead of what the peer has confirmed, rolling back would cost more than allowed
+        if self.tick - self.confirmed > self.max_rollback:
+            # read again on the next try
+            del self.inputs[self.local][self.tick + self.input_delay]
+            self.stalled = True
+            self.stats["stalls"] += 1
+            self.send()
+            return False
+        self.stalled = False
+        self.simulate(self.tick)
+        self.tick += 1
+        self.verify()
+        self.send()
+        return True
+
+    def poll(self):
+        """Read the peer's packets and roll back to the first tick that was mispredicted"""
+        rollback = None
+        for data in self.link.receive():
+            if len(data) < PACKET.size:
+                continue
+            magic, acked, first, count, checked, checksum = PACKET.unpack_from(data)
+            if magic != MAGIC:
+                continue
+            self.stats["packets"] += 1
+            self.peer_ack = max(self.peer_ack, acked - 1)
+            if checked:
+                self.peer_checksums[checked - 1] = checksum
+            remote = self.inputs[self.remote]
+            for tick, value in enumerate(data[PACKET.size:PACKET.size + count], first):
+                if tick in remote or tick <= self.confirmed:
+                    continue
+                remote[tick] = value
+                predicted = self.predicted.pop(tick, None)
+                if predicted is not None and predicted != value and (rollback is None or tick < rollback):
+                    rollback = tick
+        while self.confirmed + 1 in self.inputs[self.remote]:
+            self.confirmed += 1
+        if rollback is not None:
+            self.rollback(rollback)
+        self.verify()
+
+    def rollback(self, tick):
+        """Restore the match to before tick and simulate up to the current tick again"""
+        count = self.tick - tick
+        sim.restore(self.match, self.snapshots[tick])
+        for again in range(tick, self.tick):
+            self.simulate(again)
+        self.stats["rollbacks"] += 1
+        self.stats["resimulated"] += count
+        self.stats["max_rollback"] = max(self.stats["max_rollback"], count)
+
+    def simulate(self, tick):
+        """Snapshot and run one tick with the known or predicted inputs"""
+        self.snapshots[tick] = sim.snapshot(self.match)
+        self.snapshots.pop(tick - self.max_rollback - 1, None)
+        remote = self.inputs[self.remote]
+        if tick in remote:
+            remote_input = remote[tick]
+        else:
+            # the remote player keeps doing what it did last
+            remote_input = remote.get(self.confirmed, 0)
+            self.predicted[tick] = remote_input
+        inputs = [0, 0]
+        inputs[self.local] = self.inputs[self.local][tick]
+        inputs[self.remote] = remote_input
+        sim.advance(self.match, *inputs)
+        events = tuple(self.match.events)
+        known = list(self.outcomes[tick][0]) if tick in self.outcomes else []
+        for event in events:
+            if event in known:
+                known.remove(event)
+            else:
+                self.events.append(event)
+        self.outcomes[tick] = (events, tuple(self.match.score))
+
+    def verify(self):
+        """Checksum the ticks that became final and compare with the peer's"""
+        final = min(self.confirmed, self.tick - 1)
+        while self.checked < final:
+            self.checked += 1
+            # the state after a tick is the snapshot taken before the next one
+            state = self.match if self.checked + 1 == self.tick else self.snapshots[self.checked + 1]
+            self.checksums[self.checked] = sim.checksum(state)
+            self.checksums.pop(self.checked - CHECKSUM_HISTORY, None)
+            if self.record is not None:
+                inputs = [0, 0]
+                inputs[self.local] = self.inputs[self.local][self.checked]
+                inputs[self.remote] = self.inputs[self.remote][self.checked]
+                self.record.append(tuple(inputs))
+            self.inputs[self.remote].pop(self.checked - CHECKSUM_HISTORY, None)
+            events, score = self.outcomes.pop(self.checked)
+            if self.telemetry is not None and events:
+                self.telemetry.log(self.checked, events, score)
+        # local inputs are kept until the peer has them
+        for tick in [tick for tick in self.inputs[self.local] if tick <= min(self.peer_ack, self.checked)]:
+            del self.inputs[self.local][tick]
+        for tick in [tick for tick in self.peer_checksums if tick in self.checksums]:
+            if self.peer_checksums.pop(tick) != self.checksums[tick] and self.desync is None:
+                self.desync = tick
+        for tick in [tick for tick in self.peer_checksums if tick < self.checked - CHECKSUM_HISTORY]:
+            del self.peer_checksums[tick]
+
+    def send(self):
+        """Every local input the peer hasn't acknowledged, and our latest final checksum"""
+        local = self.inputs[self.local]
+        first = self.peer_ack + 1
+        last = min(max(local, default=first - 1), first + MAX_INPUTS - 1)
+        values = bytes(local[tick] for tick in range(first, last + 1))
+        checksum = self.checksums.get(self.checked, 0)
+        self.link.send(PACKET.pack(MAGIC, self.confirmed + 1, first, len(values), self.checked + 1, checksum) + values)
+
+
+#----------------loopback check------------------------------------------------------
+
+def run_peer(options):
+    """One instance of the loopback check: a bot plays its side in real time, prints the outcome as JSON"""
+    import characters
+    import tournament
+
+    specs = [characters.load(options.p1).spec, characters.load(options.p2).spec]
+    match = sim.MatchState(*specs)
+    link = Link(options.port, ("127.0.0.1", options.peer_port), options.latency / 1000, options.jitter / 1000,
+                options.loss, seed=options.player)
+    log = []
+    session = RollbackSession(match, options.player, link, record=log)
+    controller = tournament.CONTROLLERS[options.controller](options.player, options.player)
+
+    tick_seconds = 1 / sim.TICK_RATE
+    times = []
+    start = time.perf_counter()
+    give_up = start + options.ticks * tick_seconds + 30
+    frame = 0
+    done = None
+    while time.perf_counter() < give_up:
+        t = time.perf_counter()
+        if session.tick < options.ticks:
+            session.advance(controller(match))
+        else:
+            session.poll()
+            session.send()
+        times.append((time.perf_counter() - t) * 1000)
+        if done is None and session.checked >= options.ticks - 1:
+            done = frame
+        # half a second more, so the peer surely gets our last inputs
+        if done is not None and frame - done > sim.TICK_RATE // 2:
+            break
+        frame += 1
+        delay = start + frame * tick_seconds - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    times.sort()
+    print(json.dumps({
+        "player": options.player, "tick": session.tick, "confirmed": session.checked,
+        "checksum": sim.checksum(match), "score": match.score, "desync": session.desync,
+        "inputs": [bytes(inputs[player] for inputs in log[:options.ticks]).hex() for player in (0, 1)],
+        "stats": session.stats,
+        "sent": link.sent, "dropped": link.dropped,
+        "tick_ms": {"p50": times[len(times) // 2], "p99": times[int(len(times) * 0.99)], "max": times[-1]},
+    }))
+    link.close()
+    return 0
+
+
+def loopback(options):
+    """Two peers over 127.0.0.1, then the same inputs offline: all three must end in the same state"""
+    import characters
+
+    ports = (options.port, options.port + 1)
+    peers = []
+    for player in (1, 2):
+        command = [sys.executable, "-m", "netplay", "--peer-process", "--player", str(player),
+                   "--port", str(ports[player - 1]), "--peer-port", str(ports[2 - player]),
+                   "--controller", options.controllers[player - 1], "--ticks", str(options.ticks),
+                   "--latency", str(options.latency), "--jitter", str(options.jitter), "--loss", str(options.loss),
+                   "--p1", options.p1, "--p2", options.p2]
+        peers.append(subprocess.Popen(command, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__))))
+    results = [json.loads(peer.communicate()[0].decode().strip().splitlines()[-1]) for peer in peers]
+
+    # the tail of the log is only confirmed on the side that has it, ticks up to the shortest one compare
+    ticks = min(result["confirmed"] for result in results) + 1
+    offline = sim.MatchState(characters.load(options.p1).spec, characters.load(options.p2).spec)
+    inputs = [bytes.fromhex(results[0]["inputs"][player]) for player in (0, 1)]
+    for tick in range(ticks):
+        sim.advance(offline, inputs[0][tick], inputs[1][tick])
+
+    failures = []
+    for result in results:
+        stats = result["stats"]
+        print(f"player {result['player']}: tick {result['tick']}, score {result['score']}, "
+              f"{stats['rollbacks']} rollbacks ({stats['resimulated']} ticks again, at most {stats['max_rollback']}), "
+              f"{stats['stalls']} stalls, {result['dropped']}/{result['sent'] + result['dropped']} packets dropped, "
+              f"tick p50 {result['tick_ms']['p50']:.2f} ms p99 {result['tick_ms']['p99']:.2f} ms max {result['tick_ms']['max']:.2f} ms")
+        if result["desync"] is not None:
+            failures.append(f"player {result['player']} saw a desync at tick {result['desync']}")
+        if result["confirmed"] < options.ticks - 1:
+            failures.append(f"player {result['player']} only confirmed {result['confirmed'] + 1} ticks")
+        if result["stats"]["max_rollback"] > MAX_ROLLBACK:
+            failures.append(f"player {result['player']} rolled back {result['stats']['max_rollback']} ticks")
+    if results[0]["inputs"] != results[1]["inputs"]:
+        failures.append("the peers ended with different inputs")
+    if not failures and not (results[0]["checksum"] == results[1]["checksum"] == sim.checksum(offline)):
+        failures.append("the peers and the offline simulation ended in different states")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"{ticks} ticks identical on both peers and offline")
+    return 1 if failures else 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Rollback netplay check over the loopback interface")
+    parser.add_argument("--loopback", action="store_true", help="run two peers on this machine and compare them")
+    parser.add_argument("--peer-process", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--player", type=int, default=1)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--peer-port", type=int, default=DEFAULT_PORT + 1)
+    parser.add_argument("--controller", default="chaser")
+    parser.add_argument("--controllers", type=lambda text: text.split(","), default=["chaser", "random"],
+                        help="bots of player 1 and 2, from tournament.CONTROLLERS")
+    parser.add_argument("--ticks", type=int, default=20 * sim.TICK_RATE)
+    parser.add_argument("--latency", type=float, default=50, help="one way latency added, ms")
+    parser.add_argument("--jitter", type=float, default=10, help="random extra latency, up to this many ms")
+    parser.add_argument("--loss", type=float, default=0.05, help="share of packets dropped")
+    parser.add_argument("--p1", default="djoko")
+    parser.add_argument("--p2", default="vlajko")
+    options = parser.parse_args(argv)
+    if options.peer_process:
+        return run_peer(options)
+    if options.loopback:
+        return loopback(options)
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+import pygame
+import perf
+
+# Parallax factor of the back layer and how much faster each layer in front of it scrolls
+BASE_SPEED = 1
+SPEED_STEP = 0.2
+
+
+class ParallaxBackground:
+    """Tiled parallax background that only blits what is on screen
+
+    Layers are given back to front. Neighbouring layers that scroll at the same
+    speed never move relative to each other, so they are pre-composed into one
+    surface. The back layer is made opaque so it is blitted without alpha, and
+    the transparent rows of the other layers are cropped away.
+    """
+    def __init__(self, layers, screen_width, speeds=None, tiles=None):
+        self.screen_width = screen_width
+        self.width = layers[0].get_width()
+        # same number of tiles as the old drawbg, one per layer
+        self.tiles = len(layers) if tiles is None else tiles
+        if speeds is None:
+            speeds = []
+            speed_sc = BASE_SPEED
+            for _ in layers:
+                speeds.append(speed_sc)
+                speed_sc += SPEED_STEP
+
+        # group layers that scroll together
+        groups = []
+        for layer, speed in zip(layers, speeds):
+            if groups and groups[-1][1] == speed:
+                groups[-1][0].append(layer)
+            else:
+                groups.append(([layer], speed))
+
+        # baked layers: (surface, y offset, speed)
+        self.layers = []
+        for i, (group, speed) in enumerate(groups):
+            if i == 0:
+                # nothing is drawn behind the back layer, bake it onto black without alpha
+                baked = pygame.Surface(group[0].get_size())
+                if pygame.display.get_surface():
+                    baked = baked.convert()
+                baked.fill((0, 0, 0))
+                for layer in group:
+                    baked.blit(layer, (0, 0))
+                self.layers.append((baked, 0, speed))
+            else:
+                baked = group[0].copy()
+                for layer in group[1:]:
+                    baked.blit(layer, (0, 0))
+                bounds = baked.get_bounding_rect()
+                if bounds.width and bounds.height:
+                    # only the rows: the layer is tiled every self.width pixels, so it keeps its full width
+                    area = pygame.Rect(0, bounds.y, baked.get_width(), bounds.height)
+                    self.layers.append((baked.subsurface(area).copy(), area.y, speed))
+        self.blit_count = 0
+
+    def draw(self, surface, scroll):
+        """Draw the tiles visible for the current scroll, returns the number of blits"""
+        blits = 0
+        for img, y, speed in self.layers:
+            offset = scroll * speed
+            tile = max(0, int(offset // self.width))
+            while tile < self.tiles:
+                x = tile * self.width - offset
+                if x >= self.screen_width:
+                    break
+                surface.blit(img, (x, y))
+                blits += 1
+                tile += 1
+        self.blit_count = blits
+        perf.count("blits", blits)
+        return blits
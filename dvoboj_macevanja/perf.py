@@ -0,0 +1,108 @@
+"""Hot-path instrumentation: phase timers, function timers and per-frame counters
+
+The game loop brackets each phase with start() and stop():
+
+    t = perf.start()
+    ...
+    perf.stop("move", t)
+
+Functions can register a timer of their own with the timed() decorator, and
+counters such as blits are bumped with count(). While instrumentation is
+disabled start() returns 0 and stop(), count() and the timed wrappers return
+at once, so the calls can stay in the hot path. The in-game overlay
+(perf_overlay.py) and the benchmarks (benchmarks/run.py) turn it on.
+"""
+import functools
+import time
+from collections import deque
+
+enabled = False
+# phase -> durations in milliseconds, the last `history` of them when history is set
+samples = {}
+history = None
+# counters of the frame being drawn, and of the last finished frame
+counters = {}
+last_counters = {}
+
+_clock = time.perf_counter
+
+
+def enable(on=True, history_frames=None):
+    """Turn instrumentation on or off, keeping only the last history_frames samples per timer if given"""
+    global enabled, history
+    enabled = on
+    if history_frames != history:
+        history = history_frames
+        samples.clear()
+
+
+def reset():
+    samples.clear()
+    counters.clear()
+    last_counters.clear()
+
+
+def start():
+    if enabled:
+        return _clock()
+    return 0.0
+
+
+def stop(name, started):
+    if enabled:
+        elapsed = (_clock() - started) * 1000
+        phase = samples.get(name)
+        if phase is None:
+            phase = samples[name] = deque(maxlen=history) if history else []
+        phase.append(elapsed)
+
+
+def timed(name):
+    """Decorator timing every call of a function under name"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = _clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stop(name, started)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1):
+    """Add to a per-frame counter, like blits or surfaces allocated"""
+    if enabled:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def end_frame():
+    """Close the counters of the current frame"""
+    global counters, last_counters
+    if enabled:
+        last_counters = counters
+        counters = {}
+
+
+def percentile(values, fraction):
+    """Value below which the given fraction of values lie"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary():
+    """p50, p99, mean and count of every timer"""
+    return {
+        name: {
+            'p50': percentile(values, 0.50),
+            'p99': percentile(values, 0.99),
+            'mean': sum(values) / len(values),
+            'count': len(values)
+        }
+        for name, values in samples.items() if values
+    }
@@ -0,0 +1,80 @@
+import pygame
+import perf
+
+HISTORY_FRAMES = 120        # frames kept for the graph and the averages
+TEXT_INTERVAL = 15          # frames between refreshes of the numbers
+
+# timers listed on the overlay, in order
+SUBSYSTEMS = ("input", "move", "update", "collision", "drawbg", "Fighter.draw", "flip")
+COUNTERS = ("blits", "surfaces")
+
+
+class PerfOverlay:
+    """In-game performance overlay, toggled with F3
+
+    Shows FPS, a frame-time graph, the average time of every instrumented
+    subsystem and the blit and surface allocation counts of the last frame.
+    Instrumentation is only enabled while the overlay is visible.
+    """
+    def __init__(self, font, clock, x=10, y=140, key=pygame.K_F3):
+        self.font = font
+        self.clock = clock
+        self.x = x
+        self.y = y
+        self.key = key
+        self.visible = False
+        self.lines = []
+        self.frames = 0
+        self.graph_height = 40
+        self.budget_ms = 1000 / 60    # frame time drawn as a half-height bar
+
+    def toggle(self):
+        self.visible = not self.visible
+        perf.reset()
+        perf.enable(self.visible, HISTORY_FRAMES if self.visible else None)
+        self.frames = 0
+
+    def handle_input(self, event):
+        if event.type == pygame.KEYDOWN and event.key == self.key:
+            self.toggle()
+
+    def refresh(self):
+        """Render the numbers again"""
+        summary = perf.summary()
+        frame = summary.get("frame")
+        lines = [f"FPS {self.clock.get_fps():5.1f}"]
+        if frame:
+            lines.append(f"frame {frame['mean']:6.2f} ms  p99 {frame['p99']:6.2f}")
+        for name in SUBSYSTEMS:
+            stats = summary.get(name)
+            if stats:
+                lines.append(f"{name:<17}{stats['mean']:6.2f} ms")
+        lines.append("  ".join(f"{name} {perf.last_counters.get(name, 0)}" for name in COUNTERS))
+        self.lines = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+
+    def draw(self, screen):
+        """Draw the overlay, returns the rect it covers or None when hidden"""
+        if not self.visible:
+            return None
+        if self.frames % TEXT_INTERVAL == 0:
+            self.refresh()
+        self.frames += 1
+
+        line_height = self.font.get_linesize()
+        width = max([line.get_width() for line in self.lines] + [HISTORY_FRAMES * 2]) + 10
+        height = len(self.lines) * line_height + self.graph_height + 15
+        area = pygame.Rect(self.x, self.y, width, height)
+        screen.fill((0, 0, 0), area)
+
+        y = self.y + 5
+        for line in self.lines:
+            screen.blit(line, (self.x + 5, y))
+            y += line_height
+
+        # frame time history, one bar per frame, red above the 60 FPS budget
+        y += 5
+        for i, ms in enumerate(perf.samples.get("frame", ())):
+            bar = min(self.graph_height, int(ms / self.budget_ms * self.graph_height / 2))
+            color = (255, 60, 60) if ms > self.budget_ms else (60, 220, 60)
+            screen.fill(color, (self.x + 5 + i * 2, y + self.graph_height - bar, 2, bar))
+        return area
@@ -0,0 +1,139 @@
+"""Match recording and replay
+
+A replay is the per-tick input of both players, exactly what Fighter.move
+consumes, in a packed binary file:
+
+    header  "DVRP", version, tick rate, tick count     (<4sBHI)
+            flags                                       (version 2 on, B)
+            per player: number of animations, then the frame count of each,
+            then the character id, length first       (version 3 on)
+    ticks   one byte per player per tick, the simulation.INPUT_* bitfield
+
+Feeding the stream back through the simulation reproduces the match, either
+rendered by the game (python -m app --replay FILE) or headless at full speed:
+
+    python -m replay FILE
+"""
+import struct
+import sys
+import time
+from array import array
+
+import characters
+import simulation
+
+MAGIC = b"DVRP"
+VERSION = 3
+HEADER = struct.Struct("<4sBHI")
+# hits were decided by sprite hitboxes (hitboxes.py), not by the body rectangles
+FLAG_HITBOXES = 1
+
+
+class Replay:
+    """Recorded inputs of a match"""
+    def __init__(self, p1_steps, p2_steps, tick_rate=simulation.TICK_RATE, inputs=None, flags=0, characters=(None, None)):
+        self.steps = (tuple(p1_steps), tuple(p2_steps))
+        self.tick_rate = tick_rate
+        self.flags = flags
+        # ids of the characters, None in replays from before characters had manifests
+        self.characters = tuple(characters)
+        # p1 and p2 input of every tick, interleaved
+        self.inputs = array("B") if inputs is None else inputs
+
+    def __len__(self):
+        return len(self.inputs) // 2
+
+    def __getitem__(self, tick):
+        return self.inputs[2 * tick], self.inputs[2 * tick + 1]
+
+    def record(self, p1_input, p2_input):
+        self.inputs.append(p1_input)
+        self.inputs.append(p2_input)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.tick_rate, len(self)))
+            f.write(bytes([self.flags]))
+            for steps, id in zip(self.steps, self.characters):
+                name = (id or "").encode()
+                f.write(bytes([len(steps), *steps, len(name)]) + name)
+            self.inputs.tofile(f)
+
+    def specs(self):
+        """FighterSpec of both players, the default numbers when a character is not known"""
+        return [characters.load(id).spec if id else simulation.FighterSpec(steps)
+                for steps, id in zip(self.steps, self.characters)]
+
+    def new_match(self, width=simulation.ARENA_WIDTH, height=simulation.ARENA_HEIGHT):
+        """A fresh match for the recorded characters"""
+        return simulation.MatchState(*self.specs(), width, height)
+
+
+def load_replay(path):
+    """Read a replay written by Replay.save"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, tick_rate, ticks = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a replay")
+    if not 1 <= version <= VERSION:
+        raise ValueError(f"{path}: unsupported replay version {version}")
+    offset = HEADER.size
+    flags = 0
+    if version >= 2:
+        flags = data[offset]
+        offset += 1
+    steps = []
+    ids = []
+    for _ in range(2):
+        count = data[offset]
+        steps.append(tuple(data[offset + 1:offset + 1 + count]))
+        offset += 1 + count
+        id = None
+        if version >= 3:
+            length = data[offset]
+            id = data[offset + 1:offset + 1 + length].decode() or None
+            offset += 1 + length
+        ids.append(id)
+    inputs = array("B", data[offset:offset + 2 * ticks])
+    if len(inputs) != 2 * ticks:
+        raise ValueError(f"{path} is truncated")
+    return Replay(steps[0], steps[1], tick_rate, inputs, flags, ids)
+
+
+def run_headless(replay, match=None):
+    """Play the whole replay through the simulation, returns the final match state"""
+    if match is None:
+        match = replay.new_match()
+    advance = simulation.advance
+    inputs = replay.inputs
+    for i in range(0, len(inputs), 2):
+        advance(match, inputs[i], inputs[i + 1])
+    return match
+
+
+def main(argv):
+    if len(argv) != 1:
+        print("usage: python -m replay FILE")
+        return 2
+    replay = load_replay(argv[0])
+    match = replay.new_match()
+    if replay.flags & FLAG_HITBOXES:
+        if all(replay.characters):
+            # the tables come from the sprites, no display needed
+            import hitboxes
+            match.hitboxes = tuple(hitboxes.for_character(characters.load(id)) for id in replay.characters)
+        else:
+            print("note: recorded with sprite hitboxes, replayed with body rectangles, the result can differ")
+    start = time.perf_counter()
+    match = run_headless(replay, match)
+    elapsed = time.perf_counter() - start
+    print(f"ticks: {len(replay)} ({len(replay) / replay.tick_rate:.1f}s of play)")
+    print(f"score: {match.score[0]} - {match.score[1]}")
+    print(f"health: {match.fighters[0].health} - {match.fighters[1].health}")
+    print(f"simulated in {elapsed * 1000:.1f} ms ({len(replay) / max(elapsed, 1e-9):.0f} ticks/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
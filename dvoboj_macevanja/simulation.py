@@ -0,0 +1,474 @@
+"""Headless, deterministic fight simulation
+
+Everything that decides the outcome of a fight lives here as plain Python:
+no display, mixer, clock or input devices. Time advances in fixed ticks, one
+call to step() per tick, and inputs are bitfields, so a match can be run far
+faster than real time for balancing, tests and AI work.
+
+Fighter (fighter.py) wraps a FighterState with the sprites, sounds and input
+devices; app.py drives the same functions tick by tick.
+"""
+import struct
+import zlib
+from collections import namedtuple
+
+import perf
+
+TICK_RATE = 60                  # simulation ticks per second
+
+# window the fight takes place in
+ARENA_WIDTH = 1000
+ARENA_HEIGHT = 540
+FLOOR_MARGIN = 70               # floor is this far above the bottom of the window
+
+# movement
+SPEED = 5
+GRAVITY = 2
+JUMP_VELOCITY = -30
+
+# body and attack
+BODY_WIDTH = 120
+BODY_HEIGHT = 180
+ATTACK_DAMAGE = 10
+ATTACK_COOLDOWN = 25            # ticks after an attack before the next one
+HIT_FRAMES = 2                  # only the first frames of an attack deal damage, without hitboxes
+
+# animation frames advance once more than 70 ms have passed
+ANIMATION_COOLDOWN = 70
+ANIMATION_TICKS = ANIMATION_COOLDOWN * TICK_RATE // 1000 + 1
+
+# round flow
+INTRO_COUNT = 4                                 # countdown images 4..1 before a round
+COUNTDOWN_TICKS = 1500 * TICK_RATE // 1000      # time each countdown image is shown
+ROUND_OVER_TICKS = 4000 * TICK_RATE // 1000     # victory screen before the next round
+START_POSITIONS = ((100, 290, False), (800, 290, True))
+
+# input bits, one bitfield per player per tick
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+INPUT_ATTACK1 = 8
+INPUT_ATTACK2 = 16
+
+# actions, the rows of the spritesheet
+ACTION_IDLE = 0
+ACTION_RUN = 1
+ACTION_JUMP = 2
+ACTION_ATTACK1 = 3
+ACTION_ATTACK2 = 4
+ACTION_HIT = 5
+ACTION_DEATH = 6
+
+# events reported by a tick, for sounds, telemetry and replays
+EVENT_ATTACK = 1        # attack started (the swing sound)
+EVENT_HIT = 2           # attack landed, damage and the target's health after it
+EVENT_COUNTDOWN = 3     # countdown went down, value is the new count
+EVENT_ROUND_OVER = 4    # player won the round, value is the round length in ticks
+EVENT_ROUND_START = 5   # fighters were reset for a new round
+EVENT_MISS = 6          # attack ended or was cut short without landing
+
+Event = namedtuple("Event", "kind player attack_type damage value")
+
+# fields that make up the state of a match, in the order they are packed
+FIGHTER_FIELDS = ("x", "y", "flip", "vely", "running", "jump", "attacking", "attack_type", "attack_cooldown",
+                  "attack_hit_this_attack", "hit", "health", "alive", "action", "frame", "frame_ticks")
+MATCH_FIELDS = ("tick", "intro_count", "intro_ticks", "round_over", "round_over_ticks", "round_start_tick")
+_FIGHTER = struct.Struct("<ii?i???ii??i?iii")     # FIGHTER_FIELDS, 43 bytes
+_MATCH = struct.Struct("<iii?iiii")                # MATCH_FIELDS and the score
+
+
+class FighterSpec:
+    """Per-character numbers of the fight, from a character manifest (characters.py)
+
+    frame_ticks[action][frame] is how many ticks each animation frame is shown.
+    """
+    def __init__(self, steps, frame_ticks=None, damage=ATTACK_DAMAGE, cooldown=ATTACK_COOLDOWN):
+        self.steps = tuple(steps)
+        if frame_ticks is None:
+            frame_ticks = [[ANIMATION_TICKS] * count for count in self.steps]
+        self.frame_ticks = tuple(tuple(ticks) for ticks in frame_ticks)
+        self.damage = damage
+        self.cooldown = cooldown
+
+
+class FighterState:
+    """Simulation state of one fighter
+
+    Only numbers and flags, in slots: copy(), pack() and reset() take about a
+    microsecond, so lookahead, rollback and replays can make as many as they
+    need. pack() is also a hashable key of the state.
+    """
+    __slots__ = ("player", "width", "height") + FIGHTER_FIELDS
+
+    def __init__(self, player, x, y, flip):
+        self.player = player
+        self.width = BODY_WIDTH
+        self.height = BODY_HEIGHT
+        self.reset(x, y, flip)
+
+    def reset(self, x, y, flip):
+        """Back to the start of a round at (x, y)"""
+        self.x = x
+        self.y = y
+        self.flip = flip
+        self.vely = 0
+        self.running = False
+        self.jump = False
+        self.attacking = False
+        self.attack_type = 0
+        self.attack_cooldown = 0
+        self.attack_hit_this_attack = False
+        self.hit = False
+        self.health = 100
+        self.alive = True
+        # 0:Still 1:Run 2:Jump 3:Attack1 4:Attack2 5:Damage 6:Die 7:fall
+        self.action = ACTION_IDLE
+        self.frame = 0
+        self.frame_ticks = 0    # ticks since the animation frame last changed
+
+    @property
+    def centerx(self):
+        return self.x + self.width // 2
+
+    def copy(self):
+        # spelled out, a loop over the slots takes four times as long
+        clone = FighterState.__new__(FighterState)
+        clone.player = self.player
+        clone.width = self.width
+        clone.height = self.height
+        clone.x = self.x
+        clone.y = self.y
+        clone.flip = self.flip
+        clone.vely = self.vely
+        clone.running = self.running
+        clone.jump = self.jump
+        clone.attacking = self.attacking
+        clone.attack_type = self.attack_type
+        clone.attack_cooldown = self.attack_cooldown
+        clone.attack_hit_this_attack = self.attack_hit_this_attack
+        clone.hit = self.hit
+        clone.health = self.health
+        clone.alive = self.alive
+        clone.action = self.action
+        clone.frame = self.frame
+        clone.frame_ticks = self.frame_ticks
+        return clone
+
+    def pack(self):
+        """FIGHTER_FIELDS as bytes"""
+        return _FIGHTER.pack(self.x, self.y, self.flip, self.vely, self.running, self.jump, self.attacking,
+                             self.attack_type, self.attack_cooldown, self.attack_hit_this_attack, self.hit,
+                             self.health, self.alive, self.action, self.frame, self.frame_ticks)
+
+    def unpack(self, data):
+        """Set the fields from pack() bytes"""
+        (self.x, self.y, self.flip, self.vely, self.running, self.jump, self.attacking,
+         self.attack_type, self.attack_cooldown, self.attack_hit_this_attack, self.hit,
+         self.health, self.alive, self.action, self.frame, self.frame_ticks) = _FIGHTER.unpack(data)
+
+
+class MatchState:
+    """Simulation state of a whole match: both fighters, countdown, rounds and score"""
+    def __init__(self, p1, p2, width=ARENA_WIDTH, height=ARENA_HEIGHT):
+        self.width = width
+        self.height = height
+        # FighterSpec of each fighter, p1 and p2 are specs or just the frames in every animation
+        self.specs = tuple(spec if isinstance(spec, FighterSpec) else FighterSpec(spec) for spec in (p1, p2))
+        # frames in every animation, per fighter
+        self.steps = tuple(spec.steps for spec in self.specs)
+        self.fighters = [FighterState(player, *START_POSITIONS[player - 1]) for player in (1, 2)]
+        self.tick = 0
+        self.intro_count = INTRO_COUNT
+        self.intro_ticks = 0
+        self.round_over = False
+        self.round_over_ticks = 0
+        self.round_start_tick = 0
+        self.score = [0, 0]
+        self.events = []
+        # hitboxes.HitboxTable of each fighter for pixel accurate hits, None for the body rectangles
+        self.hitboxes = None
+
+    @property
+    def fighting(self):
+        return self.intro_count <= 0
+
+    def copy(self):
+        clone = MatchState.__new__(MatchState)
+        clone.__dict__.update(self.__dict__)
+        clone.fighters = [fighter.copy() for fighter in self.fighters]
+        clone.score = list(self.score)
+        clone.events = list(self.events)
+        return clone
+
+
+#----------------fighter------------------------------------------------------
+
+def move_fighter(state, target, inputs, sc_width, sc_height, round_over, events=None):
+    """Apply one tick of input, gravity and movement, returns True if an attack started"""
+    started = False
+    dx = 0
+    dy = 0
+    state.running = False
+    state.attack_type = 0
+
+    if state.attacking == False and state.alive == True and round_over == False:
+        if inputs & INPUT_RIGHT:
+            dx = SPEED
+            state.running = True
+        if inputs & INPUT_LEFT:
+            dx = -SPEED
+            state.running = True
+        if inputs & INPUT_JUMP and state.jump == False:
+            state.vely = JUMP_VELOCITY
+            state.jump = True
+        if inputs & (INPUT_ATTACK1 | INPUT_ATTACK2):
+            state.attack_type = 2 if inputs & INPUT_ATTACK2 else 1
+            started = attack(state, events)
+
+    state.vely += GRAVITY
+    dy += state.vely
+
+    if state.x + dx < 0:
+        dx = -state.x
+    if state.x + state.width + dx > sc_width:
+        dx = sc_width - (state.x + state.width)
+    floor = sc_height - FLOOR_MARGIN
+    if state.y + state.height + dy > floor:
+        state.vely = 0
+        state.jump = False
+        dy = floor - (state.y + state.height)
+
+    # facing
+    state.flip = not target.centerx > state.centerx
+
+    if state.attack_cooldown > 0:
+        state.attack_cooldown -= 1
+
+    state.x += dx
+    state.y += dy
+    return started
+
+
+def attack(state, events=None):
+    """Start an attack if the cooldown allows it, returns True when it started"""
+    if state.attack_cooldown == 0:
+        state.attacking = True
+        state.attack_hit_this_attack = False
+        if events is not None:
+            events.append(Event(EVENT_ATTACK, state.player, state.attack_type, 0, 0))
+        return True
+    return False
+
+
+def update_action(state, new_action):
+    if new_action != state.action:
+        state.action = new_action
+        state.frame = 0
+        state.frame_ticks = 0
+
+
+def update_fighter(state, spec, events=None):
+    """Pick the action for this tick and advance its animation, like Fighter.update"""
+    steps = spec.steps
+    if state.health <= 0:
+        state.health = 0
+        state.alive = False
+        update_action(state, ACTION_DEATH)
+    elif state.hit == True:
+        update_action(state, ACTION_HIT)
+    elif state.attacking == True:
+        if state.attack_type == 1:
+            update_action(state, ACTION_ATTACK1)
+        if state.attack_type == 2:
+            update_action(state, ACTION_ATTACK2)
+    elif state.jump == True:
+        update_action(state, ACTION_JUMP)
+    elif state.running == True:
+        update_action(state, ACTION_RUN)
+    else:
+        update_action(state, ACTION_IDLE)
+
+    state.frame_ticks += 1
+    if state.frame_ticks >= spec.frame_ticks[state.action][state.frame]:
+        state.frame += 1
+        state.frame_ticks = 0
+    if state.frame >= steps[state.action]:
+        if state.alive == False:
+            state.frame = steps[state.action] - 1
+        else:
+            state.frame = 0
+            if state.action == ACTION_ATTACK1 or state.action == ACTION_ATTACK2:
+                if events is not None and not state.attack_hit_this_attack:
+                    events.append(Event(EVENT_MISS, state.player, state.action - ACTION_ATTACK1 + 1, 0, 0))
+                state.attacking = False
+                state.attack_hit_this_attack = False
+                state.attack_cooldown = spec.cooldown
+            if state.action == ACTION_HIT:
+                if events is not None and state.attacking and not state.attack_hit_this_attack:
+                    events.append(Event(EVENT_MISS, state.player, state.attack_type, 0, 0))
+                state.hit = False
+                state.attacking = False
+                state.attack_cooldown = spec.cooldown
+
+
+def attack_box(state):
+    """(x, y, width, height) of the attack in front of the fighter, or None when not attacking"""
+    if not state.attacking:
+        return None
+    # 50% wider and 20% taller than the body
+    width = state.width * 3 // 2
+    height = state.height * 6 // 5
+    if state.flip:
+        x = state.centerx - width
+    else:
+        x = state.centerx
+    return (x, state.y, width, height)
+
+
+def check_attack_hit(state, target, events=None, hitboxes=None, damage=ATTACK_DAMAGE):
+    """Deal damage if the attack reaches the target, returns True on a hit
+
+    hitboxes is a pair (attacker's table, target's table) of hitboxes.HitboxTable;
+    without it the attack box is tested against the target's body rectangle.
+    """
+    if not state.attacking or state.attack_hit_this_attack:
+        return False
+
+    if hitboxes is not None:
+        # the frames whose sword pixels reach the target's pixels deal damage
+        hit = hitboxes[0].hits(state, target, hitboxes[1])
+    else:
+        # the attack box can't tell a wind-up from a swing,
+        # only the first frames of the attack animation can deal damage
+        if state.action == ACTION_ATTACK1 or state.action == ACTION_ATTACK2:
+            if state.frame >= HIT_FRAMES:
+                return False
+        x, y, width, height = attack_box(state)
+        hit = (x < target.x + target.width and target.x < x + width
+               and y < target.y + target.height and target.y < y + height)
+    if hit:
+        target.health -= damage
+        target.hit = True
+        state.attack_hit_this_attack = True
+        if events is not None:
+            events.append(Event(EVENT_HIT, state.player, state.attack_type, damage, target.health))
+        return True
+    return False
+
+
+def reset_fighter(state, x, y, flip):
+    """Put a fighter back at the start of a round"""
+    state.reset(x, y, flip)
+
+
+#----------------match------------------------------------------------------
+
+def tick_countdown(match):
+    """Advance the countdown before a round"""
+    if match.intro_count <= 0:
+        return
+    match.intro_ticks += 1
+    if match.intro_ticks >= COUNTDOWN_TICKS:
+        match.intro_count -= 1
+        match.intro_ticks = 0
+        match.events.append(Event(EVENT_COUNTDOWN, 0, 0, 0, match.intro_count))
+
+
+def tick_round(match):
+    """Score a finished round and start the next one once the victory screen is over"""
+    f1, f2 = match.fighters
+    if match.round_over == False:
+        if f1.alive == False:
+            end_round(match, 2)
+        elif f2.alive == False:
+            end_round(match, 1)
+    else:
+        match.round_over_ticks += 1
+        if match.round_over_ticks > ROUND_OVER_TICKS:
+            start_round(match)
+
+
+def end_round(match, winner):
+    match.score[winner - 1] += 1
+    match.round_over = True
+    match.round_over_ticks = 0
+    match.events.append(Event(EVENT_ROUND_OVER, winner, 0, 0, match.tick - match.round_start_tick))
+
+
+def start_round(match):
+    match.round_over = False
+    match.intro_count = INTRO_COUNT
+    match.intro_ticks = 0
+    match.round_start_tick = match.tick
+    for fighter in match.fighters:
+        reset_fighter(fighter, *START_POSITIONS[fighter.player - 1])
+    match.events.append(Event(EVENT_ROUND_START, 0, 0, 0, 0))
+
+
+def advance(match, p1_input, p2_input):
+    """Run one tick of the match in place
+
+    The move, update and collision stages are timed as perf phases of those names.
+    """
+    f1, f2 = match.fighters
+    events = match.events
+    events.clear()
+
+    t = perf.start()
+    if match.intro_count <= 0:
+        move_fighter(f1, f2, p1_input, match.width, match.height, match.round_over, events)
+        move_fighter(f2, f1, p2_input, match.width, match.height, match.round_over, events)
+    else:
+        tick_countdown(match)
+    perf.stop("move", t)
+
+    t = perf.start()
+    spec1, spec2 = match.specs
+    update_fighter(f1, spec1, events)
+    update_fighter(f2, spec2, events)
+    perf.stop("update", t)
+
+    if match.intro_count <= 0:
+        t = perf.start()
+        tables = match.hitboxes
+        check_attack_hit(f1, f2, events, tables, spec1.damage)
+        check_attack_hit(f2, f1, events, tables and tables[::-1], spec2.damage)
+        perf.stop("collision", t)
+
+    tick_round(match)
+    match.tick += 1
+    return match
+
+
+def snapshot(match):
+    """Everything a tick changes packed in 115 bytes, for restore() and checksum()"""
+    f1, f2 = match.fighters
+    return _MATCH.pack(match.tick, match.intro_count, match.intro_ticks, match.round_over,
+                       match.round_over_ticks, match.round_start_tick, *match.score) + f1.pack() + f2.pack()
+
+
+def restore(match, saved):
+    """Put a match back to a snapshot in place, without the events of its tick
+
+    The FighterState objects are kept, only their fields are set back, so
+    the Fighters drawing them don't notice.
+    """
+    f1, f2 = match.fighters
+    (match.tick, match.intro_count, match.intro_ticks, match.round_over,
+     match.round_over_ticks, match.round_start_tick, score1, score2) = _MATCH.unpack_from(saved)
+    match.score[:] = score1, score2
+    f1.unpack(saved[_MATCH.size:_MATCH.size + _FIGHTER.size])
+    f2.unpack(saved[_MATCH.size + _FIGHTER.size:])
+    match.events.clear()
+
+
+def checksum(match):
+    """CRC of a match or a snapshot, equal on every machine that simulated the same inputs"""
+    if not isinstance(match, bytes):
+        match = snapshot(match)
+    return zlib.crc32(match)
+
+
+def step(state, p1_input, p2_input):
+    """(state, p1_input, p2_input) -> next state, leaving the given state untouched"""
+    return advance(state.copy(), p1_input, p2_input)
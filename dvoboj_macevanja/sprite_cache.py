@@ -0,0 +1,161 @@
+import math
+import pygame
+import perf
+import assets
+
+# Process-wide cache of sliced and scaled animation frames.
+# Fighters are rebuilt after every round, so the frames of each character are
+# built once here and shared by every Fighter created later.
+# key: (spritesheet or its path, size, scale, animation steps) -> FrameAtlas
+_atlases = {}
+_hits = 0
+_misses = 0
+
+
+class FrameAtlas:
+    """All frames of one character, in both facings, packed into one surface
+
+    Frames are laid out row by row in a square-ish grid. The first half of the
+    atlas holds the frames as drawn in the spritesheet, the second half the
+    same frames flipped horizontally, so drawing never has to flip or allocate.
+    Drawing areas are trimmed to the opaque pixels of each frame, so only what
+    is visible gets blitted.
+    """
+    def __init__(self, spritesheet, size, scale, animationstep):
+        self.layout(size, scale, animationstep)
+        self.surface = pygame.Surface((self.columns * self.scale, 2 * self.rows * self.scale), pygame.SRCALPHA, spritesheet)
+
+        # areas[action][frame] -> (area facing right, area facing left), trimmed
+        self.areas = []
+        # offsets[action][frame] -> (offset facing right, offset facing left) of the
+        # trimmed area from the top left corner of the frame
+        self.offsets = []
+        # anm_list[action][frame] -> subsurface of the right facing frame
+        self.anm_list = []
+        index = 0
+        for y, animate in enumerate(self.steps):
+            areas = []
+            offsets = []
+            frames = []
+            for x in range(animate):
+                img = spritesheet.subsurface(x * size, y * size, size, size)
+                right = self.frame_rect(index, False)
+                left = self.frame_rect(index, True)
+                # scale straight into the atlas so the alpha channel is copied, not blended
+                pygame.transform.scale(img, right.size, self.surface.subsurface(right))
+                pygame.transform.scale(pygame.transform.flip(img, True, False), left.size, self.surface.subsurface(left))
+                right_area, right_offset = self.trim(right)
+                left_area, left_offset = self.trim(left)
+                areas.append((right_area, left_area))
+                offsets.append((right_offset, left_offset))
+                frames.append(self.surface.subsurface(right))
+                index += 1
+            self.areas.append(areas)
+            self.offsets.append(offsets)
+            self.anm_list.append(frames)
+
+    @classmethod
+    def baked(cls, surface, size, scale, animationstep, areas, offsets):
+        """Atlas from a surface and trimmed areas saved by bake.py, nothing is sliced or scaled"""
+        atlas = cls.__new__(cls)
+        atlas.layout(size, scale, animationstep)
+        atlas.surface = surface
+        atlas.areas = [[tuple(pygame.Rect(area) for area in pair) for pair in frames] for frames in areas]
+        atlas.offsets = [[tuple(tuple(offset) for offset in pair) for pair in frames] for frames in offsets]
+        atlas.anm_list = []
+        index = 0
+        for animate in atlas.steps:
+            atlas.anm_list.append([surface.subsurface(atlas.frame_rect(index + x, False)) for x in range(animate)])
+            index += animate
+        return atlas
+
+    def layout(self, size, scale, animationstep):
+        self.size = size
+        self.scale = size * scale
+        self.steps = tuple(animationstep)
+        count = sum(self.steps)
+        self.columns = math.ceil(math.sqrt(count))
+        self.rows = math.ceil(count / self.columns)
+
+    def frame_rect(self, index, flip):
+        """Area of the index-th frame inside the atlas"""
+        row, column = divmod(index, self.columns)
+        if flip:
+            row += self.rows
+        return pygame.Rect(column * self.scale, row * self.scale, self.scale, self.scale)
+
+    def trim(self, rect):
+        """Area of the opaque pixels inside rect and its offset from the corner of rect"""
+        bounds = self.surface.subsurface(rect).get_bounding_rect()
+        return bounds.move(rect.x, rect.y), (bounds.x, bounds.y)
+
+    def get_bytes(self):
+        """Memory held by the atlas surface"""
+        return self.surface.get_bytesize() * self.surface.get_width() * self.surface.get_height()
+
+
+def pack_name(path, size, scale, animationstep):
+    """Name of a character's atlas in the asset pack"""
+    return f"atlas:{path}:{size}:{scale}:{','.join(map(str, animationstep))}"
+
+
+def load_baked(path, size, scale, animationstep):
+    """Cache the atlas of a spritesheet from the asset pack, None if it is not baked or stale"""
+    key = (path, size, scale, tuple(animationstep))
+    atlas = _atlases.get(key)
+    if atlas is None:
+        name = pack_name(path, size, scale, animationstep)
+        surface = assets.packed(name)
+        if surface is None:
+            return None
+        extra = assets.pack.extra(name)
+        atlas = _atlases[key] = FrameAtlas.baked(surface, size, scale, animationstep, extra['areas'], extra['offsets'])
+    return atlas
+
+
+def get_atlas(spritesheet, size, scale, animationstep):
+    """Return the cached atlas for a character, building it on first use
+
+    spritesheet is a surface or the path of the image; a path is looked up in
+    the asset pack first and only decoded and sliced if it was not baked.
+    """
+    global _hits, _misses
+    key = (spritesheet, size, scale, tuple(animationstep))
+    atlas = _atlases.get(key)
+    if atlas is None:
+        _misses += 1
+        perf.count("surfaces")
+        if isinstance(spritesheet, str):
+            atlas = load_baked(spritesheet, size, scale, animationstep)
+            if atlas is None:
+                atlas = FrameAtlas(assets.image(spritesheet), size, scale, animationstep)
+        else:
+            atlas = FrameAtlas(spritesheet, size, scale, animationstep)
+        _atlases[key] = atlas
+    else:
+        _hits += 1
+    return atlas
+
+
+def get_frames(spritesheet, size, scale, animationstep):
+    """Return the cached frames for a character as anm_list[action][frame]"""
+    return get_atlas(spritesheet, size, scale, animationstep).anm_list
+
+
+def cache_info():
+    """Cache statistics: number of characters, frames and bytes held, hits and misses"""
+    return {
+        'entries': len(_atlases),
+        'frames': sum(sum(atlas.steps) for atlas in _atlases.values()),
+        'bytes': sum(atlas.get_bytes() for atlas in _atlases.values()),
+        'hits': _hits,
+        'misses': _misses
+    }
+
+
+def clear_cache():
+    """Drop every cached frame and reset the statistics"""
+    global _hits, _misses
+    _atlases.clear()
+    _hits = 0
+    _misses = 0
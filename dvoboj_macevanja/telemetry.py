@@ -0,0 +1,230 @@
+"""Match telemetry: every simulation event of a session in a columnar file
+
+The game loop hands the events of each tick to log(), which only appends
+them to a deque (thread safe without a lock in CPython). A background thread
+wakes every FLUSH_SECONDS, takes what has queued up and appends it to the
+file as one block of columns:
+
+    header  "DVTL", version, tick rate                  (<4sBH)
+            length of the JSON metadata, then the JSON  (<I)
+    blocks  event count (<I), then one array per column of COLUMNS
+
+A block is only written whole and the file only grows, so a session that
+crashes loses at most the last FLUSH_SECONDS. read() loads a whole session
+into numpy arrays, one per column, for analysis:
+
+    python -m app --telemetry session.dvt
+    python -m telemetry session.dvt
+    python -m telemetry --replay match.dvr session.dvt
+"""
+import json
+import struct
+import sys
+import threading
+from array import array
+from collections import deque
+
+import simulation
+
+MAGIC = b"DVTL"
+VERSION = 1
+HEADER = struct.Struct("<4sBH")
+COUNT = struct.Struct("<I")
+# name, array typecode and numpy dtype of every column
+COLUMNS = (
+    ("tick", "I", "<u4"),           # tick the event happened in
+    ("kind", "B", "u1"),            # simulation.EVENT_*
+    ("player", "B", "u1"),          # attacker, round winner, 0 for the match
+    ("attack_type", "B", "u1"),     # 1 or 2 for attacks, hits and misses, the player's last attack when
+                                    # the event did not know (attack_type is only set on the first tick)
+    ("damage", "h", "<i2"),         # damage of a hit
+    ("value", "i", "<i4"),          # health after a hit, countdown, round length in ticks
+    ("score1", "B", "u1"),          # score after the tick
+    ("score2", "B", "u1"),
+)
+FLUSH_SECONDS = 1.0
+
+
+class TelemetryWriter:
+    """Appends logged events to a telemetry file from a background thread"""
+    def __init__(self, path, metadata=None, tick_rate=simulation.TICK_RATE, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.file = open(path, "wb")
+        meta = json.dumps(metadata or {}).encode()
+        self.file.write(HEADER.pack(MAGIC, VERSION, tick_rate) + COUNT.pack(len(meta)) + meta)
+        self.file.flush()
+        self.flush_seconds = flush_seconds
+        # (tick, score1, score2, event) waiting for the writer thread
+        self.queue = deque()
+        self.logged = 0
+        self.written = 0
+        self.blocks = 0
+        # attack each player started last, only touched by the writer thread
+        self.swing = [0, 0, 0]
+        self.closing = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def log(self, tick, events, score):
+        """Queue the events of a tick, called from the game loop"""
+        append = self.queue.append
+        score1, score2 = score
+        for event in events:
+            append((tick, score1, score2, event))
+        self.logged += len(events)
+
+    def run(self):
+        while not self.closing.wait(self.flush_seconds):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Write everything queued so far as one block"""
+        queue = self.queue
+        count = len(queue)
+        if count == 0:
+            return
+        columns = [array(typecode) for name, typecode, dtype in COLUMNS]
+        ticks, kinds, players, attack_types, damages, values, scores1, scores2 = columns
+        popleft = queue.popleft
+        swing = self.swing
+        for _ in range(count):
+            tick, score1, score2, event = popleft()
+            kind, player, attack_type = event.kind, event.player, event.attack_type
+            if kind == simulation.EVENT_ATTACK:
+                swing[player] = attack_type
+            elif attack_type == 0 and (kind == simulation.EVENT_HIT or kind == simulation.EVENT_MISS):
+                attack_type = swing[player]
+            ticks.append(tick)
+            kinds.append(kind)
+            players.append(player)
+            attack_types.append(attack_type)
+            damages.append(event.damage)
+            values.append(event.value)
+            scores1.append(score1)
+            scores2.append(score2)
+        self.file.write(COUNT.pack(count))
+        for column in columns:
+            if sys.byteorder == "big":
+                column.byteswap()
+            column.tofile(self.file)
+        self.file.flush()
+        self.written += count
+        self.blocks += 1
+
+    def close(self):
+        """Write what is left and close the file"""
+        self.closing.set()
+        self.thread.join()
+        self.file.close()
+
+    def info(self):
+        return {
+            'logged': self.logged,
+            'written': self.written,
+            'blocks': self.blocks,
+            'queued': len(self.queue)
+        }
+
+
+def read(path):
+    """Load a telemetry file, returns (metadata, tick rate, column name -> numpy array)"""
+    import numpy as np
+
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, tick_rate = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a telemetry file")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported telemetry version {version}")
+    offset = HEADER.size
+    (length,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    metadata = json.loads(data[offset:offset + length])
+    offset += length
+
+    dtypes = [np.dtype(dtype) for name, typecode, dtype in COLUMNS]
+    row = sum(dtype.itemsize for dtype in dtypes)
+    parts = [[] for _ in COLUMNS]
+    while offset + COUNT.size <= len(data):
+        (count,) = COUNT.unpack_from(data, offset)
+        if offset + COUNT.size + count * row > len(data):
+            # cut off while writing, the blocks before it are whole
+            break
+        offset += COUNT.size
+        for part, dtype in zip(parts, dtypes):
+            part.append(np.frombuffer(data, dtype, count, offset))
+            offset += count * dtype.itemsize
+    columns = {name: np.concatenate(part) if part else np.zeros(0, dtype)
+               for (name, typecode, dtype), part in zip(COLUMNS, parts)}
+    return metadata, tick_rate, columns
+
+
+def summary(columns):
+    """Attacks, hits, misses and damage per player and attack, and the rounds"""
+    import numpy as np
+
+    kind = columns["kind"]
+    result = {"players": {}}
+    for player in (1, 2):
+        mine = columns["player"] == player
+        stats = {}
+        for attack in (1, 2):
+            selected = mine & (columns["attack_type"] == attack)
+            hits = selected & (kind == simulation.EVENT_HIT)
+            stats[f"attack{attack}"] = {
+                "attacks": int(np.count_nonzero(selected & (kind == simulation.EVENT_ATTACK))),
+                "hits": int(np.count_nonzero(hits)),
+                "misses": int(np.count_nonzero(selected & (kind == simulation.EVENT_MISS))),
+                "damage": int(columns["damage"][hits].sum()),
+            }
+        result["players"][player] = stats
+    rounds = kind == simulation.EVENT_ROUND_OVER
+    result["rounds"] = int(np.count_nonzero(rounds))
+    result["round_ticks"] = float(columns["value"][rounds].mean()) if rounds.any() else 0.0
+    result["score"] = [int(columns["score1"][-1]), int(columns["score2"][-1])] if len(kind) else [0, 0]
+    return result
+
+
+def from_replay(replay_path, path):
+    """Play a replay headless and write its events to a telemetry file"""
+    import replay as replays
+
+    recorded = replays.load_replay(replay_path)
+    match = recorded.new_match()
+    if recorded.flags & replays.FLAG_HITBOXES and all(recorded.characters):
+        import characters
+        import hitboxes
+        match.hitboxes = tuple(hitboxes.for_character(characters.load(id)) for id in recorded.characters)
+    writer = TelemetryWriter(path, {"replay": replay_path, "characters": recorded.characters}, recorded.tick_rate)
+    for tick in range(len(recorded)):
+        simulation.advance(match, *recorded[tick])
+        if match.events:
+            writer.log(tick, match.events, match.score)
+    writer.close()
+    return writer
+
+
+def main(argv):
+    if len(argv) == 3 and argv[0] == "--replay":
+        writer = from_replay(argv[1], argv[2])
+        print(f"{writer.written} events in {writer.blocks} blocks written to {argv[2]}")
+        argv = argv[2:]
+    if len(argv) != 1:
+        print("usage: python -m telemetry [--replay REPLAY] FILE")
+        return 2
+    metadata, tick_rate, columns = read(argv[0])
+    result = summary(columns)
+    print(f"{len(columns['kind'])} events, {json.dumps(metadata)}")
+    for player, stats in result["players"].items():
+        for attack, row in stats.items():
+            print(f"player {player} {attack}: {row['attacks']} attacks, {row['hits']} hits, "
+                  f"{row['misses']} misses, {row['damage']} damage")
+    print(f"rounds: {result['rounds']}, {result['round_ticks'] / tick_rate:.1f}s on average, "
+          f"score {result['score'][0]} - {result['score'][1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
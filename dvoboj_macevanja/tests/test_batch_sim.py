@@ -0,0 +1,44 @@
+"""BatchMatch plays recorded inputs exactly like simulation.advance"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import batch_sim
+import characters
+import replay
+import simulation
+import tournament
+
+
+def record(path, p1, p2, ticks, seed):
+    """Save the inputs of a bot match between two tournament controllers as a replay"""
+    ids = ("djoko", "vlajko")
+    recorded = replay.Replay(*(characters.load(id).spec.steps for id in ids), characters=ids)
+    match = recorded.new_match()
+    controllers = tournament.CONTROLLERS[p1](1, seed), tournament.CONTROLLERS[p2](2, seed + 1)
+    for _ in range(ticks):
+        inputs = [controller(match) for controller in controllers]
+        recorded.record(*inputs)
+        simulation.advance(match, *inputs)
+    recorded.save(str(path))
+
+
+def test_replay_conformance(tmp_path):
+    path = tmp_path / "bots.dvr"
+    record(path, "chaser", "random", 3000, seed=1)
+    recorded = replay.load_replay(str(path))
+    stream = [recorded[tick] for tick in range(len(recorded))]
+
+    assert batch_sim.check_conformance([stream], recorded.specs()) is None
+
+    # and the outcome: whole rounds were played and both end on the same score
+    match = replay.run_headless(recorded)
+    assert sum(match.score) > 0
+    batch = batch_sim.BatchMatch(1, recorded.specs())
+    for inputs in stream:
+        batch.advance(np.array([inputs], np.uint8))
+    assert batch.score[0].tolist() == list(match.score)
+    assert batch.tick[0].item() == match.tick == len(recorded)
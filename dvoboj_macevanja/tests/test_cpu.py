@@ -0,0 +1,21 @@
+"""CPU levels: a deeper lookahead wins more often"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tournament
+
+LEVELS = ["cpu1", "cpu2", "cpu3"]
+
+
+def test_win_rate_rises_with_level():
+    # a round robin of the levels from both sides, with the characters both ways round
+    games = []
+    for characters in (("djoko", "vlajko"), ("vlajko", "djoko")):
+        games.extend(tournament.schedule(LEVELS, characters, 2, 3, 1, False))
+    standings = tournament.Standings(LEVELS)
+    for result in tournament.play_games(games):
+        standings.add(result)
+    win_rates = [standings.summary()[name]["win_rate"] for name in LEVELS]
+    assert win_rates == sorted(win_rates) and len(set(win_rates)) == len(win_rates), win_rates
@@ -0,0 +1,91 @@
+"""Rollback sessions: events of ticks simulated again, telemetry, and two peers over UDP"""
+import os
+import random
+import re
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import characters
+import netplay
+import simulation
+
+
+class DelayedLink:
+    """In memory link, a packet arrives after the peer has sent `delay` more"""
+    def __init__(self, delay):
+        self.delay = delay
+        self.peer = None
+        self.inbox = []
+
+    def send(self, data):
+        self.peer.inbox.append([self.delay, data])
+
+    def receive(self):
+        arrived = [data for wait, data in self.inbox if wait <= 0]
+        self.inbox = [[wait - 1, data] for wait, data in self.inbox if wait > 0]
+        return arrived
+
+
+class Log:
+    """Stands in for a TelemetryWriter"""
+    def __init__(self):
+        self.rows = []
+
+    def log(self, tick, events, score):
+        self.rows.extend((tick, score, event) for event in events)
+
+
+def play(seed, ticks=600):
+    """Two sessions with random inputs over links 3 ticks slow, returns them and the offline replay of one"""
+    specs = [characters.load("djoko").spec, characters.load("vlajko").spec]
+    links = DelayedLink(3), DelayedLink(3)
+    links[0].peer, links[1].peer = links[1], links[0]
+    records = [], []
+    sessions = [netplay.RollbackSession(simulation.MatchState(*specs), player + 1, links[player],
+                                        record=records[player], telemetry=Log()) for player in (0, 1)]
+    for session in sessions:
+        session.handed = Counter()
+    rng = random.Random(seed)
+    inputs = [rng.choice((0, simulation.INPUT_LEFT, simulation.INPUT_RIGHT, simulation.INPUT_ATTACK1,
+                          simulation.INPUT_ATTACK2)) for _ in range(ticks + 100)]
+    for tick in range(ticks):
+        for player, session in enumerate(sessions):
+            session.advance(inputs[tick + player * 100])
+            session.handed.update(session.events)
+    assert sum(session.stats["rollbacks"] for session in sessions) > 0
+
+    offline = simulation.MatchState(*specs)
+    expected = []
+    for tick, (p1_input, p2_input) in enumerate(records[0]):
+        simulation.advance(offline, p1_input, p2_input)
+        expected.extend((tick, tuple(offline.score), event) for event in offline.events)
+    return sessions, expected
+
+
+def test_events_of_resimulated_ticks():
+    sessions, expected = play(3)
+    events = Counter(event for tick, score, event in expected)
+    for session in sessions:
+        assert not events - session.handed
+
+
+def test_telemetry_of_final_ticks():
+    sessions, expected = play(5)
+    assert expected
+    for session in sessions:
+        rows = session.telemetry.rows
+        assert rows[:len(expected)] == expected
+
+
+def test_loopback_with_latency_and_loss(capsys):
+    # two peer processes over real UDP sockets on 127.0.0.1, then the same inputs offline
+    result = netplay.main(["--loopback", "--ticks", "600", "--latency", "80", "--jitter", "20", "--loss", "0.1",
+                           "--port", "47310"])
+    output = capsys.readouterr().out
+    assert result == 0, output
+    assert "desync" not in output
+    rollbacks = [int(count) for count in re.findall(r"at most (\d+)", output)]
+    assert len(rollbacks) == 2
+    assert 0 < max(rollbacks) <= netplay.MAX_ROLLBACK == 8
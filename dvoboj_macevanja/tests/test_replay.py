@@ -0,0 +1,42 @@
+"""Replays written by older versions still load"""
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import replay
+import simulation
+
+
+def test_load_version_2(tmp_path):
+    # version 2: flags byte, steps without character ids
+    path = tmp_path / "v2.dvr"
+    inputs = [simulation.INPUT_RIGHT, simulation.INPUT_LEFT, 0, simulation.INPUT_ATTACK1]
+    path.write_bytes(replay.HEADER.pack(replay.MAGIC, 2, 60, 2)
+                     + bytes([replay.FLAG_HITBOXES])
+                     + bytes([2, 5, 6]) + bytes([1, 7])
+                     + bytes(inputs))
+    loaded = replay.load_replay(str(path))
+    assert loaded.flags == replay.FLAG_HITBOXES
+    assert loaded.tick_rate == 60
+    assert loaded.steps == ((5, 6), (7,))
+    assert loaded.characters == (None, None)
+    assert list(loaded.inputs) == inputs
+
+    # saved again it is current and reads back the same
+    path = tmp_path / "v3.dvr"
+    loaded.save(str(path))
+    assert struct.unpack_from("<B", path.read_bytes(), 4)[0] == replay.VERSION
+    again = replay.load_replay(str(path))
+    assert (again.flags, again.steps, again.characters, list(again.inputs)) == \
+           (loaded.flags, loaded.steps, loaded.characters, list(loaded.inputs))
+
+
+def test_reject_unknown_version(tmp_path):
+    path = tmp_path / "v9.dvr"
+    path.write_bytes(replay.HEADER.pack(replay.MAGIC, replay.VERSION + 1, 60, 0) + bytes(5))
+    with pytest.raises(ValueError):
+        replay.load_replay(str(path))
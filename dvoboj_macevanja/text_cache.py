@@ -0,0 +1,54 @@
+from collections import OrderedDict
+import perf
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (font, text, colour), least recently used dropped first
+
+    Menu options and the score change rarely, so each string is rendered once
+    and the same surface is blitted every frame after that.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, colour, antialias=True):
+        key = (font, text, tuple(colour), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        perf.count("surfaces")
+        surface = font.render(text, antialias, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def info(self):
+        return {
+            'entries': len(self.surfaces),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+# shared by the menu and the HUD
+_cache = TextCache()
+
+
+def render(font, text, colour, antialias=True):
+    """font.render through the shared cache"""
+    return _cache.render(font, text, colour, antialias)
+
+
+def cache_info():
+    return _cache.info()
@@ -0,0 +1,280 @@
+"""Round-robin tournaments between bot controllers, spread over every core
+
+Every controller plays every other one from both sides, a number of games
+per pairing; --mirror adds the games of each controller against itself. A
+game is a whole headless match, first to --rounds round wins, run by
+simulation.advance: the same rules, countdown, rounds and score the game
+plays with, without a display. Games are shared out in chunks to a
+ProcessPoolExecutor, and every finished game is written as a line of JSON
+to the results file as it arrives; the last line is the summary that is
+also printed:
+
+    python -m tournament --games 200 --output results.jsonl
+    python -m tournament --controllers chaser,turtle --p1 vlajko --p2 djoko --hitboxes
+
+A controller is a class in CONTROLLERS, built with (player, seed) for each
+game and called once per tick with the MatchState, returning the
+simulation.INPUT_* bits of its player.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import cpu
+import simulation as sim
+
+# a match that never ends (two idle bots) is a draw after 5 minutes of play
+MAX_TICKS = 5 * 60 * sim.TICK_RATE
+# games sent to a worker at a time, big enough that the pickling doesn't show
+CHUNK = 8
+
+
+#----------------controllers------------------------------------------------------
+
+class Idle:
+    """Stands still"""
+    def __init__(self, player, seed):
+        pass
+
+    def __call__(self, match):
+        return 0
+
+
+class Scripted:
+    """Walks in, trades both attacks and backs off on a fixed loop, like benchmarks/run.py"""
+    def __init__(self, player, seed):
+        self.player = player
+        # each game starts at a different point of the loop
+        self.offset = random.Random(seed).randrange(240)
+
+    def __call__(self, match):
+        me, other = match.fighters[self.player - 1], match.fighters[2 - self.player]
+        toward = sim.INPUT_RIGHT if other.x > me.x else sim.INPUT_LEFT
+        phase = (match.tick + self.offset) % 240
+        if phase < 60:
+            return toward
+        if phase < 180:
+            if phase % 30 == 0:
+                return sim.INPUT_ATTACK1
+            if phase % 45 == 10:
+                return sim.INPUT_ATTACK2
+            return 0
+        return (sim.INPUT_LEFT | sim.INPUT_RIGHT) ^ toward
+
+
+class Chaser:
+    """Runs at the opponent and swings as soon as it is in reach"""
+    def __init__(self, player, seed):
+        self.player = player
+        self.random = random.Random(seed)
+
+    def __call__(self, match):
+        me, other = match.fighters[self.player - 1], match.fighters[2 - self.player]
+        distance = other.x - me.x
+        if abs(distance) < sim.BODY_WIDTH * 3 // 2:
+            return sim.INPUT_ATTACK2 if self.random.random() < 0.3 else sim.INPUT_ATTACK1
+        return sim.INPUT_RIGHT if distance > 0 else sim.INPUT_LEFT
+
+
+class Turtle:
+    """Keeps its distance and only steps in when the opponent's attack is on cooldown"""
+    def __init__(self, player, seed):
+        self.player = player
+        self.random = random.Random(seed)
+
+    def __call__(self, match):
+        me, other = match.fighters[self.player - 1], match.fighters[2 - self.player]
+        distance = other.x - me.x
+        toward = sim.INPUT_RIGHT if distance > 0 else sim.INPUT_LEFT
+        away = (sim.INPUT_LEFT | sim.INPUT_RIGHT) ^ toward
+        if other.attack_cooldown == 0 and not other.hit:
+            if abs(distance) < sim.BODY_WIDTH * 2:
+                return away | (sim.INPUT_JUMP if self.random.random() < 0.05 else 0)
+            return 0
+        if abs(distance) < sim.BODY_WIDTH * 3 // 2:
+            return sim.INPUT_ATTACK1
+        return toward
+
+
+class Random:
+    """Presses random buttons, a few times a second"""
+    def __init__(self, player, seed):
+        self.random = random.Random(seed)
+        self.held = 0
+
+    def __call__(self, match):
+        if self.random.random() < 0.1:
+            self.held = self.random.randrange(32)
+        return self.held
+
+
+# name -> controller class
+CONTROLLERS = {
+    "idle": Idle,
+    "scripted": Scripted,
+    "chaser": Chaser,
+    "turtle": Turtle,
+    "random": Random,
+    # the CPU opponent of the game, at every level
+    **{f"cpu{level}": partial(cpu.CPU, level=level) for level in cpu.LEVELS},
+}
+
+
+#----------------games------------------------------------------------------
+
+# (p1 character, p2 character) -> hitbox tables, built once per worker
+_hitboxes = {}
+
+
+def play_game(game):
+    """Play one game to the end, returns its result as a dict
+
+    game is (p1 controller, p2 controller, p1 character, p2 character,
+    rounds to win, seed, sprite hitboxes).
+    """
+    import characters
+
+    p1, p2, c1, c2, rounds, seed, use_hitboxes = game
+    specs = [characters.load(c1).spec, characters.load(c2).spec]
+    match = sim.MatchState(*specs)
+    if use_hitboxes:
+        if (c1, c2) not in _hitboxes:
+            import hitboxes
+            _hitboxes[c1, c2] = tuple(hitboxes.for_character(characters.load(id)) for id in (c1, c2))
+        match.hitboxes = _hitboxes[c1, c2]
+    controllers = [CONTROLLERS[p1](1, seed), CONTROLLERS[p2](2, seed + 1)]
+
+    # per player: attacks started and damage dealt with attack 1 and 2, and hits landed
+    attacks = [[0, 0], [0, 0]]
+    damage = [[0, 0], [0, 0]]
+    hits = [[0, 0], [0, 0]]
+    round_ticks = []
+    # attack each player started last, 1 or 2: a hit can land a few ticks after the attack started
+    swing = [1, 1]
+    advance = sim.advance
+    while max(match.score) < rounds and match.tick < MAX_TICKS:
+        advance(match, controllers[0](match), controllers[1](match))
+        for event in match.events:
+            if event.kind == sim.EVENT_ATTACK:
+                attacks[event.player - 1][event.attack_type - 1] += 1
+                swing[event.player - 1] = event.attack_type
+            elif event.kind == sim.EVENT_HIT:
+                attack = swing[event.player - 1] - 1
+                damage[event.player - 1][attack] += event.damage
+                hits[event.player - 1][attack] += 1
+            elif event.kind == sim.EVENT_ROUND_OVER:
+                round_ticks.append(event.value)
+
+    winner = 0
+    if match.score[0] != match.score[1]:
+        winner = 1 if match.score[0] > match.score[1] else 2
+    return {"p1": p1, "p2": p2, "characters": [c1, c2], "seed": seed, "winner": winner,
+            "score": list(match.score), "ticks": match.tick, "round_ticks": round_ticks,
+            "attacks": attacks, "hits": hits, "damage": damage}
+
+
+def play_games(games):
+    return [play_game(game) for game in games]
+
+
+def schedule(controllers, characters, games, rounds, seed, use_hitboxes, mirror=False):
+    """Every pairing from both sides, games times each, and the mirror matches when asked"""
+    pairings = itertools.product(controllers, repeat=2) if mirror else itertools.permutations(controllers, 2)
+    for index, (p1, p2) in enumerate(pairings):
+        for game in range(games):
+            yield (p1, p2, *characters, rounds, seed + 2 * (index * games + game), use_hitboxes)
+
+
+#----------------results------------------------------------------------------
+
+class Standings:
+    """Running totals of every controller over the games seen so far"""
+    def __init__(self, controllers):
+        self.totals = {name: {"games": 0, "wins": 0, "draws": 0, "rounds": 0, "round_ticks": 0,
+                              "attacks": [0, 0], "hits": [0, 0], "damage": [0, 0]} for name in controllers}
+
+    def add(self, result):
+        for player, name in enumerate((result["p1"], result["p2"])):
+            totals = self.totals[name]
+            totals["games"] += 1
+            totals["wins"] += result["winner"] == player + 1
+            totals["draws"] += result["winner"] == 0
+            totals["rounds"] += len(result["round_ticks"])
+            totals["round_ticks"] += sum(result["round_ticks"])
+            for key in ("attacks", "hits", "damage"):
+                for attack in range(2):
+                    totals[key][attack] += result[key][player][attack]
+
+    def summary(self):
+        summary = {}
+        for name, totals in self.totals.items():
+            games = max(totals["games"], 1)
+            summary[name] = {
+                "games": totals["games"],
+                "win_rate": totals["wins"] / games,
+                "draw_rate": totals["draws"] / games,
+                "round_ticks": totals["round_ticks"] / max(totals["rounds"], 1),
+                "damage": totals["damage"],
+                "hit_rate": [hits / max(attacks, 1) for hits, attacks in zip(totals["hits"], totals["attacks"])],
+            }
+        return summary
+
+    def report(self):
+        lines = [f"{'controller':<10} {'games':>6} {'wins':>6} {'draws':>6} {'ticks/round':>11} "
+                 f"{'dmg atk1':>9} {'dmg atk2':>9} {'hit% atk1':>9} {'hit% atk2':>9}"]
+        for name, row in sorted(self.summary().items(), key=lambda item: -item[1]["win_rate"]):
+            lines.append(f"{name:<10} {row['games']:>6} {row['win_rate']:>6.1%} {row['draw_rate']:>6.1%} "
+                         f"{row['round_ticks']:>11.0f} {row['damage'][0]:>9} {row['damage'][1]:>9} "
+                         f"{row['hit_rate'][0]:>9.1%} {row['hit_rate'][1]:>9.1%}")
+        return "\n".join(lines)
+
+
+def run(options, out):
+    controllers = options.controllers
+    games = list(schedule(controllers, (options.p1, options.p2), options.games, options.rounds, options.seed, options.hitboxes, options.mirror))
+    standings = Standings(controllers)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(options.workers) as pool:
+        futures = [pool.submit(play_games, games[i:i + CHUNK]) for i in range(0, len(games), CHUNK)]
+        for future in as_completed(futures):
+            for result in future.result():
+                standings.add(result)
+                out.write(json.dumps(result) + "\n")
+            out.flush()
+    elapsed = time.perf_counter() - start
+    out.write(json.dumps({"summary": standings.summary(), "games": len(games), "seconds": elapsed}) + "\n")
+    print(standings.report())
+    print(f"{len(games)} games in {elapsed:.1f} s on {options.workers or os.cpu_count()} workers")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Round-robin tournament between bot controllers")
+    parser.add_argument("--controllers", type=lambda text: text.split(","), default=list(CONTROLLERS),
+                        help=f"comma separated, from {', '.join(CONTROLLERS)} (default all)")
+    parser.add_argument("--games", type=int, default=20, help="games per pairing and side")
+    parser.add_argument("--rounds", type=int, default=3, help="round wins that win a game")
+    parser.add_argument("--p1", default="djoko", help="character of player 1")
+    parser.add_argument("--p2", default="vlajko", help="character of player 2")
+    parser.add_argument("--hitboxes", action="store_true", help="decide hits with the sprite hitboxes")
+    parser.add_argument("--mirror", action="store_true", help="also play every controller against itself")
+    parser.add_argument("--workers", type=int, help="processes (default one per core)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="tournament.jsonl", help="results file, one game per line")
+    options = parser.parse_args(argv)
+    unknown = [name for name in options.controllers if name not in CONTROLLERS]
+    if unknown:
+        parser.error(f"unknown controllers {', '.join(unknown)}")
+
+    with open(options.output, "w") as out:
+        run(options, out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))